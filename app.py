@@ -3,29 +3,68 @@ from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_cors import CORS
 from datetime import datetime
 import secrets
+import sys
 import os
 from dotenv import load_dotenv
 from routes.player_routes import player_bp
 from routes.enemy_routes import enemy_bp
 from routes.npc_routes import npc_bp
+from routes.roll_routes import roll_bp
+from routes.metrics_routes import metrics_bp
+from routes.session_routes import session_bp
+from routes.encounter_routes import encounter_bp
+from routes.effect_routes import effect_bp
+from routes.simulation_routes import simulation_bp
+from server import codec, compression, json_provider, scaleout
+from server.presence import presence
+from server.replay import client_rooms, replay_log, sequenced_rooms
+from server.broadcast import multicast, player_rooms, session_room
+from server.chat_log import message_log
+from server.coalescer import stat_coalescer
+from server.roll_log import roll_log
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'database'))
+import models
+from queries import fetch_combatants, fetch_session_id
+from rolls import DICE_MAP
+from dice import DiceError, parse_expression, stat_variables
 
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
-app.secret_key = secrets.token_hex(16)
+# Workers behind one queue must sign session cookies with the same key
+if scaleout.SOCKETIO_MESSAGE_QUEUE and not os.getenv('SECRET_KEY'):
+    raise ValueError("SECRET_KEY must be set when SOCKETIO_MESSAGE_QUEUE is, so every worker "
+                     "accepts the session cookies the others sign")
+app.secret_key = os.getenv('SECRET_KEY') or secrets.token_hex(16)
+json_provider.init_app(app)
+compression.init_app(app)
+CORS(app, expose_headers=["X-Next-Cursor"])
+# threading by default; serve.py sets gevent/eventlet after monkey patching.
+# SOCKETIO_MESSAGE_QUEUE shares rooms across worker processes (server/scaleout.py)
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=os.getenv('SOCKETIO_ASYNC_MODE', 'threading'),
+                    **scaleout.socketio_options())
+stat_coalescer.init_app(socketio)
+message_log.init_app(socketio)
+roll_log.init_app(socketio)
+presence.init_app(socketio)
+replay_log.init_app(socketio)
+binary_encoder = codec.BinaryEncoder(sequenced_rooms)
+binary_encoder.init_app(socketio)
 
 # Register blueprints
 app.register_blueprint(player_bp)
 app.register_blueprint(enemy_bp)
 app.register_blueprint(npc_bp)
+app.register_blueprint(roll_bp)
+app.register_blueprint(metrics_bp)
+app.register_blueprint(session_bp)
+app.register_blueprint(encounter_bp)
+app.register_blueprint(effect_bp)
+app.register_blueprint(simulation_bp)
 
-# Store connected clients
-connected_clients = {
-    'host': None,
-    'players': {}
-}
+# Request-scoped database sessions
+models.init_app(app)
 
 @app.route('/api/test')
 def test_endpoint():
@@ -75,14 +114,10 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     print(f"Client disconnected: {request.sid}")
-    # Remove from connected clients
-    if connected_clients['host'] == request.sid:
-        connected_clients['host'] = None
-    # Remove from players
-    for player_id, sid in list(connected_clients['players'].items()):
-        if sid == request.sid:
-            del connected_clients['players'][player_id]
-            break
+    # O(1) via the sid index; the host hears about it only if the player's last tab closed
+    diff = presence.leave(request.sid)
+    if diff:
+        emit('presence_diff', diff, to=game_room('host_room'))
 
 @socketio.on('join_game')
 def handle_join_game(data):
@@ -90,28 +125,90 @@ def handle_join_game(data):
     user_type = data.get('user_type')  # 'host' or 'player'
     user_id = data.get('user_id')
     user_name = data.get('user_name', 'Unknown')
+    # Opt-in MessagePack room events (server/codec.py), json when unavailable
+    encoding = 'msgpack' if data.get('encoding') == 'msgpack' and codec.available() else 'json'
     
     if user_type == 'host':
-        join_room('host_room')
-        connected_clients['host'] = request.sid
+        # The host picks the table it runs; every later event of this socket is scoped to it
+        game_session_id = data.get('session_id')
+        if game_session_id is not None:
+            # An unknown id would put the host in an orphan room whose chat rows fail the FK
+            known = False
+            if isinstance(game_session_id, int) and not isinstance(game_session_id, bool):
+                try:
+                    with models.SessionLocal() as db_session:
+                        known = db_session.get(models.GameSession, game_session_id) is not None
+                except Exception as e:
+                    print(f"Could not look up game session {game_session_id}: {e}")
+            if not known:
+                emit('join_error', {'error': f"Unknown game session {game_session_id}", 'session_id': game_session_id})
+                return
+        session['game_session_id'] = game_session_id
+        join_rooms([game_room('host_room')], encoding)
+        diff = presence.join_host(request.sid, session['game_session_id'])
         emit('join_success', {
             'message': 'Host connected',
-            'user_type': 'host'
+            'user_type': 'host',
+            'session_id': session['game_session_id'],
+            **replay_state(user_type, user_id),
+            **encoding_state(encoding)
         })
+        # Full state once; presence_diff events keep it current from here on
+        emit('connected_clients_update', presence.snapshot(session['game_session_id']))
+        if diff:
+            emit('presence_diff', diff, to=game_room('host_room'))
         print(f"Host connected: {request.sid}")
         
     elif user_type == 'player':
+        # A player's table is the one their character belongs to. If the lookup
+        # fails the socket still joins, just outside any game session
+        try:
+            with models.SessionLocal() as db_session:
+                session['game_session_id'] = fetch_session_id(db_session, models.Player, user_id)
+        except Exception as e:
+            print(f"Could not look up the game session of player {user_id}: {e}")
+            session['game_session_id'] = None
         player_room = f'player_{user_id}'
-        join_room(player_room)
-        join_room('all_players')
-        connected_clients['players'][user_id] = request.sid
+        join_rooms([player_room, game_room('all_players')], encoding)
+        diff = presence.join_player(user_id, request.sid, session['game_session_id'])
         emit('join_success', {
             'message': f'Player {user_name} connected',
             'user_type': 'player',
-            'player_id': user_id
+            'player_id': user_id,
+            'session_id': session['game_session_id'],
+            **replay_state(user_type, user_id),
+            **encoding_state(encoding)
         })
+        if diff:
+            emit('presence_diff', diff, to=game_room('host_room'))
         print(f"Player {user_name} (ID: {user_id}) connected: {request.sid}")
 
+    # Reconnect: replay only the events missed since last_seq, or ask for a snapshot
+    if user_type in ('host', 'player') and 'last_seq' in data:
+        rooms = client_rooms(user_type, user_id, session['game_session_id'])
+        emit('replay', replay_log.catch_up(rooms, data.get('last_seq'), data.get('epoch')))
+
+def game_room(room):
+    """host_room or all_players of the game session this socket joined"""
+    return session_room(room, session.get('game_session_id'))
+
+def join_rooms(rooms, encoding):
+    for room in rooms:
+        join_room(codec.binary_room(room) if encoding == 'msgpack' else room)
+
+def encoding_state(encoding):
+    """Negotiated payload encoding, with the field order of packed events"""
+    if encoding == 'msgpack':
+        return {'encoding': encoding, 'schemas': codec.EVENT_SCHEMAS}
+    return {'encoding': encoding}
+
+def replay_state(user_type, user_id):
+    """Epoch and current per-room seq a freshly joined client starts from"""
+    return {
+        'epoch': replay_log.epoch,
+        'seq': replay_log.current_seq(client_rooms(user_type, user_id, session.get('game_session_id')))
+    }
+
 @socketio.on('send_message')
 def handle_message(data):
     """Handle message sending between host and players"""
@@ -140,28 +237,39 @@ def handle_message(data):
     if sender_type == 'host':
         # Host sending to players
         target_players = data.get('target_players', [])
+        valid_targets = isinstance(target_players, list) and all(
+            isinstance(player_id, int) and not isinstance(player_id, bool) for player_id in target_players
+        )
+        if not valid_targets:
+            emit('message_error', {
+                'error': "Destinataires invalides"
+            }, room=game_room('host_room'))
+            return
+        # Each player once, in the order the host picked them
+        target_players = list(dict.fromkeys(target_players))
         if target_players:
-            for player_id in target_players:
-                player_room = f'player_{player_id}'
-                emit('new_message', message_data, room=player_room)
+            # One encode for every target instead of one emit per player
+            multicast('new_message', message_data, player_rooms(target_players))
+            message_log.submit(message_data, session.get('game_session_id'), target_players)
             
             # Send confirmation to host
             emit('message_sent', {
                 **message_data,
                 'targets': target_players,
                 'target_count': len(target_players)
-            }, room='host_room')
+            }, room=game_room('host_room'))
         else:
             # No players selected
             emit('message_error', {
                 'error': 'Aucun joueur sélectionné'
-            }, room='host_room')
+            }, room=game_room('host_room'))
         
     elif sender_type == 'player':
         # Player sending to host
         player_id = data.get('player_id')
         message_data['player_id'] = player_id
-        emit('new_message', message_data, room='host_room')
+        emit('new_message', message_data, room=game_room('host_room'))
+        message_log.submit(message_data, session.get('game_session_id'))
 
 @socketio.on('update_player_stats')
 def handle_player_stats_update(data):
@@ -180,21 +288,51 @@ def handle_player_stats_update(data):
         'timestamp': datetime.now().strftime('%H:%M:%S')
     }
     
-    # Send to host
-    emit('player_stats_updated', update_data, room='host_room')
-    
-    # Send to specific player
-    player_room = f'player_{player_id}'
-    emit('stats_updated', update_data, room=player_room)
+    # Coalesced per (player, stat): only the latest value in each window goes out
+    stat_coalescer.submit(update_data, session.get('game_session_id'))
+
+def roll_variables(expression, roller_type, player_id, variables):
+    """Values for an expression's variables: the player's own stats, or what the host sends"""
+    if not expression.variables:
+        return {}
+    if roller_type == 'player' and isinstance(player_id, int):
+        with models.SessionLocal() as db_session:
+            rows = fetch_combatants(db_session, models.Player, [player_id])
+        return stat_variables(rows[0]) if rows else {}
+    if roller_type == 'host' and isinstance(variables, dict):
+        return {
+            name: value for name, value in variables.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+        }
+    return {}
 
 @socketio.on('dice_roll_broadcast')
 def handle_dice_roll_broadcast(data):
-    """Broadcast dice rolls to all connected clients"""
+    """Broadcast dice rolls to all connected clients.
+
+    With "expression" (4d6kh3+2, d100<=luk) the server rolls it instead of
+    taking "result" from the client; player variables come from their stats,
+    the host's from "variables".
+    """
     roller_type = data.get('roller_type')  # 'host' or 'player'
     roller_name = data.get('roller_name')
     player_id = data.get('player_id')  # Only for player rolls
     dice_type = data.get('dice_type')
     result = data.get('result')
+    rolled = None
+
+    expression_text = data.get('expression')
+    if expression_text is not None:
+        try:
+            if not isinstance(expression_text, str):
+                raise DiceError("A dice expression must be a string")
+            expression = parse_expression(expression_text)
+            rolled = expression.roll(roll_variables(expression, roller_type, player_id, data.get('variables')))
+        except DiceError as e:
+            emit('dice_roll_error', {'expression': expression_text, 'error': str(e)})
+            return
+        dice_type = expression.plain_die or expression.text
+        result = rolled['result']
     
     roll_data = {
         'roller_type': roller_type,
@@ -206,9 +344,20 @@ def handle_dice_roll_broadcast(data):
     
     if roller_type == 'player':
         roll_data['player_id'] = player_id
+    if rolled is not None:
+        roll_data['dice'] = rolled['dice']
+        if 'success' in rolled:
+            roll_data['success'] = rolled['success']
     
-    # Broadcast to all clients
-    emit('dice_roll_result', roll_data, broadcast=True)
+    # Broadcast to the whole table (by room, so binary clients get it packed)
+    emit('dice_roll_result', roll_data, to=[game_room('host_room'), game_room('all_players')])
+
+    # Log it for roll statistics; results are client-reported, so only sane ones
+    if dice_type in DICE_MAP and isinstance(result, int) and 1 <= result <= DICE_MAP[dice_type]:
+        if roller_type == 'player' and isinstance(player_id, int):
+            roll_log.record('player', player_id, dice_type, result, 'broadcast', roller_name)
+        elif roller_type == 'host':
+            roll_log.record('host', session.get('game_session_id') or 0, dice_type, result, 'broadcast', roller_name)
 
 @socketio.on('environmental_update')
 def handle_environmental_update(data):
@@ -224,18 +373,13 @@ def handle_environmental_update(data):
         'timestamp': datetime.now().strftime('%H:%M:%S')
     }
     
-    # Broadcast to all players
-    emit('environmental_change', env_data, room='all_players')
+    # Broadcast to the players at this table
+    emit('environmental_change', env_data, room=game_room('all_players'))
 
 @socketio.on('get_connected_clients')
 def handle_get_connected_clients():
     """Return list of connected clients"""
-    client_data = {
-        'host_connected': connected_clients['host'] is not None,
-        'connected_players': list(connected_clients['players'].keys()),
-        'total_players': len(connected_clients['players'])
-    }
-    emit('connected_clients_update', client_data)
+    emit('connected_clients_update', presence.snapshot(session.get('game_session_id')))
 
 if __name__ == "__main__":
     socketio.run(app, debug=True, port=8000)
\ No newline at end of file
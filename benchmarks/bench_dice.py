@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Dice expression throughput: parsing, the memoized lookup and evaluation.
+
+Usage: python benchmarks/bench_dice.py [rolls]
+
+Parsing is timed with the cache bypassed (what a new expression costs) and
+through it (what every repeat costs). Evaluation compares one roll at a
+time, the way a request rolls, against batches from a single evaluate(),
+and against rolling the same expression in plain Python with random.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'database'))
+
+from dice import compile_expression, parse_expression
+
+EXPRESSIONS = ['d20', '4d6kh3+2', '2d20kl1+str', 'd100<=luk', '3d6*2-(d4+1)']
+VARIABLES = {'str': 12, 'luk': 40}
+BATCH_SIZES = [1, 100, 10000]
+
+
+def rate(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return repeat / (time.perf_counter() - start)
+
+
+def python_roll(expression):
+    """The same expressions rolled die by die with random, for reference"""
+    if expression == 'd20':
+        return lambda: random.randint(1, 20)
+    if expression == '4d6kh3+2':
+        return lambda: sum(sorted(random.randint(1, 6) for _ in range(4))[1:]) + 2
+    if expression == '2d20kl1+str':
+        return lambda: min(random.randint(1, 20), random.randint(1, 20)) + VARIABLES['str']
+    if expression == 'd100<=luk':
+        return lambda: random.randint(1, 100) <= VARIABLES['luk']
+    return lambda: sum(random.randint(1, 6) for _ in range(3)) * 2 - (random.randint(1, 4) + 1)
+
+
+def main():
+    rolls = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    parse_uncached = compile_expression.__wrapped__
+
+    print(f"{'expression':<14} {'parse/s':>10} {'cached/s':>11} {'python rolls/s':>15}"
+          + ''.join(f" {f'batch {n} rolls/s':>20}" for n in BATCH_SIZES))
+    for text in EXPRESSIONS:
+        parsed = rate(lambda: parse_uncached(text), 5000)
+        cached = rate(lambda: parse_expression(text), 100000)
+        expression = parse_expression(text)
+        python = rate(python_roll(text), rolls)
+        batches = []
+        for n in BATCH_SIZES:
+            repeat = max(rolls // n, 10)
+            batches.append(rate(lambda: expression.evaluate(n, VARIABLES), repeat) * n)
+        print(f"{text:<14} {parsed:>10,.0f} {cached:>11,.0f} {python:>15,.0f}"
+              + ''.join(f" {value:>20,.0f}" for value in batches))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Per-message fan-out cost: one emit per player room vs one multicast emit.
+
+Usage: python benchmarks/bench_fanout.py [messages]
+
+A bare python-socketio server gets fake connected players, one socket each
+in player_<id> and all_players. Sending is stubbed out, so the timings show
+the cost of encoding packets and routing them to sockets.
+"""
+import sys
+import time
+from datetime import datetime
+
+import socketio
+
+TARGET_COUNTS = [1, 5, 10, 30, 100]
+
+
+def make_server(players):
+    server = socketio.Server(async_mode='threading')
+    server.eio.generate_id = iter(range(10 ** 9)).__next__
+    server._send_eio_packet = lambda eio_sid, pkt: None
+    server.manager.initialize()
+    for player_id in range(1, players + 1):
+        sid = server.manager.connect(f'eio-{player_id}', '/')
+        server.manager.enter_room(sid, '/', f'player_{player_id}')
+        server.manager.enter_room(sid, '/', 'all_players')
+    return server
+
+
+def count_encodes(server):
+    counter = {'encodes': 0}
+    original = server.packet_class.encode
+
+    def encode(pkt):
+        counter['encodes'] += 1
+        return original(pkt)
+    server.packet_class.encode = encode
+    return counter, lambda: setattr(server.packet_class, 'encode', original)
+
+
+def message_data():
+    return {
+        'sender_name': 'Host',
+        'sender_type': 'host',
+        'message': 'A cold wind blows through the corridor. ' * 4,
+        'voice_mode': 'host',
+        'message_class': 'normal-message',
+        'timestamp': datetime.now().strftime('%H:%M'),
+        'is_mystery': False
+    }
+
+
+def per_room(server, rooms, data):
+    """What handle_message did before: one emit per target player"""
+    for room in rooms:
+        server.emit('new_message', data, to=room)
+
+
+def multicast(server, rooms, data):
+    server.emit('new_message', data, to=rooms)
+
+
+def run(send, server, rooms, messages):
+    data = message_data()
+    counter, restore = count_encodes(server)
+    start = time.perf_counter()
+    for _ in range(messages):
+        send(server, rooms, data)
+    elapsed = time.perf_counter() - start
+    restore()
+    return elapsed / messages * 1e6, counter['encodes'] / messages
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    server = make_server(max(TARGET_COUNTS))
+
+    print(f"{'targets':>8} {'per-room us':>12} {'encodes':>8} {'multicast us':>13} {'encodes':>8} {'speedup':>8}")
+    for targets in TARGET_COUNTS:
+        rooms = [f'player_{player_id}' for player_id in range(1, targets + 1)]
+        loop_us, loop_encodes = run(per_room, server, rooms, messages)
+        multi_us, multi_encodes = run(multicast, server, rooms, messages)
+        print(f"{targets:>8} {loop_us:>12.1f} {loop_encodes:>8.0f} {multi_us:>13.1f} {multi_encodes:>8.0f} "
+              f"{loop_us / multi_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
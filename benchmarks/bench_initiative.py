@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Turn-order upkeep in a mass battle: server/initiative.py vs a re-sorted list.
+
+Usage: python benchmarks/bench_initiative.py [operations]
+
+Each run starts an encounter and then mixes turn advances with deaths,
+reinforcements and delays, the way a large fight goes. The baseline keeps
+one list of combatants and sorts it again after every change, which is
+what a client-side tracker typically does.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from server.initiative import Encounter
+
+COMBATANT_COUNTS = [10, 100, 500, 2000]
+
+
+def make_operations(combatants, operations, seed=7):
+    rng = random.Random(seed)
+    next_id = combatants
+    ops = []
+    for _ in range(operations):
+        roll = rng.random()
+        if roll < 0.7:
+            ops.append(('next',))
+        elif roll < 0.8:
+            ops.append(('remove', rng.randrange(next_id)))
+        elif roll < 0.9:
+            ops.append(('add', next_id, rng.randint(1, 30), rng.randint(1, 20)))
+            next_id += 1
+        else:
+            ops.append(('delay', rng.randrange(next_id), rng.randint(0, 30)))
+    return ops
+
+
+def run_heap(combatants, ops):
+    encounter = Encounter(1)
+    encounter.add([('enemy', i, f'E{i}', i % 30, i % 20) for i in range(combatants)])
+    encounter.start()
+    for op in ops:
+        if op[0] == 'next':
+            encounter.next_turn()
+        elif op[0] == 'remove':
+            encounter.remove('enemy', op[1])
+        elif op[0] == 'add':
+            encounter.add([('enemy', op[1], f'E{op[1]}', op[2], op[3])])
+        else:
+            try:
+                encounter.delay('enemy', op[1], op[2])
+            except ValueError:
+                pass
+
+
+def run_sorted_list(combatants, ops):
+    order = [(-(i % 30), -(i % 20), i) for i in range(combatants)]
+    order.sort()
+    pointer = 0
+    for op in ops:
+        if op[0] == 'next':
+            pointer = pointer + 1 if pointer + 1 < len(order) else 0
+        elif op[0] == 'remove':
+            order = [entry for entry in order if entry[2] != op[1]]
+            pointer = min(pointer, max(len(order) - 1, 0))
+        elif op[0] == 'add':
+            order.append((-op[2], -op[3], op[1]))
+            order.sort()
+        else:
+            order = [(-op[2], entry[1], entry[2]) if entry[2] == op[1] else entry for entry in order]
+            order.sort()
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    operations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"{operations} operations (70% next turn, 10% each death / reinforcement / delay)")
+    print(f"{'combatants':>10} {'heap us/op':>11} {'sorted list us/op':>18} {'speedup':>8}")
+    for combatants in COMBATANT_COUNTS:
+        ops = make_operations(combatants, operations)
+        heap = timed(run_heap, combatants, ops) / operations * 1e6
+        baseline = timed(run_sorted_list, combatants, ops) / operations * 1e6
+        print(f"{combatants:>10} {heap:>11.2f} {baseline:>18.2f} {baseline / heap:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Payload size and serialization time of the /api/players list.
+
+Usage: python benchmarks/bench_payloads.py [rows ...]   (default: 100 1000 10000)
+
+Compares stdlib json against orjson, and raw against gzip/brotli payloads,
+using the same Core rows the endpoint returns.
+"""
+import gzip
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'database'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from models import Base, Player
+from queries import fetch_page
+from server.compression import COMPRESS_BROTLI_QUALITY, COMPRESS_GZIP_LEVEL
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def seed(engine, count):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    rows = [{
+        'name': f'Adventurer {i}',
+        'title': 'Wanderer',
+        'skill_name': 'Second Wind',
+        'skill_description': 'Draws on a hidden reserve of stamina to keep fighting. ' * 6,
+        'passive_name': 'Stubborn',
+        'passive_description': 'Refuses to fall while an ally still stands. ' * 4,
+        'last_d20_roll': i % 20 + 1,
+    } for i in range(count)]
+    with engine.begin() as connection:
+        connection.execute(insert(Player.__table__), rows)
+
+
+def best_time(func, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 1000, 10000]
+    engine = create_engine('sqlite://')
+    make_session = sessionmaker(bind=engine)
+
+    print(f"{'rows':>6} {'encoder':<8} {'encode ms':>10} {'raw KB':>9} {'gzip KB':>9} {'br KB':>9} {'gzip ms':>8} {'br ms':>8}")
+    for count in sizes:
+        seed(engine, count)
+        db_session = make_session()
+        rows, _ = fetch_page(db_session, Player, {})
+        db_session.close()
+
+        encoders = [('json', lambda: json.dumps(rows).encode('utf-8'))]
+        if orjson is not None:
+            encoders.append(('orjson', lambda: orjson.dumps(rows)))
+
+        for label, encode in encoders:
+            encode_time, payload = best_time(encode)
+            gzip_time, gzipped = best_time(lambda: gzip.compress(payload, compresslevel=COMPRESS_GZIP_LEVEL))
+            if brotli is not None:
+                br_time, brotlied = best_time(lambda: brotli.compress(payload, quality=COMPRESS_BROTLI_QUALITY))
+                br_kb, br_ms = f"{len(brotlied) / 1024:>9.1f}", f"{br_time * 1000:>8.2f}"
+            else:
+                br_kb, br_ms = f"{'-':>9}", f"{'-':>8}"
+            print(f"{count:>6} {label:<8} {encode_time * 1000:>10.2f} {len(payload) / 1024:>9.1f} "
+                  f"{len(gzipped) / 1024:>9.1f} {br_kb} {gzip_time * 1000:>8.2f} {br_ms}")
+
+
+if __name__ == "__main__":
+    main()
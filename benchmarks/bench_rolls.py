@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Rolls/sec under concurrent clients: SELECT + ORM update vs UPDATE ... RETURNING.
+
+Usage: python benchmarks/bench_rolls.py [clients] [rolls_per_client]
+
+Every client rolls against the same enemy, which is the contended case.
+Point BENCH_DATABASE_URL at Postgres for meaningful numbers; the SQLite
+fallback serializes all writers.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'database'))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Enemy
+from rolls import DICE_MAP, persist_roll
+
+
+def orm_roll(db_session, enemy_id, dice_type):
+    """What the roll endpoints did before: load the row, set the column, commit"""
+    enemy = db_session.query(Enemy).filter(Enemy.id == enemy_id).first()
+    result = random.randint(1, DICE_MAP[dice_type])
+    setattr(enemy, f'last_{dice_type}_roll', result)
+    db_session.commit()
+    return enemy.name
+
+
+def returning_roll(db_session, enemy_id, dice_type):
+    return persist_roll(db_session, Enemy, enemy_id, dice_type, random.randint(1, DICE_MAP[dice_type]))
+
+
+def bench(label, roll, make_session, enemy_id, clients, rolls_per_client):
+    def client():
+        db_session = make_session()
+        try:
+            for _ in range(rolls_per_client):
+                roll(db_session, enemy_id, 'd20')
+        finally:
+            db_session.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        for future in [pool.submit(client) for _ in range(clients)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+    total = clients * rolls_per_client
+    print(f"{label:<22} {total / elapsed:>10,.0f} rolls/sec  ({total} rolls, {clients} clients)")
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    rolls_per_client = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    url = os.getenv('BENCH_DATABASE_URL')
+    if url is None:
+        url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_rolls.db')}"
+        engine = create_engine(url, connect_args={'timeout': 30})
+    else:
+        engine = create_engine(url, pool_size=clients)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    make_session = sessionmaker(bind=engine)
+
+    db_session = make_session()
+    enemy = Enemy(name='Training Dummy')
+    db_session.add(enemy)
+    db_session.commit()
+    enemy_id = enemy.id
+    db_session.close()
+
+    bench('SELECT + ORM update', orm_roll, make_session, enemy_id, clients, rolls_per_client)
+    bench('UPDATE ... RETURNING', returning_roll, make_session, enemy_id, clients, rolls_per_client)
+
+
+if __name__ == "__main__":
+    main()
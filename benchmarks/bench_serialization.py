@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Rows/sec of the list serialization path: ORM hydration vs Core rows.
+
+Usage: python benchmarks/bench_serialization.py [rows]
+
+Runs against an in-memory SQLite database unless BENCH_DATABASE_URL is set.
+"""
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'database'))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from models import Base, Enemy
+from queries import fetch_page
+from serializers import dumps
+
+ENEMY_FIELDS = [column.name for column in Enemy.__table__.columns]
+
+
+def seed(engine, count):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    rows = [{
+        'name': f'Goblin {i}',
+        'title': 'Grunt',
+        'skill_name': 'Stab',
+        'skill_description': 'Stabs things, repeatedly and with enthusiasm. ' * 8,
+        'gender': 'Male',
+        'biology': 'Goblin',
+        'ritual': '0% Human',
+        'last_d20_roll': i % 20 + 1,
+    } for i in range(count)]
+    with engine.begin() as connection:
+        connection.execute(insert(Enemy.__table__), rows)
+
+
+def orm_path(db_session):
+    """What the list endpoints did before: hydrate, copy attributes, json.dumps"""
+    enemy_list = []
+    for enemy in db_session.query(Enemy).all():
+        enemy_list.append({field: getattr(enemy, field) for field in ENEMY_FIELDS})
+    return json.dumps(enemy_list).encode('utf-8')
+
+
+def core_path(db_session):
+    rows, _ = fetch_page(db_session, Enemy, {})
+    return dumps(rows)
+
+
+def bench(label, func, make_session, count, repeat=5):
+    best = None
+    for _ in range(repeat):
+        db_session = make_session()
+        start = time.perf_counter()
+        func(db_session)
+        elapsed = time.perf_counter() - start
+        db_session.close()
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<20} {count / best:>12,.0f} rows/sec  ({best * 1000:.1f} ms)")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    engine = create_engine(os.getenv('BENCH_DATABASE_URL', 'sqlite://'))
+    seed(engine, count)
+    make_session = sessionmaker(bind=engine)
+
+    print(f"Serializing {count} enemies")
+    bench('ORM + json', orm_path, make_session, count)
+    bench('Core + dumps', core_path, make_session, count)
+
+
+if __name__ == "__main__":
+    main()
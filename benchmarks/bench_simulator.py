@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Encounter simulator throughput: trials per second, in total and per core.
+
+Usage: python benchmarks/bench_simulator.py [trials]
+
+A 4-player party fights 6 enemies (the party wins ~90% after ~20 rounds).
+Trials are split evenly over 1, 2, 4, ... worker processes up to the core
+count, the same way server/simulator.py splits them over its pool.
+"""
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from server.simulator import MAX_ROUNDS, combat_arrays, run_trials
+
+PARTY = [
+    {'id': i, 'name': f'P{i}', 'current_hp': 100, 'max_hp': 100, 'str_stat': 14 + i, 'luk_stat': 12}
+    for i in range(4)
+]
+ENEMIES = [
+    {'id': i, 'name': f'G{i}', 'current_hp': 55, 'max_hp': 60, 'str_stat': 11, 'spd_stat': 12 - i % 3,
+     'stm_stat': 8}
+    for i in range(6)
+]
+
+
+def run_chunk(args):
+    return run_trials(*args)
+
+
+def worker_counts():
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+    return counts
+
+
+def main():
+    trials = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    arrays = combat_arrays(PARTY, ENEMIES)
+
+    start = time.perf_counter()
+    rounds, outcome, _ = run_trials(arrays, trials, MAX_ROUNDS, 1)
+    inline = time.perf_counter() - start
+    print(f"{len(PARTY)} players vs {len(ENEMIES)} enemies, {trials} trials: "
+          f"win {np.mean(outcome == 1):.1%}, {rounds.mean():.1f} rounds on average")
+    print(f"{'processes':>9} {'seconds':>8} {'trials/s':>10} {'trials/s/core':>14}")
+    print(f"{'inline':>9} {inline:>8.2f} {trials / inline:>10.0f} {trials / inline:>14.0f}")
+
+    context = multiprocessing.get_context('spawn')
+    for workers in worker_counts():
+        seeds = np.random.SeedSequence(1).spawn(workers)
+        jobs = [(arrays, trials // workers, MAX_ROUNDS, seed) for seed in seeds]
+        with ProcessPoolExecutor(workers, mp_context=context) as pool:
+            # Warm up: start the processes and import numpy before timing
+            list(pool.map(run_chunk, [(arrays, 10, MAX_ROUNDS, 0)] * workers))
+            start = time.perf_counter()
+            list(pool.map(run_chunk, jobs))
+            elapsed = time.perf_counter() - start
+        done = trials // workers * workers
+        print(f"{workers:>9} {elapsed:>8.2f} {done / elapsed:>10.0f} {done / elapsed / workers:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
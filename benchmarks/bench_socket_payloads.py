@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Socket.IO event payloads: bytes on the wire and encode/decode time, JSON vs MessagePack.
+
+Usage: python benchmarks/bench_socket_payloads.py [iterations]
+
+Each event type is encoded the way python-socketio sends it: the JSON path
+as one text packet, the MessagePack path (server/codec.py) as a packet
+header plus one binary attachment. Decode times are the Python equivalent
+of what the browser does with each.
+"""
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from socketio import packet
+
+from server import codec
+
+if not codec.available():
+    raise SystemExit("msgpack is not installed (pip install msgpack)")
+
+NOW = datetime.now()
+SEQ = {'seq': {'host_room': 1042}}
+
+EVENTS = {
+    'new_message': {
+        'sender_name': 'Game Master', 'sender_type': 'host',
+        'message': 'The door creaks open and a cold draft fills the room.',
+        'voice_mode': 'host', 'message_class': 'normal-message',
+        'timestamp': NOW.strftime('%H:%M'), 'is_mystery': False, **SEQ
+    },
+    'player_stats_updated': {
+        'player_id': 12, 'stat_type': 'hp', 'current_value': 37.5, 'max_value': 60.0,
+        'timestamp': NOW.strftime('%H:%M:%S'), **SEQ
+    },
+    'dice_roll_result': {
+        'roller_type': 'player', 'roller_name': 'Aria', 'dice_type': 'd20', 'result': 17,
+        'timestamp': NOW.strftime('%H:%M:%S'), 'player_id': 12, **SEQ
+    },
+    'environmental_change': {
+        'control_type': 'temperature', 'value': 35, 'display_value': 'Cold',
+        'timestamp': NOW.strftime('%H:%M:%S'), **SEQ
+    },
+    'entity_patch': {
+        'type': 'enemy', 'id': 311, 'version': 18, 'changes': {'current_hp': 4.0}, **SEQ
+    },
+}
+
+
+def json_path(event, data):
+    encoded = packet.Packet(packet.EVENT, data=[event, data]).encode()
+    return [encoded]
+
+
+def msgpack_path(event, data):
+    return packet.Packet(packet.EVENT, data=[event, codec.pack(event, data)]).encode()
+
+
+def wire_bytes(parts):
+    return sum(len(part.encode() if isinstance(part, str) else part) for part in parts)
+
+
+def decode_json(parts):
+    return packet.Packet(encoded_packet=parts[0]).data
+
+
+def decode_msgpack(event, parts):
+    pkt = packet.Packet(encoded_packet=parts[0])
+    pkt.add_attachment(parts[1])
+    return codec.unpack(event, pkt.data[1])
+
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"{'event':<22} {'json B':>7} {'msgpack B':>10} {'saved':>6} "
+          f"{'json enc us':>12} {'mp enc us':>10} {'json dec us':>12} {'mp dec us':>10}")
+    for event, data in EVENTS.items():
+        json_parts = json_path(event, data)
+        msgpack_parts = msgpack_path(event, data)
+        json_size = wire_bytes(json_parts)
+        msgpack_size = wire_bytes(msgpack_parts)
+
+        json_encode = timed(lambda: json_path(event, data), iterations)
+        msgpack_encode = timed(lambda: msgpack_path(event, data), iterations)
+        json_decode = timed(lambda: decode_json(json_parts), iterations)
+        msgpack_decode = timed(lambda: decode_msgpack(event, msgpack_parts), iterations)
+
+        print(f"{event:<22} {json_size:>7} {msgpack_size:>10} {1 - msgpack_size / json_size:>6.0%} "
+              f"{json_encode:>12.2f} {msgpack_encode:>10.2f} {json_decode:>12.2f} {msgpack_decode:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
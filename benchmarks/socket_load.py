@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Socket.IO load test: concurrent sockets and message latency per async mode.
+
+Usage: python benchmarks/socket_load.py [--modes threading,gevent,eventlet] [--clients 200] [--messages 20]
+
+For each mode a fresh `serve.py --mode <mode>` is started on a free port.
+--clients players connect and join their rooms, then a host sends
+--messages whispers to every player. The report lists how many sockets
+connected, the connect time, and the p50/p95/max delivery latency.
+Needs python-socketio's client extras (websocket-client, requests).
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+import socketio
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def database_url():
+    """DATABASE_URL, or a throwaway SQLite file with the schema created"""
+    if os.getenv('DATABASE_URL'):
+        return os.environ['DATABASE_URL']
+    path = os.path.join(tempfile.mkdtemp(), 'socket_load.db')
+    url = f'sqlite:///{path}'
+    subprocess.run(
+        [sys.executable, '-c', 'import models; models.Base.metadata.create_all(models.engine)'],
+        cwd=os.path.join(ROOT, 'database'), env={**os.environ, 'DATABASE_URL': url}, check=True
+    )
+    return url
+
+
+def start_server(mode, port, url):
+    env = {**os.environ, 'DATABASE_URL': url}
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'serve.py'), '--mode', mode, '--host', '127.0.0.1', '--port', str(port)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/api/test', timeout=1)
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"server in {mode} mode did not start")
+
+
+def run_mode(mode, clients, messages, database):
+    port = free_port()
+    url = f'http://127.0.0.1:{port}'
+    server = start_server(mode, port, database)
+    latencies = []
+    latencies_lock = threading.Lock()
+    players = []
+    try:
+        start = time.perf_counter()
+        for player_id in range(1, clients + 1):
+            client = socketio.Client(reconnection=False)
+
+            @client.on('new_message')
+            def on_message(data):
+                sent_at = json.loads(data['message'])['sent_at']
+                with latencies_lock:
+                    latencies.append(time.time() - sent_at)
+
+            try:
+                client.connect(url, transports=['websocket'], wait_timeout=10)
+                client.emit('join_game', {'user_type': 'player', 'user_id': player_id, 'user_name': f'Load {player_id}'})
+                players.append(client)
+            except socketio.exceptions.ConnectionError:
+                break
+        connect_time = time.perf_counter() - start
+
+        host = socketio.Client(reconnection=False)
+        host.connect(url, transports=['websocket'])
+        host.emit('join_game', {'user_type': 'host'})
+        time.sleep(0.5)
+
+        targets = list(range(1, len(players) + 1))
+        for _ in range(messages):
+            host.emit('send_message', {
+                'sender_type': 'host',
+                'sender_name': 'Load Test',
+                'message': json.dumps({'sent_at': time.time()}),
+                'target_players': targets
+            })
+            time.sleep(0.05)
+
+        expected = messages * len(players)
+        deadline = time.time() + 30
+        while len(latencies) < expected and time.time() < deadline:
+            time.sleep(0.1)
+        host.disconnect()
+    finally:
+        for client in players:
+            client.disconnect()
+        server.terminate()
+        server.wait()
+
+    if latencies:
+        ordered = sorted(latencies)
+        p50 = statistics.median(ordered) * 1000
+        p95 = ordered[int(len(ordered) * 0.95) - 1] * 1000
+        worst = ordered[-1] * 1000
+    else:
+        p50 = p95 = worst = float('nan')
+    print(f"{mode:<10} {len(players):>8} {connect_time:>10.2f} {len(latencies):>7}/{expected:<7} "
+          f"{p50:>8.1f} {p95:>8.1f} {worst:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', default='threading,gevent')
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'mode':<10} {'sockets':>8} {'connect s':>10} {'delivered':>15} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    database = database_url()
+    for mode in args.modes.split(','):
+        run_mode(mode, args.clients, args.messages, database)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Bulk creation of entities and their stats rows in one transaction"""
+from sqlalchemy import insert
+
+from queries import STAT_FIELDS, stats_model_for
+
+# Largest encounter a single bulk request may spawn
+MAX_BULK_SPAWN = 1000
+
+
+def column_default(column):
+    """Scalar Python-side default of a column, or None"""
+    if column.default is not None and column.default.is_scalar:
+        return column.default.arg
+    return None
+
+
+def expand_spawn_request(data):
+    """Turn a bulk request body into a list of entity dicts.
+
+    Accepts either a JSON array of entities, or
+    {"template": {...}, "count": N, "name_pattern": "Goblin {n}"}.
+    """
+    if isinstance(data, list):
+        entries = data
+    elif isinstance(data, dict) and 'template' in data:
+        template = data['template']
+        if not isinstance(template, dict):
+            raise ValueError("template must be an object")
+        try:
+            count = int(data.get('count', 1))
+        except (TypeError, ValueError):
+            raise ValueError("count must be an integer")
+        # Checked before expanding, so a huge count is refused without building it
+        if count > MAX_BULK_SPAWN:
+            raise ValueError(f"Cannot spawn more than {MAX_BULK_SPAWN} entities at once")
+        name_pattern = data.get('name_pattern') or f"{template.get('name', '')} {{n}}"
+        entries = []
+        for n in range(1, count + 1):
+            entries.append({**template, 'name': name_pattern.replace('{n}', str(n))})
+    else:
+        raise ValueError("Expected a list of entities or a template with a count")
+
+    if not entries:
+        raise ValueError("Nothing to spawn")
+    if len(entries) > MAX_BULK_SPAWN:
+        raise ValueError(f"Cannot spawn more than {MAX_BULK_SPAWN} entities at once")
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get('name'):
+            raise ValueError("Every entity needs a name")
+    return entries
+
+
+def bulk_spawn(db_session, model, fields, entries):
+    """Insert entities and their stats rows in one transaction.
+
+    Rows are filled out to the same key set so SQLAlchemy can batch them into
+    multi-row INSERT ... RETURNING statements. Returns the inserted entity
+    rows (with their new id and version) in input order.
+    """
+    columns = model.__table__.columns
+    rows = [
+        {field: entry[field] if field in entry else column_default(columns[field]) for field in fields}
+        for entry in entries
+    ]
+    ids = db_session.scalars(
+        insert(model).returning(model.id, sort_by_parameter_order=True),
+        rows
+    ).all()
+
+    stats_model = stats_model_for(model)
+    stats_columns = stats_model.__table__.columns
+    owner_key = next(iter(model.stats.property.remote_side)).key
+    stat_rows = []
+    for entity_id, entry in zip(ids, entries):
+        stats = entry.get('stats') or {}
+        stat_row = {field: stats.get(field, column_default(stats_columns[field])) for field in STAT_FIELDS}
+        stat_row[owner_key] = entity_id
+        stat_rows.append(stat_row)
+    db_session.execute(insert(stats_model), stat_rows)
+
+    db_session.commit()
+    for entity_id, row in zip(ids, rows):
+        row['id'] = entity_id
+        row['version'] = 1
+    return rows
@@ -0,0 +1,86 @@
+"""Chat message storage: batched inserts and keyset-paginated history"""
+from sqlalchemy import insert, or_, select
+
+from models import GameSession, Message
+from serializers import entity_columns, rows_to_dicts
+
+# Session used for messages sent without a session_id
+DEFAULT_SESSION_CODE = 'DEFAULT'
+
+_default_session_id = None
+
+
+def default_session_id(db_session):
+    """Id of the catch-all game session, created on first use"""
+    global _default_session_id
+    if _default_session_id is None:
+        session_id = db_session.scalar(
+            select(GameSession.id).where(GameSession.session_code == DEFAULT_SESSION_CODE)
+        )
+        if session_id is None:
+            session_id = db_session.scalar(
+                insert(GameSession).returning(GameSession.id),
+                [{'session_name': 'Default session', 'host_name': 'Host', 'session_code': DEFAULT_SESSION_CODE}]
+            )
+            db_session.commit()
+        _default_session_id = session_id
+    return _default_session_id
+
+
+def encode_targets(player_ids):
+    if not player_ids:
+        return None
+    return ',' + ','.join(str(player_id) for player_id in player_ids) + ','
+
+
+def decode_targets(targets):
+    if not targets:
+        return None
+    # Skip anything that is not an id, so one bad stored row cannot break a history page
+    return [int(player_id) for player_id in targets.strip(',').split(',') if player_id.lstrip('-').isdigit()]
+
+
+def insert_messages(db_session, rows):
+    """Store queued messages with one multi-row INSERT and commit"""
+    fallback_session = None
+    for row in rows:
+        if row['session_id'] is None:
+            if fallback_session is None:
+                fallback_session = default_session_id(db_session)
+            row['session_id'] = fallback_session
+    db_session.execute(insert(Message), rows)
+    db_session.commit()
+
+
+def parse_before(before_arg):
+    """Validate the ?before= cursor (the oldest id of the previous page)"""
+    if before_arg is None:
+        return None
+    try:
+        return int(before_arg)
+    except ValueError:
+        raise ValueError("before must be an integer id")
+
+
+def fetch_history(db_session, session_id, limit, before=None, player_id=None):
+    """One page of a session's messages, walking back from the newest.
+
+    Returns (rows oldest-first, cursor for the next older page or None).
+    With player_id, only that player's messages and the whispers sent to
+    them are returned.
+    """
+    stmt = select(*entity_columns(Message)).where(Message.session_id == session_id)
+    if before is not None:
+        stmt = stmt.where(Message.id < before)
+    if player_id is not None:
+        stmt = stmt.where(or_(
+            Message.player_id == player_id,
+            Message.target_players.contains(f',{player_id},')
+        ))
+    rows = rows_to_dicts(db_session.execute(stmt.order_by(Message.id.desc()).limit(limit)))
+
+    next_cursor = rows[-1]['id'] if len(rows) == limit else None
+    rows.reverse()
+    for row in rows:
+        row['target_players'] = decode_targets(row['target_players'])
+    return rows, next_cursor
@@ -0,0 +1,382 @@
+"""Dice expressions such as 4d6kh3+2, 2d20kl1 or d100<=luk.
+
+An expression is parsed once into a small tuple AST, which is compiled into
+nested closures that each return one NumPy array with a value per roll, so
+rolling an expression 1000 times costs one draw per dice term rather than
+1000 passes through the tree. Compiled expressions are memoized by their
+normalized text (DICE_CACHE_SIZE of them), since a table rolls the same few
+over and over.
+
+Grammar (case and whitespace are ignored):
+    expression := sum [('<=' | '>=' | '<' | '>' | '=' | '==') sum]
+    sum        := product (('+' | '-') product)*
+    product    := unary ('*' unary)*
+    unary      := '-' unary | '(' sum ')' | dice | integer | variable
+    dice       := [count] 'd' (sides | '%') [('kh' | 'kl' | 'dh' | 'dl' | 'k') n]
+
+kh/kl keep the n highest/lowest dice (k alone is kh), dh/dl drop them.
+Variables are the roller's stats: str, stm, spd, luk, mny, hp and max_hp.
+A comparison rolls both sides and reports the left side as the result plus
+whether the comparison held. Expressions whose value could leave the range
+of MAX_MAGNITUDE are rejected when parsed, so results never wrap.
+"""
+import os
+import re
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+from rolls import DICE_MAP
+
+DICE_CACHE_SIZE = int(os.getenv('DICE_CACHE_SIZE', 1024))
+MAX_EXPRESSION_LENGTH = 100
+# Per expression, over all of its dice terms
+MAX_DICE = 100
+MAX_SIDES = 1000
+# Rolls of one expression per request
+MAX_ROLL_COUNT = 1000
+# Integer literals, and the variables an expression is rolled with
+MAX_LITERAL = 1000000
+MAX_VARIABLE = 1000000
+# Largest value any part of an expression may reach: well inside int64, and
+# below 2**53 so float stats (mny) stay exact too
+MAX_MAGNITUDE = 10 ** 15
+
+# Variable name -> combatant row field (see queries.fetch_combatants)
+VARIABLES = {
+    'str': 'str_stat',
+    'stm': 'stm_stat',
+    'spd': 'spd_stat',
+    'luk': 'luk_stat',
+    'mny': 'mny_stat',
+    'hp': 'current_hp',
+    'max_hp': 'max_hp'
+}
+VARIABLE_DEFAULTS = {'str': 10, 'stm': 10, 'spd': 10, 'luk': 10, 'mny': 1.0, 'hp': 0, 'max_hp': 0}
+
+COMPARISONS = {
+    '<=': np.less_equal,
+    '>=': np.greater_equal,
+    '<': np.less,
+    '>': np.greater,
+    '=': np.equal,
+    '==': np.equal
+}
+
+TOKEN = re.compile(r'(?P<dice>(\d*)d(\d+|%)(?:(kh|kl|dh|dl|k)(\d+))?)|(?P<int>\d+)|(?P<name>[a-z_]+)'
+                   r'|(?P<op><=|>=|==|[-+*()<>=])')
+
+# numpy Generators are not thread-safe, so evaluations share one behind a lock
+_rng = np.random.default_rng()
+_rng_lock = threading.Lock()
+
+
+class DiceError(ValueError):
+    pass
+
+
+def tokenize(text):
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = TOKEN.match(text, position)
+        if match is None:
+            raise DiceError(f"Unexpected '{text[position]}' at position {position + 1}")
+        if match.group('dice'):
+            count, sides, keep, keep_count = match.group(2, 3, 4, 5)
+            tokens.append(('dice', (
+                int(count) if count else 1,
+                100 if sides == '%' else int(sides),
+                'kh' if keep == 'k' else keep,
+                int(keep_count) if keep_count else None
+            )))
+        elif match.group('int'):
+            value = int(match.group('int'))
+            if value > MAX_LITERAL:
+                raise DiceError(f"Numbers cannot be larger than {MAX_LITERAL}")
+            tokens.append(('int', value))
+        elif match.group('name'):
+            tokens.append(('name', match.group('name')))
+        else:
+            tokens.append(('op', match.group('op')))
+        position = match.end()
+    return tokens
+
+
+class Parser:
+    """Recursive descent over the token list, building tuple nodes:
+
+    ('dice', count, sides, keep, keep_count), ('int', value), ('var', name),
+    ('neg', node), ('+' | '-' | '*', left, right), ('cmp', op, left, right)
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+        self.dice = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take_op(self, *ops):
+        kind, value = self.peek()
+        if kind == 'op' and value in ops:
+            self.position += 1
+            return value
+        return None
+
+    def parse(self):
+        if not self.tokens:
+            raise DiceError("Empty dice expression")
+        tree = self.sum()
+        op = self.take_op(*COMPARISONS)
+        if op is not None:
+            tree = ('cmp', op, tree, self.sum())
+        if self.position < len(self.tokens):
+            raise DiceError(f"Unexpected '{self.tokens[self.position][1]}'")
+        node_bound(tree)
+        return tree
+
+    def sum(self):
+        tree = self.product()
+        while (op := self.take_op('+', '-')) is not None:
+            tree = (op, tree, self.product())
+        return tree
+
+    def product(self):
+        tree = self.unary()
+        while self.take_op('*') is not None:
+            tree = ('*', tree, self.unary())
+        return tree
+
+    def unary(self):
+        if self.take_op('-') is not None:
+            return ('neg', self.unary())
+        if self.take_op('(') is not None:
+            tree = self.sum()
+            if self.take_op(')') is None:
+                raise DiceError("Missing ')'")
+            return tree
+
+        kind, value = self.peek()
+        if kind is None:
+            raise DiceError("Expression ends too early")
+        self.position += 1
+        if kind == 'dice':
+            return self.dice_node(*value)
+        if kind == 'int':
+            return ('int', value)
+        if kind == 'name':
+            if value not in VARIABLES:
+                raise DiceError(f"Unknown variable '{value}'. Use {', '.join(VARIABLES)}")
+            return ('var', value)
+        raise DiceError(f"Unexpected '{value}'")
+
+    def dice_node(self, count, sides, keep, keep_count):
+        if count < 1 or sides < 1:
+            raise DiceError("Dice need at least one die and one side")
+        if sides > MAX_SIDES:
+            raise DiceError(f"Dice cannot have more than {MAX_SIDES} sides")
+        self.dice += count
+        if self.dice > MAX_DICE:
+            raise DiceError(f"Cannot roll more than {MAX_DICE} dice in one expression")
+        if keep in ('kh', 'kl') and not 1 <= keep_count <= count:
+            raise DiceError(f"Can only keep between 1 and {count} of {count}d{sides}")
+        if keep in ('dh', 'dl') and not 1 <= keep_count < count:
+            raise DiceError(f"Can only drop between 1 and {count - 1} of {count}d{sides}")
+        # Dropping n is keeping the other count - n from the opposite end
+        if keep == 'dh':
+            keep, keep_count = 'kl', count - keep_count
+        elif keep == 'dl':
+            keep, keep_count = 'kh', count - keep_count
+        if keep is not None and keep_count == count:
+            keep = keep_count = None
+        return ('dice', count, sides, keep, keep_count)
+
+
+def dice_label(count, sides, keep, keep_count):
+    return f"{count}d{sides}" + (f"{keep}{keep_count}" if keep else '')
+
+
+def compile_node(tree):
+    """Closure (rng, n, env, detail) -> value per roll (an array, or a scalar
+    for constant subtrees, which NumPy broadcasts)"""
+    kind = tree[0]
+    if kind == 'int':
+        value = tree[1]
+        return lambda rng, n, env, detail: value
+    if kind == 'var':
+        name = tree[1]
+        return lambda rng, n, env, detail: env[name]
+    if kind == 'neg':
+        operand = compile_node(tree[1])
+        return lambda rng, n, env, detail: -operand(rng, n, env, detail)
+    if kind in ('+', '-', '*'):
+        left, right = compile_node(tree[1]), compile_node(tree[2])
+        if kind == '+':
+            return lambda rng, n, env, detail: left(rng, n, env, detail) + right(rng, n, env, detail)
+        if kind == '-':
+            return lambda rng, n, env, detail: left(rng, n, env, detail) - right(rng, n, env, detail)
+        return lambda rng, n, env, detail: left(rng, n, env, detail) * right(rng, n, env, detail)
+    if kind == 'dice':
+        return compile_dice(*tree[1:])
+    raise DiceError(f"Cannot compile {kind}")
+
+
+def compile_dice(count, sides, keep, keep_count):
+    label = dice_label(count, sides, keep, keep_count)
+
+    def roll(rng, n, env, detail):
+        draws = rng.integers(1, sides + 1, size=(n, count))
+        if keep == 'kh':
+            # partition puts the keep_count highest in the last columns without a full sort
+            kept = np.partition(draws, count - keep_count, axis=1)[:, count - keep_count:]
+        elif keep == 'kl':
+            kept = np.partition(draws, keep_count - 1, axis=1)[:, :keep_count]
+        else:
+            kept = draws
+        if detail is not None:
+            entry = {'dice': label, 'rolls': draws[0].tolist()}
+            if keep:
+                entry['kept'] = sorted(kept[0].tolist(), reverse=True)
+            detail.append(entry)
+        return kept.sum(axis=1)
+
+    return roll
+
+
+def node_bound(tree):
+    """Largest absolute value the tree can take, raising DiceError when it or
+    any of its parts could exceed MAX_MAGNITUDE"""
+    kind = tree[0]
+    if kind == 'int':
+        bound = tree[1]
+    elif kind == 'var':
+        bound = MAX_VARIABLE
+    elif kind == 'dice':
+        bound = tree[1] * tree[2]
+    elif kind == 'neg':
+        bound = node_bound(tree[1])
+    elif kind == 'cmp':
+        bound = max(node_bound(tree[2]), node_bound(tree[3]))
+    elif kind == '*':
+        bound = node_bound(tree[1]) * node_bound(tree[2])
+    else:
+        bound = node_bound(tree[1]) + node_bound(tree[2])
+    if bound > MAX_MAGNITUDE:
+        raise DiceError(f"Expression could exceed {MAX_MAGNITUDE:,}")
+    return bound
+
+
+def node_variables(tree):
+    if tree[0] == 'var':
+        return {tree[1]}
+    return set().union(*(node_variables(child) for child in tree[1:] if isinstance(child, tuple)))
+
+
+class DiceExpression:
+    """A parsed expression with its compiled evaluator; get one from parse_expression()"""
+
+    def __init__(self, text, tree):
+        self.text = text
+        self.tree = tree
+        self.variables = frozenset(node_variables(tree))
+        self.comparison = tree[0] == 'cmp'
+        if self.comparison:
+            self.op = tree[1]
+            self._left, self._right = compile_node(tree[2]), compile_node(tree[3])
+        else:
+            self._left, self._right = compile_node(tree), None
+        # A lone d5/d10/d20/d100 keeps the last_<dice>_roll and roll-statistics path
+        self.plain_die = None
+        if tree[0] == 'dice' and tree[1] == 1 and f'd{tree[2]}' in DICE_MAP:
+            self.plain_die = f'd{tree[2]}'
+
+    def evaluate(self, n=1, variables=None, rng=None, detail=None):
+        """Roll n times. Returns (results, successes, targets) as arrays of
+        length n; successes and targets are None unless it is a comparison.
+
+        variables maps names to a number or an array of n numbers (one
+        roller per roll). detail, if a list, collects each dice term's faces
+        from the first roll.
+        """
+        env = variables or {}
+        missing = self.variables - env.keys()
+        if missing:
+            raise DiceError(f"No value for {', '.join(sorted(missing))}")
+        for name in self.variables:
+            # Written so NaN fails too; node_bound() relies on this limit
+            if not np.all(np.abs(env[name]) <= MAX_VARIABLE):
+                raise DiceError(f"{name} must be between -{MAX_VARIABLE} and {MAX_VARIABLE}")
+        if rng is None:
+            with _rng_lock:
+                return self.evaluate(n, env, _rng, detail)
+
+        results = np.broadcast_to(self._left(rng, n, env, detail), (n,))
+        if not self.comparison:
+            return results, None, None
+        targets = np.broadcast_to(self._right(rng, n, env, detail), (n,))
+        return results, COMPARISONS[self.op](results, targets), targets
+
+    def roll(self, variables=None, count=1):
+        """Roll for a response body: one result with its dice, or count results"""
+        if count == 1:
+            detail = []
+            results, successes, targets = self.evaluate(1, variables, detail=detail)
+            rolled = {'expression': self.text, 'result': results[0].item(), 'dice': detail}
+            if self.comparison:
+                rolled['success'] = bool(successes[0])
+                rolled['target'] = targets[0].item()
+            return rolled
+
+        results, successes, _ = self.evaluate(count, variables)
+        rolled = {'expression': self.text, 'results': results.tolist()}
+        if self.comparison:
+            rolled['successes'] = successes.tolist()
+        return rolled
+
+
+def parse_expression(text):
+    """Parse and compile an expression, memoized by its normalized text (so
+    '4d6 + 2' and '4D6+2' share one entry). Raises DiceError."""
+    if not isinstance(text, str):
+        raise DiceError("A dice expression must be a string")
+    if len(text) > MAX_EXPRESSION_LENGTH:
+        raise DiceError(f"Dice expressions are limited to {MAX_EXPRESSION_LENGTH} characters")
+    return compile_expression(''.join(text.lower().split()))
+
+
+@lru_cache(maxsize=DICE_CACHE_SIZE)
+def compile_expression(normalized):
+    return DiceExpression(normalized, Parser(tokenize(normalized)).parse())
+
+
+def stat_variables(row):
+    """Expression variables for a queries.fetch_combatants row"""
+    variables = {}
+    for name, field in VARIABLES.items():
+        value = row.get(field)
+        variables[name] = VARIABLE_DEFAULTS[name] if value is None else value
+    return variables
+
+
+def parse_roll_request(path_expression, body):
+    """(DiceExpression, count) for a roll route: the expression comes from the
+    URL when given there, else from {"expression": ..., "count": n} in the body"""
+    body = body if isinstance(body, dict) else {}
+    text = path_expression if path_expression is not None else body.get('expression')
+    if not isinstance(text, str):
+        raise DiceError("Give a dice type or an expression, e.g. 4d6kh3+2")
+    count = body.get('count', 1)
+    if isinstance(count, bool) or not isinstance(count, int) or not 1 <= count <= MAX_ROLL_COUNT:
+        raise DiceError(f"count must be an integer between 1 and {MAX_ROLL_COUNT}")
+    try:
+        return parse_expression(text), count
+    except DiceError as e:
+        raise DiceError(f"Invalid dice expression '{text}': {e}")
+
+
+def cache_stats():
+    info = compile_expression.cache_info()
+    return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'max_size': info.maxsize}
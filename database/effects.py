@@ -0,0 +1,52 @@
+"""Area effects: HP and stamina changes for many entities in one UPDATE per table"""
+from sqlalchemy import Float, Integer, case, column, update, values
+
+
+def sum_deltas(effects):
+    """Fold (entity_id, hp_delta, stam_delta) into {entity_id: (hp_delta, stam_delta)}.
+
+    An entity hit twice gets one summed row, since an UPDATE ... FROM
+    matches each target row at most once.
+    """
+    totals = {}
+    for entity_id, hp_delta, stam_delta in effects:
+        hp, stam = totals.get(entity_id, (0.0, 0.0))
+        totals[entity_id] = (hp + hp_delta, stam + stam_delta)
+    return totals
+
+
+def clamp(value, upper):
+    """value kept within 0..upper, in SQL"""
+    return case((value < 0.0, 0.0), (value > upper, upper), else_=value)
+
+
+def apply_deltas(db_session, model, deltas):
+    """Add {entity_id: (hp_delta, stam_delta)} onto one table, clamped to 0..max.
+
+    PostgreSQL joins the deltas in as UPDATE ... FROM (VALUES ...); other
+    backends look them up with a CASE on id. Either way it is one statement
+    that reads and writes each row once, so concurrent effects on the same
+    entity add up instead of overwriting each other. Returns {entity_id:
+    row} with the new values for the rows that exist. Does not commit.
+    """
+    table = model.__table__
+    if db_session.get_bind().dialect.name == 'postgresql':
+        source = values(
+            column('id', Integer), column('hp_delta', Float), column('stam_delta', Float),
+            name='deltas'
+        ).data([(entity_id, hp, stam) for entity_id, (hp, stam) in deltas.items()])
+        hp_delta, stam_delta = source.c.hp_delta, source.c.stam_delta
+        stmt = update(table).where(table.c.id == source.c.id)
+    else:
+        hp_delta = case({entity_id: hp for entity_id, (hp, _) in deltas.items()}, value=table.c.id, else_=0.0)
+        stam_delta = case({entity_id: stam for entity_id, (_, stam) in deltas.items()}, value=table.c.id, else_=0.0)
+        stmt = update(table).where(table.c.id.in_(deltas))
+
+    stmt = stmt.values(
+        current_hp=clamp(table.c.current_hp + hp_delta, table.c.max_hp),
+        current_stam=clamp(table.c.current_stam + stam_delta, table.c.max_stam),
+        version=table.c.version + 1
+    ).returning(
+        table.c.id, table.c.name, table.c.current_hp, table.c.current_stam, table.c.version, table.c.session_id
+    )
+    return {row['id']: row for row in db_session.execute(stmt).mappings()}
@@ -0,0 +1,100 @@
+"""Bounded in-process LRU cache of serialized entities for the single-entity GETs.
+
+Entries are keyed by (entity_type, id). Every write path calls invalidate()
+after it commits. Fills are guarded by an epoch so a read that raced with a
+write can never store the pre-write row. The cache is disabled when
+SOCKETIO_MESSAGE_QUEUE runs several workers.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from models import ENTITY_MODELS
+from queries import fetch_one
+
+
+class EntityCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (entity_type, id) -> {variant: data}
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def epoch(self):
+        """Token to take before reading the database for a later put()"""
+        return self._epoch
+
+    def get(self, key, variant):
+        with self._lock:
+            variants = self._entries.get(key)
+            if variants is not None and variant in variants:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return variants[variant]
+            self.misses += 1
+            return None
+
+    def peek(self, key, variant):
+        """Like get() but without touching LRU order or the hit/miss counters"""
+        with self._lock:
+            return self._entries.get(key, {}).get(variant)
+
+    def put(self, key, variant, data, epoch):
+        """Store data unless any write was invalidated since epoch was taken"""
+        with self._lock:
+            if epoch != self._epoch or self.max_entries <= 0:
+                return
+            self._entries.setdefault(key, {})[variant] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, entity_type, entity_id):
+        with self._lock:
+            self._epoch += 1
+            self.invalidations += 1
+            self._entries.pop((entity_type, entity_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# Invalidations only reach the process that made the write, so with several
+# workers sharing a message queue the cache is off rather than stale
+SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+entity_cache = EntityCache(0 if SOCKETIO_MESSAGE_QUEUE else int(os.getenv('ENTITY_CACHE_SIZE', 2048)))
+
+
+def fetch_one_cached(db_session, entity_type, entity_id, include=()):
+    """fetch_one() through the entity cache"""
+    key = (entity_type, entity_id)
+    variant = 'stats' in include
+    data = entity_cache.get(key, variant)
+    if data is not None:
+        return data
+
+    epoch = entity_cache.epoch()
+    data = fetch_one(db_session, ENTITY_MODELS[entity_type], entity_id, include)
+    if data is not None:
+        entity_cache.put(key, variant, data, epoch)
+    return data
@@ -0,0 +1,75 @@
+"""Strong ETags for entity reads, derived from the per-row version column"""
+import hashlib
+
+from flask import Response, request
+
+from entity_cache import entity_cache
+from models import ENTITY_MODELS
+from queries import fetch_version, page_fingerprint
+from server.compression import ENCODING_ETAG_SUFFIXES
+
+
+def entity_etag(entity_type, entity_id, version, include):
+    suffix = '-stats' if 'stats' in include else ''
+    return f"{entity_type}-{entity_id}-v{version}{suffix}"
+
+
+def list_etag(entity_type, args, fingerprint):
+    """ETag for a list request: the canonical query string plus the page fingerprint"""
+    query = '&'.join(f"{key}={value}" for key, value in sorted(args.items(multi=True)))
+    digest = hashlib.sha1(f"{query}|{fingerprint}".encode('utf-8')).hexdigest()[:20]
+    return f"{entity_type}-list-{digest}"
+
+
+def matching_etag(etag):
+    """The variant of etag (plain or compressed) named in If-None-Match, or None"""
+    for suffix in ('',) + ENCODING_ETAG_SUFFIXES:
+        if request.if_none_match.contains(etag + suffix):
+            return etag + suffix
+    return None
+
+
+def not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def with_etag(response, etag):
+    """Attach the ETag and make browsers revalidate it on every fetch"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def check_entity_etag(db_session, entity_type, entity_id, include):
+    """Return a 304 response when If-None-Match still matches, else None.
+
+    A cache hit already knows the version; otherwise only the version column
+    is read, so a matching If-None-Match never serializes the row.
+    """
+    if not request.if_none_match:
+        return None
+
+    cached = entity_cache.peek((entity_type, entity_id), 'stats' in include)
+    if cached is not None:
+        version = cached['version']
+    else:
+        version = fetch_version(db_session, ENTITY_MODELS[entity_type], entity_id)
+    if version is None:
+        return None
+
+    matched = matching_etag(entity_etag(entity_type, entity_id, version, include))
+    if matched is not None:
+        return not_modified(matched)
+    return None
+
+
+def check_list_etag(db_session, entity_type, args):
+    """Return (etag, 304 response or None) for a list GET"""
+    fingerprint = page_fingerprint(db_session, ENTITY_MODELS[entity_type], args)
+    etag = list_etag(entity_type, args, fingerprint)
+    matched = matching_etag(etag)
+    if matched is not None:
+        return etag, not_modified(matched)
+    return etag, None
@@ -1,6 +1,9 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, Float, Boolean, ForeignKey
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship
+from sqlalchemy import create_engine, Column, Integer, String, Text, Float, Boolean, ForeignKey, DateTime, Index, inspect, text
+from sqlalchemy.orm import declarative_base, sessionmaker, relationship, scoped_session
+from sqlalchemy.pool import QueuePool
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -36,9 +39,16 @@ class Player(Base):
     last_d10_roll = Column(Integer)
     last_d20_roll = Column(Integer)
     last_d100_roll = Column(Integer)
+    version = Column(Integer, nullable=False, default=1, server_default='1')  # bumped on every write
+    # Last, where upgrade_tables()'s ALTER TABLE ... ADD COLUMN puts it on
+    # existing databases, so db_console.py's positional reads match either way
+    session_id = Column(Integer, ForeignKey('game_sessions.id'))  # None for rows from before sessions
 
     # Relationship to stats
-    stats = relationship("PlayerStats", back_populates="player", uselist=False)
+    stats = relationship("PlayerStats", back_populates="player", uselist=False, cascade="all, delete-orphan")
+
+    # Per-session lists: WHERE session_id = ? AND id > ? ORDER BY id
+    __table_args__ = (Index('ix_players_session_id_id', 'session_id', 'id'),)
 
 class PlayerStats(Base):
     __tablename__ = 'player_stats'
@@ -77,9 +87,14 @@ class Enemy(Base):
     last_d10_roll = Column(Integer)
     last_d20_roll = Column(Integer)
     last_d100_roll = Column(Integer)
+    version = Column(Integer, nullable=False, default=1, server_default='1')  # bumped on every write
+    session_id = Column(Integer, ForeignKey('game_sessions.id'))  # None for rows from before sessions
 
     # Relationship to stats
-    stats = relationship("EnemyStats", back_populates="enemy", uselist=False)
+    stats = relationship("EnemyStats", back_populates="enemy", uselist=False, cascade="all, delete-orphan")
+
+    # Per-session lists: WHERE session_id = ? AND id > ? ORDER BY id
+    __table_args__ = (Index('ix_enemies_session_id_id', 'session_id', 'id'),)
 
 class EnemyStats(Base):
     __tablename__ = 'enemy_stats'
@@ -118,9 +133,14 @@ class NPC(Base):
     last_d10_roll = Column(Integer)
     last_d20_roll = Column(Integer)
     last_d100_roll = Column(Integer)
+    version = Column(Integer, nullable=False, default=1, server_default='1')  # bumped on every write
+    session_id = Column(Integer, ForeignKey('game_sessions.id'))  # None for rows from before sessions
 
     # Relationship to stats
-    stats = relationship("NpcStats", back_populates="npc", uselist=False)
+    stats = relationship("NpcStats", back_populates="npc", uselist=False, cascade="all, delete-orphan")
+
+    # Per-session lists: WHERE session_id = ? AND id > ? ORDER BY id
+    __table_args__ = (Index('ix_npcs_session_id_id', 'session_id', 'id'),)
 
 class NpcStats(Base):
     __tablename__ = 'npc_stats'
@@ -156,20 +176,186 @@ class Message(Base):
     sender_name = Column(String(128), nullable=False)
     sender_type = Column(String(10), nullable=False)  # 'host', 'player'
     message_content = Column(Text, nullable=False)
+    voice_mode = Column(String(10))
+    player_id = Column(Integer)  # sender, for player messages
+    target_players = Column(Text)  # ",1,4," for host whispers, so LIKE can match one id
+    created_at = Column(DateTime)
     
     # Relationships
     session = relationship("GameSession", back_populates="messages")
 
+    # History is read newest-first per session: WHERE session_id = ? AND id < ?
+    __table_args__ = (Index('ix_messages_session_id_id', 'session_id', 'id'),)
+
+class DiceRoll(Base):
+    """Append-only log of every roll, written in batches by server/roll_log.py"""
+    __tablename__ = 'dice_rolls'
+
+    id = Column(Integer, primary_key=True)
+    entity_type = Column(String(10), nullable=False)  # 'player', 'enemy', 'npc', 'host'
+    entity_id = Column(Integer, nullable=False)  # game session id for host rolls (0 without one)
+    dice_type = Column(String(10), nullable=False)
+    result = Column(Integer, nullable=False)
+    source = Column(String(20), nullable=False)  # 'api', 'batch', 'broadcast'
+    roller_name = Column(String(128))
+    created_at = Column(DateTime)
+
+    __table_args__ = (Index('ix_dice_rolls_entity', 'entity_type', 'entity_id', 'dice_type', 'id'),)
+
+class RollAggregate(Base):
+    """Running totals per entity and die, updated with every logged batch.
+
+    bucket_0..bucket_9 split the faces into ten equal-width ranges, so a
+    d20 histogram counts faces 1-2, 3-4, ... and a d100 counts 1-10, 11-20, ...
+    """
+    __tablename__ = 'roll_aggregates'
+
+    entity_type = Column(String(10), primary_key=True)
+    entity_id = Column(Integer, primary_key=True)
+    dice_type = Column(String(10), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=0)
+    total_squares = Column(Integer, nullable=False, default=0)
+    bucket_0 = Column(Integer, nullable=False, default=0)
+    bucket_1 = Column(Integer, nullable=False, default=0)
+    bucket_2 = Column(Integer, nullable=False, default=0)
+    bucket_3 = Column(Integer, nullable=False, default=0)
+    bucket_4 = Column(Integer, nullable=False, default=0)
+    bucket_5 = Column(Integer, nullable=False, default=0)
+    bucket_6 = Column(Integer, nullable=False, default=0)
+    bucket_7 = Column(Integer, nullable=False, default=0)
+    bucket_8 = Column(Integer, nullable=False, default=0)
+    bucket_9 = Column(Integer, nullable=False, default=0)
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait and how many connections are in use"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._checkouts = 0
+        self._timeouts = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._peak_in_use = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            with self._stats_lock:
+                self._timeouts += 1
+            raise
+        wait = time.perf_counter() - start
+        with self._stats_lock:
+            self._checkouts += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+            self._peak_in_use = max(self._peak_in_use, self.checkedout())
+        return connection
+
+    def metrics(self):
+        """Snapshot of pool sizing and checkout wait statistics"""
+        with self._stats_lock:
+            checkouts = self._checkouts
+            return {
+                "pool_size": self.size(),
+                "max_overflow": self._max_overflow,
+                "in_use": self.checkedout(),
+                "idle": self.checkedin(),
+                "overflow": self.overflow(),
+                "peak_in_use": self._peak_in_use,
+                "checkouts": checkouts,
+                "checkout_failures": self._timeouts,
+                "avg_wait_ms": (self._total_wait / checkouts * 1000) if checkouts else 0.0,
+                "max_wait_ms": self._max_wait * 1000,
+            }
+
+# Entity type names used by the API, mapped to their models
+ENTITY_MODELS = {
+    'player': Player,
+    'enemy': Enemy,
+    'npc': NPC
+}
+
 # Database setup
 DATABASE_URL = os.getenv('DATABASE_URL')
-engine = create_engine(DATABASE_URL)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))  # seconds, -1 disables
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+
+engine = create_engine(
+    DATABASE_URL,
+    poolclass=InstrumentedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,  # survive Postgres restarts
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# One session per request (or Socket.IO event), released by init_app's teardown
+RequestSession = scoped_session(SessionLocal)
+
+def init_app(app):
+    """Return the request-scoped session to the pool when each request ends"""
+    @app.teardown_appcontext
+    def remove_request_session(exception=None):
+        RequestSession.remove()
+
+# Columns and indexes added to tables that existed before them. create_all
+# only creates missing tables, so upgrade_tables() adds these to old ones.
+# Order matters: ADD COLUMN appends, and version goes before session_id.
+ADDED_COLUMNS = [
+    ('players', 'version', "INTEGER NOT NULL DEFAULT 1"),
+    ('players', 'session_id', "INTEGER REFERENCES game_sessions(id)"),
+    ('enemies', 'version', "INTEGER NOT NULL DEFAULT 1"),
+    ('enemies', 'session_id', "INTEGER REFERENCES game_sessions(id)"),
+    ('npcs', 'version', "INTEGER NOT NULL DEFAULT 1"),
+    ('npcs', 'session_id', "INTEGER REFERENCES game_sessions(id)"),
+    ('messages', 'voice_mode', "VARCHAR(10)"),
+    ('messages', 'player_id', "INTEGER"),
+    ('messages', 'target_players', "TEXT"),
+    ('messages', 'created_at', "TIMESTAMP"),
+]
+ADDED_INDEXES = [
+    ('ix_players_session_id_id', 'players', 'session_id, id'),
+    ('ix_enemies_session_id_id', 'enemies', 'session_id, id'),
+    ('ix_npcs_session_id_id', 'npcs', 'session_id, id'),
+    ('ix_messages_session_id_id', 'messages', 'session_id, id'),
+]
+
+def upgrade_tables():
+    """Add ADDED_COLUMNS and ADDED_INDEXES where they are missing. Safe to run
+    any number of times; returns the statements it executed."""
+    existing = inspect(engine)
+    tables = set(existing.get_table_names())
+    # Postgres also skips a column another process added since the inspection
+    if_not_exists = 'IF NOT EXISTS ' if engine.dialect.name == 'postgresql' else ''
+    statements = []
+    for table, column, ddl in ADDED_COLUMNS:
+        if table in tables and column not in {c['name'] for c in existing.get_columns(table)}:
+            statements.append(f"ALTER TABLE {table} ADD COLUMN {if_not_exists}{column} {ddl}")
+    for name, table, columns in ADDED_INDEXES:
+        if table in tables:
+            statements.append(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+    with engine.begin() as connection:
+        for statement in statements:
+            connection.execute(text(statement))
+    return statements
+
 def create_tables():
-    """Create all database tables"""
+    """Create all database tables, and upgrade ones created by older versions"""
     Base.metadata.create_all(bind=engine)
+    for statement in upgrade_tables():
+        if statement.startswith('ALTER'):
+            print(f"Upgraded: {statement}")
     print("All D&D tables created successfully!")
-    print("Tables: players, enemies, npcs, game_sessions, dice_rolls, messages")
+    print("Tables: players, enemies, npcs, game_sessions, dice_rolls, roll_aggregates, messages")
 
 def get_db():
     """Get database session"""
@@ -0,0 +1,207 @@
+"""Shared read queries for the player, enemy and NPC endpoints"""
+from sqlalchemy import func, select
+
+from serializers import entity_columns, rows_to_dicts
+
+# Hard cap on ?limit= so one request can never pull a whole campaign table
+MAX_PAGE_SIZE = 500
+
+# Columns returned under "stats" for ?include=stats
+STAT_FIELDS = ['str_stat', 'stm_stat', 'spd_stat', 'luk_stat', 'mny_stat']
+
+
+def parse_include(include_arg):
+    """Turn a comma separated ?include= value into a set of names"""
+    if not include_arg:
+        return set()
+    include = {name.strip() for name in include_arg.split(',') if name.strip()}
+    unknown = include - {'stats'}
+    if unknown:
+        raise ValueError(f"Unknown include(s): {', '.join(sorted(unknown))}")
+    return include
+
+
+def stats_model_for(model):
+    """Return the *Stats model behind an entity's one-to-one stats relationship"""
+    return model.stats.property.mapper.class_
+
+
+def parse_fields(model, fields_arg):
+    """Turn a comma separated ?fields= value into model columns (id always included)"""
+    columns = model.__table__.columns
+    if not fields_arg:
+        return entity_columns(model)
+
+    names = [name.strip() for name in fields_arg.split(',') if name.strip()]
+    unknown = [name for name in names if name not in columns]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+
+    if 'id' not in names:
+        names.insert(0, 'id')
+    return [columns[name] for name in names]
+
+
+def parse_limit(limit_arg):
+    """Validate ?limit=, returning None when the caller wants every row"""
+    if limit_arg is None:
+        return None
+    try:
+        limit = int(limit_arg)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def parse_after(after_arg):
+    """Validate the ?after= cursor (the last id of the previous page)"""
+    if after_arg is None:
+        return None
+    try:
+        return int(after_arg)
+    except ValueError:
+        raise ValueError("after must be an integer id")
+
+
+def parse_session(session_arg):
+    """Validate ?session_id=, returning None when the list is not scoped"""
+    if session_arg is None:
+        return None
+    try:
+        return int(session_arg)
+    except ValueError:
+        raise ValueError("session_id must be an integer")
+
+
+def entity_select(model, columns, include):
+    """Core select() of the given columns, LEFT JOINing stats when requested"""
+    table = model.__table__
+    if 'stats' not in include:
+        return select(*columns).select_from(table)
+
+    # One LEFT JOIN instead of a lazy stats load per row
+    stats_table = stats_model_for(model).__table__
+    stat_columns = [stats_table.c[field] for field in STAT_FIELDS]
+    joined = table.outerjoin(stats_table, model.stats.property.primaryjoin)
+    return select(*columns, stats_table.c.id.label('stats_id'), *stat_columns).select_from(joined)
+
+
+def nest_stats(rows):
+    """Move the joined stat columns of each row under a "stats" key"""
+    for row in rows:
+        stats = {field: row.pop(field) for field in STAT_FIELDS}
+        row['stats'] = stats if row.pop('stats_id') is not None else None
+    return rows
+
+
+def page_fingerprint(db_session, model, args):
+    """(count, sum of ids, sum of versions) over the rows a list request would return.
+
+    Any insert, delete or write inside the page changes at least one of the
+    three, so it is enough to build a list ETag without serializing rows.
+    """
+    table = model.__table__
+    limit = parse_limit(args.get('limit'))
+    after = parse_after(args.get('after'))
+    session_id = parse_session(args.get('session_id'))
+
+    page = select(table.c.id, table.c.version).order_by(table.c.id)
+    if session_id is not None:
+        page = page.where(table.c.session_id == session_id)
+    if after is not None:
+        page = page.where(table.c.id > after)
+    if limit is not None:
+        page = page.limit(limit)
+    page = page.subquery()
+
+    stmt = select(
+        func.count(),
+        func.coalesce(func.sum(page.c.id), 0),
+        func.coalesce(func.sum(page.c.version), 0)
+    )
+    return tuple(db_session.execute(stmt).one())
+
+
+def fetch_version(db_session, model, entity_id):
+    """Current version of one entity, or None when it does not exist"""
+    table = model.__table__
+    return db_session.execute(select(table.c.version).where(table.c.id == entity_id)).scalar_one_or_none()
+
+
+def fetch_session_id(db_session, model, entity_id):
+    """Game session an entity belongs to (None when unscoped or missing)"""
+    table = model.__table__
+    return db_session.execute(select(table.c.session_id).where(table.c.id == entity_id)).scalar_one_or_none()
+
+
+def fetch_speeds(db_session, model, entity_ids):
+    """{id: (name, spd_stat)} for many entities in one query.
+
+    Entities without a stats row get the column default speed; ids that do
+    not exist are left out.
+    """
+    table = model.__table__
+    stats_table = stats_model_for(model).__table__
+    spd_stat = stats_table.c.spd_stat
+    stmt = (
+        select(table.c.id, table.c.name, func.coalesce(spd_stat, spd_stat.default.arg))
+        .select_from(table.outerjoin(stats_table, model.stats.property.primaryjoin))
+        .where(table.c.id.in_(entity_ids))
+    )
+    return {entity_id: (name, speed) for entity_id, name, speed in db_session.execute(stmt)}
+
+
+def fetch_combatants(db_session, model, entity_ids=None, session_id=None):
+    """HP and stats of the given entities (or of a whole game session), flat rows by id"""
+    table = model.__table__
+    columns = [table.c.id, table.c.name, table.c.current_hp, table.c.max_hp]
+    stmt = entity_select(model, columns, {'stats'}).order_by(table.c.id)
+    if entity_ids is not None:
+        stmt = stmt.where(table.c.id.in_(entity_ids))
+    if session_id is not None:
+        stmt = stmt.where(table.c.session_id == session_id)
+    return rows_to_dicts(db_session.execute(stmt))
+
+
+def fetch_page(db_session, model, args):
+    """Run a keyset-paginated, column-projected list query.
+
+    ?session_id= limits the list to one game session's rows.
+    Returns (rows, next_cursor). next_cursor is None on the last page.
+    """
+    columns = parse_fields(model, args.get('fields'))
+    limit = parse_limit(args.get('limit'))
+    after = parse_after(args.get('after'))
+    include = parse_include(args.get('include'))
+    session_id = parse_session(args.get('session_id'))
+
+    stmt = entity_select(model, columns, include).order_by(model.__table__.c.id)
+    if session_id is not None:
+        # Served by the (session_id, id) index, so other tables' rows are never read
+        stmt = stmt.where(model.__table__.c.session_id == session_id)
+    if after is not None:
+        stmt = stmt.where(model.__table__.c.id > after)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+
+    rows = rows_to_dicts(db_session.execute(stmt))
+    if 'stats' in include:
+        nest_stats(rows)
+
+    next_cursor = None
+    if limit is not None and len(rows) == limit:
+        next_cursor = rows[-1]['id']
+    return rows, next_cursor
+
+
+def fetch_one(db_session, model, entity_id, include=()):
+    """Serialize a single entity by id, or return None when it does not exist"""
+    stmt = entity_select(model, entity_columns(model), include)
+    rows = rows_to_dicts(db_session.execute(stmt.where(model.__table__.c.id == entity_id)))
+    if not rows:
+        return None
+    if 'stats' in include:
+        nest_stats(rows)
+    return rows[0]
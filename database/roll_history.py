@@ -0,0 +1,146 @@
+"""Dice roll log and its incrementally maintained aggregates.
+
+Each flushed batch is appended to dice_rolls and folded into one
+roll_aggregates row per (entity, die) with an upsert that adds to the
+running count, sum, sum of squares and histogram buckets. Reading an
+entity's statistics is then a primary-key lookup, however long the
+history gets.
+"""
+import math
+
+from sqlalchemy import insert, select, update
+
+from models import DiceRoll, RollAggregate
+from rolls import DICE_MAP
+
+HISTOGRAM_BUCKETS = 10
+BUCKET_FIELDS = [f'bucket_{bucket}' for bucket in range(HISTOGRAM_BUCKETS)]
+SUM_FIELDS = ['count', 'total', 'total_squares'] + BUCKET_FIELDS
+KEY_FIELDS = ['entity_type', 'entity_id', 'dice_type']
+
+# Below this many rolls the verdict is "not enough rolls"
+MIN_ROLLS_FOR_VERDICT = 30
+# |z| of the mean beyond which a die is called cursed or blessed (99%)
+VERDICT_Z = 2.576
+
+
+def bucket_for(sides, result):
+    return (result - 1) * HISTOGRAM_BUCKETS // sides
+
+
+def faces_per_bucket(sides):
+    faces = [0] * HISTOGRAM_BUCKETS
+    for face in range(1, sides + 1):
+        faces[bucket_for(sides, face)] += 1
+    return faces
+
+
+def aggregate_rows(rolls):
+    """Fold roll rows into one summed row per (entity_type, entity_id, dice_type)"""
+    groups = {}
+    for roll in rolls:
+        key = (roll['entity_type'], roll['entity_id'], roll['dice_type'])
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = dict(zip(KEY_FIELDS, key), **{field: 0 for field in SUM_FIELDS})
+        result = roll['result']
+        group['count'] += 1
+        group['total'] += result
+        group['total_squares'] += result * result
+        group[BUCKET_FIELDS[bucket_for(DICE_MAP[roll['dice_type']], result)]] += 1
+    return list(groups.values())
+
+
+def _dialect_insert(dialect_name):
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+
+def upsert_aggregates(db_session, groups):
+    """Add summed groups onto roll_aggregates, creating missing rows"""
+    table = RollAggregate.__table__
+    dialect_insert = _dialect_insert(db_session.get_bind().dialect.name)
+    if dialect_insert is not None:
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=KEY_FIELDS,
+            set_={field: table.c[field] + stmt.excluded[field] for field in SUM_FIELDS}
+        )
+        db_session.execute(stmt, groups)
+        return
+
+    # Other backends: UPDATE, then INSERT the rows that did not exist yet
+    for group in groups:
+        stmt = (
+            update(table)
+            .where(*(table.c[field] == group[field] for field in KEY_FIELDS))
+            .values({field: table.c[field] + group[field] for field in SUM_FIELDS})
+        )
+        if db_session.execute(stmt).rowcount == 0:
+            db_session.execute(insert(table), [group])
+
+
+def insert_rolls(db_session, rolls):
+    """Append a batch to dice_rolls and fold it into the aggregates, then commit"""
+    db_session.execute(insert(DiceRoll), rolls)
+    upsert_aggregates(db_session, aggregate_rows(rolls))
+    db_session.commit()
+
+
+def describe_aggregate(row):
+    """Mean, spread, histogram and a fairness verdict for one aggregate row"""
+    sides = DICE_MAP[row['dice_type']]
+    count = row['count']
+    expected_mean = (sides + 1) / 2
+    variance = (sides * sides - 1) / 12
+    mean = row['total'] / count
+    z_score = (mean - expected_mean) / math.sqrt(variance / count)
+
+    histogram = [row[field] for field in BUCKET_FIELDS]
+    chi_square = 0.0
+    degrees_of_freedom = -1
+    for observed, faces in zip(histogram, faces_per_bucket(sides)):
+        if faces:
+            expected = count * faces / sides
+            chi_square += (observed - expected) ** 2 / expected
+            degrees_of_freedom += 1
+
+    if count < MIN_ROLLS_FOR_VERDICT:
+        verdict = 'not enough rolls'
+    elif z_score <= -VERDICT_Z:
+        verdict = 'cursed'
+    elif z_score >= VERDICT_Z:
+        verdict = 'blessed'
+    else:
+        verdict = 'fair'
+
+    return {
+        'dice_type': row['dice_type'],
+        'count': count,
+        'mean': mean,
+        'expected_mean': expected_mean,
+        'stddev': math.sqrt(max(row['total_squares'] / count - mean * mean, 0.0)),
+        'z_score': z_score,
+        'histogram': histogram,
+        'chi_square': chi_square,
+        'degrees_of_freedom': degrees_of_freedom,
+        'verdict': verdict
+    }
+
+
+def fetch_roll_stats(db_session, entity_type, entity_id, dice_type=None):
+    """Described aggregates for one entity, keyed by die"""
+    table = RollAggregate.__table__
+    stmt = select(table).where(table.c.entity_type == entity_type, table.c.entity_id == entity_id)
+    if dice_type is not None:
+        stmt = stmt.where(table.c.dice_type == dice_type)
+    return {
+        row['dice_type']: describe_aggregate(row)
+        for row in db_session.execute(stmt).mappings()
+        if row['count']
+    }
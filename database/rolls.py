@@ -0,0 +1,79 @@
+"""Dice roll persistence shared by the player, enemy and NPC roll endpoints"""
+import random
+import threading
+
+import numpy as np
+from sqlalchemy import case, update
+
+# Sides of each die the roll endpoints accept
+DICE_MAP = {
+    'd5': 5,
+    'd10': 10,
+    'd20': 20,
+    'd100': 100
+}
+
+# numpy Generators are not thread-safe, so batch draws share one behind a lock
+_rng = np.random.default_rng()
+_rng_lock = threading.Lock()
+
+
+def roll_die(dice_type):
+    """Roll one die from DICE_MAP"""
+    return random.randint(1, DICE_MAP[dice_type])
+
+
+def persist_roll(db_session, model, entity_id, dice_type, result):
+    """Store a roll in last_<dice>_roll and return the entity's (name, version, session_id).
+
+    A single UPDATE ... RETURNING, so there is no read round trip and two
+    concurrent rolls cannot overwrite each other's row state. Returns None
+    when the entity does not exist.
+    """
+    table = model.__table__
+    stmt = (
+        update(table)
+        .where(table.c.id == entity_id)
+        .values({f'last_{dice_type}_roll': result, 'version': table.c.version + 1})
+        .returning(table.c.name, table.c.version, table.c.session_id)
+    )
+    row = db_session.execute(stmt).one_or_none()
+    db_session.commit()
+    return row
+
+
+def roll_batch(dice_types):
+    """Roll many DICE_MAP dice with one vectorized draw, returning a list of ints"""
+    sides = np.fromiter((DICE_MAP[dice_type] for dice_type in dice_types), dtype=np.int64, count=len(dice_types))
+    with _rng_lock:
+        results = _rng.integers(1, sides + 1)
+    return results.tolist()
+
+
+def persist_roll_batch(db_session, model, rolls):
+    """Store many rolls for one table with a single UPDATE ... RETURNING.
+
+    rolls is a list of (entity_id, dice_type, result). Each last_<dice>_roll
+    column that was rolled gets a CASE on id, so one statement covers every
+    entity and die; if an entity rolls the same die twice the later roll
+    wins. Returns {entity_id: (name, version, session_id)} for the rows that
+    exist. Does not commit.
+    """
+    table = model.__table__
+    by_column = {}
+    for entity_id, dice_type, result in rolls:
+        by_column.setdefault(f'last_{dice_type}_roll', {})[entity_id] = result
+
+    values = {
+        column: case(results, value=table.c.id, else_=table.c[column])
+        for column, results in by_column.items()
+    }
+    values['version'] = table.c.version + 1
+    entity_ids = {entity_id for entity_id, _, _ in rolls}
+    stmt = (
+        update(table)
+        .where(table.c.id.in_(entity_ids))
+        .values(values)
+        .returning(table.c.id, table.c.name, table.c.version, table.c.session_id)
+    )
+    return {entity_id: tuple(rest) for entity_id, *rest in db_session.execute(stmt)}
@@ -0,0 +1,47 @@
+"""Core-level row serialization for the hot read paths.
+
+Reads go through SQLAlchemy Core select() on the table metadata, so rows come
+back as plain tuples and are zipped straight into dicts without building ORM
+instances. dumps() uses orjson when it is installed.
+"""
+import json
+from datetime import date, datetime
+
+from flask import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+def entity_columns(model):
+    """All table columns of a model, in table order"""
+    return list(model.__table__.columns)
+
+
+def rows_to_dicts(result):
+    """Turn a Core result into a list of dicts keyed by column label"""
+    keys = list(result.keys())
+    return [dict(zip(keys, row)) for row in result]
+
+
+if orjson is not None:
+    def dumps(obj):
+        """Serialize to JSON bytes"""
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def encode_default(value):
+        # orjson writes datetimes as ISO 8601; keep the same output without it
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+    def dumps(obj):
+        """Serialize to JSON bytes"""
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, default=encode_default).encode('utf-8')
+
+
+def json_response(obj, status=200):
+    """Flask response carrying pre-serialized JSON"""
+    return Response(dumps(obj), status=status, mimetype='application/json')
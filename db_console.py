@@ -104,6 +104,16 @@ def setup_database():
         return
     print("Database setup complete!")
 
+def upgrade_database():
+    """Add columns and indexes from newer versions to existing tables, keeping the data"""
+    print("Upgrading database schema...")
+    try:
+        create_tables()
+    except Exception as e:
+        print(f"Failed to upgrade tables: {e}")
+        return
+    print("Database upgrade complete!")
+
 def show_players():
     """Display all players - just ID and name"""
     try:
@@ -350,6 +360,7 @@ def show_commands():
     print("\nAvailable commands:")
     print("  database  - Full database setup (restart Docker + create tables)")
     print("  reset     - Reset Docker containers (keeps existing data)")
+    print("  upgrade   - Add new tables and columns to an existing database (keeps data)")
     print("  status    - Show current system status")
     print("  players   - Show all players (ID and name)")
     print("  enemies   - Show all enemies (ID and name)")
@@ -385,6 +396,8 @@ def main():
                 setup_database()
             elif command.lower() == "reset":
                 restart_docker()
+            elif command.lower() == "upgrade":
+                upgrade_database()
             elif command.lower() == "status":
                 show_status()
             elif command.lower() == "players":
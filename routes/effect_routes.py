@@ -0,0 +1,112 @@
+from flask import Blueprint, jsonify, request
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'database'))
+from models import RequestSession, ENTITY_MODELS
+from effects import apply_deltas, sum_deltas
+from entity_cache import entity_cache
+from server.broadcast import emit_entity_patches, entity_patch
+
+effect_bp = Blueprint('effects', __name__, url_prefix='/api/effects')
+
+# Largest number of entities one effect request may touch
+MAX_EFFECTS = 1000
+
+def handle_database_error(e):
+    error_response = {
+        "detail": [
+            {
+                "loc": ["query"],
+                "msg": str(e),
+                "type": "database_error"
+            }
+        ]
+    }
+    return jsonify(error_response), 422
+
+def parse_delta(entry, field):
+    value = entry.get(field, 0)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{field} must be a number")
+    return float(value)
+
+def parse_effects(data):
+    """Validate an effect body into a list of (entity_type, id, hp_delta, stam_delta)"""
+    entries = data.get('effects') if isinstance(data, dict) else data
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("Expected a non-empty list of effects")
+    if len(entries) > MAX_EFFECTS:
+        raise ValueError(f"Cannot apply more than {MAX_EFFECTS} effects at once")
+
+    parsed = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise ValueError("Each effect must be an object")
+        entity_type = entry.get('entity_type')
+        if entity_type not in ENTITY_MODELS:
+            raise ValueError(f"Invalid entity type: {entity_type}. Use player, enemy, or npc")
+        try:
+            entity_id = int(entry.get('id'))
+        except (TypeError, ValueError):
+            raise ValueError("Each effect needs an integer id")
+        parsed.append((entity_type, entity_id, parse_delta(entry, 'hp_delta'), parse_delta(entry, 'stam_delta')))
+    return parsed
+
+@effect_bp.route('/apply', methods=['POST'])
+def apply_effects():
+    """Damage or heal many players/enemies/NPCs at once (a fireball, a mass heal).
+
+    hp_delta and stam_delta are added to current_hp and current_stam and the
+    result is clamped to 0..max_hp / 0..max_stam, with one UPDATE per table.
+    """
+    session = RequestSession()
+    try:
+        try:
+            effects = parse_effects(request.get_json())
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        by_type = {}
+        for entity_type, entity_id, hp_delta, stam_delta in effects:
+            by_type.setdefault(entity_type, []).append((entity_id, hp_delta, stam_delta))
+
+        updated = {}
+        for entity_type, entity_effects in by_type.items():
+            updated[entity_type] = apply_deltas(session, ENTITY_MODELS[entity_type], sum_deltas(entity_effects))
+        session.commit()
+
+        results = []
+        patches = []
+        missing = []
+        for entity_type, entity_effects in by_type.items():
+            rows = updated[entity_type]
+            for entity_id in dict.fromkeys(entity_id for entity_id, _, _ in entity_effects):
+                row = rows.get(entity_id)
+                if row is None:
+                    missing.append({"entity_type": entity_type, "id": entity_id})
+                    continue
+                entity_cache.invalidate(entity_type, entity_id)
+                results.append({
+                    "entity_type": entity_type,
+                    "id": entity_id,
+                    "name": row['name'],
+                    "current_hp": row['current_hp'],
+                    "current_stam": row['current_stam'],
+                    "version": row['version']
+                })
+                patches.append(entity_patch(entity_type, entity_id, row['version'], {
+                    'current_hp': row['current_hp'],
+                    'current_stam': row['current_stam']
+                }, session_id=row['session_id']))
+        emit_entity_patches(patches)
+
+        return jsonify({
+            "message": f"Applied effects to {len(results)} entities",
+            "results": results,
+            "missing": missing
+        }), 200
+
+    except Exception as e:
+        session.rollback()
+        return handle_database_error(e)
@@ -0,0 +1,195 @@
+from flask import Blueprint, jsonify, request
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'database'))
+from models import RequestSession, ENTITY_MODELS
+from queries import fetch_speeds
+from rolls import roll_batch
+from server.initiative import encounters
+
+encounter_bp = Blueprint('encounters', __name__, url_prefix='/api/encounters')
+
+# Largest number of combatants added in one request
+MAX_COMBATANTS = 1000
+
+def handle_database_error(e):
+    error_response = {
+        "detail": [
+            {
+                "loc": ["query"],
+                "msg": str(e),
+                "type": "database_error"
+            }
+        ]
+    }
+    return jsonify(error_response), 422
+
+def parse_combatants(entries):
+    """Validate a list of {entity_type, id, initiative?} into (entity_type, id, initiative)"""
+    if not isinstance(entries, list):
+        raise ValueError("combatants must be a list")
+    if len(entries) > MAX_COMBATANTS:
+        raise ValueError(f"Cannot add more than {MAX_COMBATANTS} combatants at once")
+
+    parsed = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise ValueError("Each combatant must be an object")
+        entity_type = entry.get('entity_type')
+        if entity_type not in ENTITY_MODELS:
+            raise ValueError(f"Invalid entity type: {entity_type}. Use player, enemy, or npc")
+        try:
+            entity_id = int(entry.get('id'))
+        except (TypeError, ValueError):
+            raise ValueError("Each combatant needs an integer id")
+        initiative = entry.get('initiative')
+        if initiative is not None and not isinstance(initiative, int):
+            raise ValueError("initiative must be an integer")
+        parsed.append((entity_type, entity_id, initiative))
+    return parsed
+
+def load_combatants(session, parsed):
+    """Names and spd_stat initiative (one query per entity type) plus a d20 tiebreak each.
+
+    Returns (combatant tuples for Encounter.add, missing entries).
+    """
+    by_type = {}
+    for entity_type, entity_id, _ in parsed:
+        by_type.setdefault(entity_type, set()).add(entity_id)
+    speeds = {
+        entity_type: fetch_speeds(session, ENTITY_MODELS[entity_type], ids)
+        for entity_type, ids in by_type.items()
+    }
+
+    tiebreaks = roll_batch(['d20'] * len(parsed)) if parsed else []
+    combatants = []
+    missing = []
+    for (entity_type, entity_id, initiative), tiebreak in zip(parsed, tiebreaks):
+        found = speeds[entity_type].get(entity_id)
+        if found is None:
+            missing.append({"entity_type": entity_type, "id": entity_id})
+            continue
+        name, speed = found
+        combatants.append((entity_type, entity_id, name, speed if initiative is None else initiative, tiebreak))
+    return combatants, missing
+
+def get_encounter_or_404(encounter_id):
+    encounter = encounters.get(encounter_id)
+    if encounter is None:
+        return None, (jsonify({"error": "Encounter not found"}), 404)
+    return encounter, None
+
+@encounter_bp.route('', methods=['POST'])
+def create_encounter():
+    """Start an encounter: combatants are ordered by spd_stat and round 1 begins"""
+    data = request.get_json() or {}
+    session_id = data.get('session_id')
+    try:
+        if session_id is not None and not isinstance(session_id, int):
+            raise ValueError("session_id must be an integer")
+        parsed = parse_combatants(data.get('combatants', []))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    session = RequestSession()
+    try:
+        combatants, missing = load_combatants(session, parsed)
+    except Exception as e:
+        session.rollback()
+        return handle_database_error(e)
+
+    encounter = encounters.create(session_id)
+    encounter.add(combatants)
+    encounter.start()
+    encounters.save(encounter)
+    encounters.emit_turn(encounter)
+    return jsonify({**encounter.state(), "missing": missing}), 201
+
+@encounter_bp.route('/<int:encounter_id>', methods=['GET', 'DELETE'])
+def handle_encounter(encounter_id):
+    encounter, not_found = get_encounter_or_404(encounter_id)
+    if not_found:
+        return not_found
+
+    if request.method == 'GET':
+        return jsonify(encounter.state()), 200
+
+    encounters.end(encounter_id)
+    return jsonify({"message": f"Encounter {encounter_id} ended"}), 200
+
+@encounter_bp.route('/<int:encounter_id>/next', methods=['POST'])
+def next_turn(encounter_id):
+    """End the current turn and hand it to the next combatant"""
+    encounter, not_found = get_encounter_or_404(encounter_id)
+    if not_found:
+        return not_found
+
+    encounter.next_turn()
+    encounters.save(encounter)
+    encounters.emit_turn(encounter)
+    return jsonify(encounter.pointer()), 200
+
+@encounter_bp.route('/<int:encounter_id>/combatants', methods=['POST'])
+def add_combatants(encounter_id):
+    """Reinforcements: newcomers whose initiative already passed act next round"""
+    encounter, not_found = get_encounter_or_404(encounter_id)
+    if not_found:
+        return not_found
+
+    data = request.get_json()
+    try:
+        parsed = parse_combatants(data.get('combatants') if isinstance(data, dict) else data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    session = RequestSession()
+    try:
+        combatants, missing = load_combatants(session, parsed)
+    except Exception as e:
+        session.rollback()
+        return handle_database_error(e)
+
+    moved = encounter.add(combatants)
+    encounters.save(encounter)
+    if moved:
+        encounters.emit_turn(encounter)
+    return jsonify({**encounter.state(), "missing": missing}), 200
+
+@encounter_bp.route('/<int:encounter_id>/combatants/<string:entity_type>/<int:entity_id>', methods=['DELETE'])
+def remove_combatant(encounter_id, entity_type, entity_id):
+    """A combatant died or fled; if it was their turn the next one starts"""
+    encounter, not_found = get_encounter_or_404(encounter_id)
+    if not_found:
+        return not_found
+
+    found, moved = encounter.remove(entity_type, entity_id)
+    if not found:
+        return jsonify({"error": "Combatant not found"}), 404
+    encounters.save(encounter)
+    if moved:
+        encounters.emit_turn(encounter)
+    return jsonify(encounter.pointer()), 200
+
+@encounter_bp.route('/<int:encounter_id>/combatants/<string:entity_type>/<int:entity_id>/delay', methods=['POST'])
+def delay_combatant(encounter_id, entity_type, entity_id):
+    """Delay or ready: move a combatant to a new initiative count"""
+    encounter, not_found = get_encounter_or_404(encounter_id)
+    if not_found:
+        return not_found
+
+    data = request.get_json() or {}
+    initiative = data.get('initiative')
+    if not isinstance(initiative, int):
+        return jsonify({"error": "initiative must be an integer"}), 400
+
+    try:
+        found, moved = encounter.delay(entity_type, entity_id, initiative)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not found:
+        return jsonify({"error": "Combatant not found"}), 404
+    encounters.save(encounter)
+    if moved:
+        encounters.emit_turn(encounter)
+    return jsonify(encounter.pointer()), 200
@@ -1,10 +1,25 @@
 from flask import Blueprint, jsonify, request
 import sys
 import os
-import random
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'database'))
-from models import SessionLocal, Enemy
+from models import RequestSession, Enemy
+from queries import fetch_combatants, fetch_page, parse_include
+from entity_cache import entity_cache, fetch_one_cached
+from etags import check_entity_etag, check_list_etag, entity_etag, with_etag
+from serializers import entity_columns, json_response
+from rolls import DICE_MAP, roll_die, persist_roll
+from dice import DiceError, parse_roll_request, stat_variables
+from bulk import bulk_spawn, expand_spawn_request
+from server.broadcast import changed_fields, emit_entity_patch, emit_entity_patches, entity_patch
+from server.roll_log import roll_log
+
+# Fields a host may set when creating enemies
+CREATABLE_FIELDS = [
+    'session_id', 'name', 'title', 'current_hp', 'max_hp', 'current_stam', 'max_stam',
+    'sin', 'virtue', 'skill_name', 'skill_description',
+    'age', 'gender', 'biology', 'main_style', 'ritual'
+]
 
 enemy_bp = Blueprint('enemies', __name__, url_prefix='/api/enemies')
 
@@ -22,39 +37,26 @@ def handle_database_error(e):
 
 @enemy_bp.route('', methods=['GET', 'POST'])
 def handle_enemies():
-    session = SessionLocal()
+    session = RequestSession()
     try:
         if request.method == 'GET':
-            enemies = session.query(Enemy).all()
-            enemy_list = []
-            for enemy in enemies:
-                enemy_list.append({
-                    "id": enemy.id,
-                    "name": enemy.name,
-                    "title": enemy.title,
-                    "current_hp": enemy.current_hp,
-                    "max_hp": enemy.max_hp,
-                    "current_stam": enemy.current_stam,
-                    "max_stam": enemy.max_stam,
-                    "sin": enemy.sin,
-                    "virtue": enemy.virtue,
-                    "skill_name": enemy.skill_name,
-                    "skill_description": enemy.skill_description,
-                    "age": enemy.age,
-                    "gender": enemy.gender,
-                    "biology": enemy.biology,
-                    "main_style": enemy.main_style,
-                    "ritual": enemy.ritual,
-                    "last_d5_roll": enemy.last_d5_roll,
-                    "last_d10_roll": enemy.last_d10_roll,
-                    "last_d20_roll": enemy.last_d20_roll,
-                    "last_d100_roll": enemy.last_d100_roll
-                })
-            return jsonify(enemy_list)
+            try:
+                etag, unchanged = check_list_etag(session, 'enemy', request.args)
+                if unchanged is not None:
+                    return unchanged
+                enemy_list, next_cursor = fetch_page(session, Enemy, request.args)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            response = with_etag(json_response(enemy_list), etag)
+            if next_cursor is not None:
+                response.headers['X-Next-Cursor'] = str(next_cursor)
+            return response
             
         elif request.method == 'POST':
             data = request.get_json()
             new_enemy = Enemy(
+                session_id=data.get('session_id'),
                 name=data.get('name'),
                 title=data.get('title'),
                 current_hp=data.get('current_hp', 100.0),
@@ -74,48 +76,65 @@ def handle_enemies():
             session.add(new_enemy)
             session.commit()
             session.refresh(new_enemy)
+            emit_entity_patch('enemy', new_enemy.id, new_enemy.version, {
+                column.name: getattr(new_enemy, column.name) for column in entity_columns(Enemy)
+            }, session_id=new_enemy.session_id)
             return jsonify({"message": "Enemy created successfully", "id": new_enemy.id}), 201
             
     except Exception as e:
         session.rollback()
         return handle_database_error(e)
-    finally:
-        session.close()
+
+@enemy_bp.route('/bulk', methods=['POST'])
+def bulk_create_enemies():
+    """Spawn a whole group of enemies (and their stats) in one transaction"""
+    session = RequestSession()
+    try:
+        try:
+            entries = expand_spawn_request(request.get_json())
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        rows = bulk_spawn(session, Enemy, CREATABLE_FIELDS, entries)
+        ids = [row['id'] for row in rows]
+        emit_entity_patches([
+            entity_patch('enemy', row['id'], row['version'], row, session_id=row['session_id']) for row in rows
+        ])
+        return jsonify({
+            "message": "Enemies created successfully",
+            "ids": ids,
+            "count": len(ids)
+        }), 201
+
+    except Exception as e:
+        session.rollback()
+        return handle_database_error(e)
 
 @enemy_bp.route('/<int:enemy_id>', methods=['GET', 'PUT', 'DELETE'])
 def handle_enemy_by_id(enemy_id):
-    session = SessionLocal()
+    session = RequestSession()
     try:
+        if request.method == 'GET':
+            try:
+                include = parse_include(request.args.get('include'))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            unchanged = check_entity_etag(session, 'enemy', enemy_id, include)
+            if unchanged is not None:
+                return unchanged
+
+            enemy_data = fetch_one_cached(session, 'enemy', enemy_id, include)
+            if enemy_data is None:
+                return jsonify({"error": "Enemy not found"}), 404
+            etag = entity_etag('enemy', enemy_id, enemy_data['version'], include)
+            return with_etag(json_response(enemy_data), etag)
+
         enemy = session.query(Enemy).filter(Enemy.id == enemy_id).first()
         if not enemy:
             return jsonify({"error": "Enemy not found"}), 404
-            
-        if request.method == 'GET':
-            enemy_data = {
-                "id": enemy.id,
-                "name": enemy.name,
-                "title": enemy.title,
-                "current_hp": enemy.current_hp,
-                "max_hp": enemy.max_hp,
-                "current_stam": enemy.current_stam,
-                "max_stam": enemy.max_stam,
-                "sin": enemy.sin,
-                "virtue": enemy.virtue,
-                "skill_name": enemy.skill_name,
-                "skill_description": enemy.skill_description,
-                "age": enemy.age,
-                "gender": enemy.gender,
-                "biology": enemy.biology,
-                "main_style": enemy.main_style,
-                "ritual": enemy.ritual,
-                "last_d5_roll": enemy.last_d5_roll,
-                "last_d10_roll": enemy.last_d10_roll,
-                "last_d20_roll": enemy.last_d20_roll,
-                "last_d100_roll": enemy.last_d100_roll
-            }
-            return jsonify(enemy_data)
-            
-        elif request.method == 'PUT':
+
+        if request.method == 'PUT':
             data = request.get_json()
             
             # Host can update any field
@@ -129,67 +148,82 @@ def handle_enemy_by_id(enemy_id):
                 if field in data:
                     setattr(enemy, field, data[field])
             
+            changes = changed_fields(enemy, updatable_fields)
+            if changes:
+                # In SQL, so a roll or effect that bumped it since the load is kept
+                enemy.version = Enemy.version + 1
+            session.flush()
+            version, session_id = enemy.version, enemy.session_id
             session.commit()
+            entity_cache.invalidate('enemy', enemy_id)
+            emit_entity_patch('enemy', enemy_id, version, changes, session_id=session_id)
             return jsonify({"message": "Enemy updated successfully"}), 200
             
         elif request.method == 'DELETE':
+            version, session_id = enemy.version, enemy.session_id
             session.delete(enemy)
             session.commit()
+            entity_cache.invalidate('enemy', enemy_id)
+            emit_entity_patch('enemy', enemy_id, version, deleted=True, session_id=session_id)
             return jsonify({"message": f"Enemy with id {enemy_id} deleted successfully"}), 200
         
     except Exception as e:
         session.rollback()
         return handle_database_error(e)
-    finally:
-        session.close()
 
 # HOST DICE ROLLING FOR ENEMIES
+@enemy_bp.route('/<int:enemy_id>/roll', methods=['POST'], defaults={'dice_type': None})
 @enemy_bp.route('/<int:enemy_id>/roll/<string:dice_type>', methods=['POST'])
 def roll_enemy_dice(enemy_id, dice_type):
-    """Host rolls dice for enemies"""
-    session = SessionLocal()
+    """Host rolls dice for enemies.
+
+    dice_type may also be a dice expression such as 4d6kh3+2 or d100<=luk
+    (see database/dice.py); expressions other than a lone die are rolled
+    with the entity's stats and not stored.
+    """
+    session = RequestSession()
     try:
-        enemy = session.query(Enemy).filter(Enemy.id == enemy_id).first()
-        if not enemy:
-            return jsonify({"error": "Enemy not found"}), 404
-            
-        # Determine dice range
-        dice_map = {
-            'd5': 5,
-            'd10': 10,
-            'd20': 20,
-            'd100': 100
-        }
-        
-        if dice_type not in dice_map:
-            return jsonify({"error": "Invalid dice type. Use d5, d10, d20, or d100"}), 400
+        if dice_type not in DICE_MAP:
+            # A dice expression, in the path or as {"expression": ..., "count": n}
+            try:
+                expression, count = parse_roll_request(dice_type, request.get_json(silent=True))
+            except DiceError as e:
+                return jsonify({"error": str(e)}), 400
+            if expression.plain_die is None or count > 1:
+                rows = fetch_combatants(session, Enemy, [enemy_id])
+                if not rows:
+                    return jsonify({"error": "Enemy not found"}), 404
+                try:
+                    rolled = expression.roll(stat_variables(rows[0]), count)
+                except DiceError as e:
+                    return jsonify({"error": str(e)}), 400
+                return jsonify({
+                    "message": f"Rolled {expression.text} for enemy",
+                    "enemy_name": rows[0]['name'],
+                    "dice_type": expression.text,
+                    **rolled
+                }), 200
+            dice_type = expression.plain_die
             
-        # Roll the dice
-        result = random.randint(1, dice_map[dice_type])
-        
-        # Update the appropriate last roll field
-        if dice_type == 'd5':
-            enemy.last_d5_roll = result
-        elif dice_type == 'd10':
-            enemy.last_d10_roll = result
-        elif dice_type == 'd20':
-            enemy.last_d20_roll = result
-        elif dice_type == 'd100':
-            enemy.last_d100_roll = result
-            
-        session.commit()
+        # Roll the dice and store it in one UPDATE ... RETURNING
+        result = roll_die(dice_type)
+        row = persist_roll(session, Enemy, enemy_id, dice_type, result)
+        if row is None:
+            return jsonify({"error": "Enemy not found"}), 404
+        enemy_name, version, session_id = row
+        entity_cache.invalidate('enemy', enemy_id)
+        emit_entity_patch('enemy', enemy_id, version, {f'last_{dice_type}_roll': result}, session_id=session_id)
+        roll_log.record('enemy', enemy_id, dice_type, result, 'api', enemy_name)
         
         # TODO: Broadcast this roll via WebSocket to all connected clients
         
         return jsonify({
             "message": f"Rolled {dice_type} for enemy",
             "result": result,
-            "enemy_name": enemy.name,
+            "enemy_name": enemy_name,
             "dice_type": dice_type
         }), 200
         
     except Exception as e:
         session.rollback()
-        return handle_database_error(e)
-    finally:
-        session.close()
\ No newline at end of file
+        return handle_database_error(e)
\ No newline at end of file
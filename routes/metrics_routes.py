@@ -0,0 +1,55 @@
+from flask import Blueprint, jsonify
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'database'))
+from models import engine
+from entity_cache import entity_cache
+from dice import cache_stats as dice_cache_stats
+from server.chat_log import message_log
+from server.coalescer import stat_coalescer
+from server.initiative import encounters
+from server.replay import replay_log
+from server.roll_log import roll_log
+
+metrics_bp = Blueprint('metrics', __name__, url_prefix='/api/metrics')
+
+@metrics_bp.route('/pool', methods=['GET'])
+def pool_metrics():
+    """Connection pool usage, for sizing DB_POOL_SIZE / DB_MAX_OVERFLOW from data"""
+    return jsonify(engine.pool.metrics())
+
+@metrics_bp.route('/cache', methods=['GET'])
+def cache_metrics():
+    """Entity cache hit/miss/eviction counters"""
+    return jsonify(entity_cache.stats())
+
+@metrics_bp.route('/stat-updates', methods=['GET'])
+def stat_update_metrics():
+    """update_player_stats coalescing: events in vs out, and how long values were held"""
+    return jsonify(stat_coalescer.stats())
+
+@metrics_bp.route('/chat', methods=['GET'])
+def chat_metrics():
+    """Write-behind chat log: messages queued vs written, batch sizes and flush times"""
+    return jsonify(message_log.stats())
+
+@metrics_bp.route('/roll-log', methods=['GET'])
+def roll_log_metrics():
+    """Write-behind roll log: rolls queued vs written, batch sizes and flush times"""
+    return jsonify(roll_log.stats())
+
+@metrics_bp.route('/replay', methods=['GET'])
+def replay_metrics():
+    """Reconnect replay: events sequenced and buffered, replayed vs snapshot fallbacks"""
+    return jsonify(replay_log.stats())
+
+@metrics_bp.route('/encounters', methods=['GET'])
+def encounter_metrics():
+    """Running encounters, combatants in them and turn_changed events sent"""
+    return jsonify(encounters.stats())
+
+@metrics_bp.route('/dice', methods=['GET'])
+def dice_metrics():
+    """Compiled dice expression cache: hits, misses and size"""
+    return jsonify(dice_cache_stats())
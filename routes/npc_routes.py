@@ -1,10 +1,25 @@
 from flask import Blueprint, jsonify, request
 import sys
 import os
-import random
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'database'))
-from models import SessionLocal, NPC
+from models import RequestSession, NPC
+from queries import fetch_combatants, fetch_page, parse_include
+from entity_cache import entity_cache, fetch_one_cached
+from etags import check_entity_etag, check_list_etag, entity_etag, with_etag
+from serializers import entity_columns, json_response
+from rolls import DICE_MAP, roll_die, persist_roll
+from dice import DiceError, parse_roll_request, stat_variables
+from bulk import bulk_spawn, expand_spawn_request
+from server.broadcast import changed_fields, emit_entity_patch, emit_entity_patches, entity_patch
+from server.roll_log import roll_log
+
+# Fields a host may set when creating npcs
+CREATABLE_FIELDS = [
+    'session_id', 'name', 'title', 'current_hp', 'max_hp', 'current_stam', 'max_stam',
+    'sin', 'virtue', 'skill_name', 'skill_description',
+    'age', 'gender', 'biology', 'main_style', 'ritual'
+]
 
 npc_bp = Blueprint('npcs', __name__, url_prefix='/api/npcs')
 
@@ -22,39 +37,26 @@ def handle_database_error(e):
 
 @npc_bp.route('', methods=['GET', 'POST'])
 def handle_npcs():
-    session = SessionLocal()
+    session = RequestSession()
     try:
         if request.method == 'GET':
-            npcs = session.query(NPC).all()
-            npc_list = []
-            for npc in npcs:
-                npc_list.append({
-                    "id": npc.id,
-                    "name": npc.name,
-                    "title": npc.title,
-                    "current_hp": npc.current_hp,
-                    "max_hp": npc.max_hp,
-                    "current_stam": npc.current_stam,
-                    "max_stam": npc.max_stam,
-                    "sin": npc.sin,
-                    "virtue": npc.virtue,
-                    "skill_name": npc.skill_name,
-                    "skill_description": npc.skill_description,
-                    "age": npc.age,
-                    "gender": npc.gender,
-                    "biology": npc.biology,
-                    "main_style": npc.main_style,
-                    "ritual": npc.ritual,
-                    "last_d5_roll": npc.last_d5_roll,
-                    "last_d10_roll": npc.last_d10_roll,
-                    "last_d20_roll": npc.last_d20_roll,
-                    "last_d100_roll": npc.last_d100_roll
-                })
-            return jsonify(npc_list)
+            try:
+                etag, unchanged = check_list_etag(session, 'npc', request.args)
+                if unchanged is not None:
+                    return unchanged
+                npc_list, next_cursor = fetch_page(session, NPC, request.args)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            response = with_etag(json_response(npc_list), etag)
+            if next_cursor is not None:
+                response.headers['X-Next-Cursor'] = str(next_cursor)
+            return response
             
         elif request.method == 'POST':
             data = request.get_json()
             new_npc = NPC(
+                session_id=data.get('session_id'),
                 name=data.get('name'),
                 title=data.get('title'),
                 current_hp=data.get('current_hp', 100.0),
@@ -74,48 +76,65 @@ def handle_npcs():
             session.add(new_npc)
             session.commit()
             session.refresh(new_npc)
+            emit_entity_patch('npc', new_npc.id, new_npc.version, {
+                column.name: getattr(new_npc, column.name) for column in entity_columns(NPC)
+            }, session_id=new_npc.session_id)
             return jsonify({"message": "NPC created successfully", "id": new_npc.id}), 201
             
     except Exception as e:
         session.rollback()
         return handle_database_error(e)
-    finally:
-        session.close()
+
+@npc_bp.route('/bulk', methods=['POST'])
+def bulk_create_npcs():
+    """Spawn a whole group of npcs (and their stats) in one transaction"""
+    session = RequestSession()
+    try:
+        try:
+            entries = expand_spawn_request(request.get_json())
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        rows = bulk_spawn(session, NPC, CREATABLE_FIELDS, entries)
+        ids = [row['id'] for row in rows]
+        emit_entity_patches([
+            entity_patch('npc', row['id'], row['version'], row, session_id=row['session_id']) for row in rows
+        ])
+        return jsonify({
+            "message": "NPCs created successfully",
+            "ids": ids,
+            "count": len(ids)
+        }), 201
+
+    except Exception as e:
+        session.rollback()
+        return handle_database_error(e)
 
 @npc_bp.route('/<int:npc_id>', methods=['GET', 'PUT', 'DELETE'])
 def handle_npc_by_id(npc_id):
-    session = SessionLocal()
+    session = RequestSession()
     try:
+        if request.method == 'GET':
+            try:
+                include = parse_include(request.args.get('include'))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            unchanged = check_entity_etag(session, 'npc', npc_id, include)
+            if unchanged is not None:
+                return unchanged
+
+            npc_data = fetch_one_cached(session, 'npc', npc_id, include)
+            if npc_data is None:
+                return jsonify({"error": "NPC not found"}), 404
+            etag = entity_etag('npc', npc_id, npc_data['version'], include)
+            return with_etag(json_response(npc_data), etag)
+
         npc = session.query(NPC).filter(NPC.id == npc_id).first()
         if not npc:
             return jsonify({"error": "NPC not found"}), 404
-            
-        if request.method == 'GET':
-            npc_data = {
-                "id": npc.id,
-                "name": npc.name,
-                "title": npc.title,
-                "current_hp": npc.current_hp,
-                "max_hp": npc.max_hp,
-                "current_stam": npc.current_stam,
-                "max_stam": npc.max_stam,
-                "sin": npc.sin,
-                "virtue": npc.virtue,
-                "skill_name": npc.skill_name,
-                "skill_description": npc.skill_description,
-                "age": npc.age,
-                "gender": npc.gender,
-                "biology": npc.biology,
-                "main_style": npc.main_style,
-                "ritual": npc.ritual,
-                "last_d5_roll": npc.last_d5_roll,
-                "last_d10_roll": npc.last_d10_roll,
-                "last_d20_roll": npc.last_d20_roll,
-                "last_d100_roll": npc.last_d100_roll
-            }
-            return jsonify(npc_data)
-            
-        elif request.method == 'PUT':
+
+        if request.method == 'PUT':
             data = request.get_json()
             
             # Host can update any field
@@ -129,67 +148,82 @@ def handle_npc_by_id(npc_id):
                 if field in data:
                     setattr(npc, field, data[field])
             
+            changes = changed_fields(npc, updatable_fields)
+            if changes:
+                # In SQL, so a roll or effect that bumped it since the load is kept
+                npc.version = NPC.version + 1
+            session.flush()
+            version, session_id = npc.version, npc.session_id
             session.commit()
+            entity_cache.invalidate('npc', npc_id)
+            emit_entity_patch('npc', npc_id, version, changes, session_id=session_id)
             return jsonify({"message": "NPC updated successfully"}), 200
             
         elif request.method == 'DELETE':
+            version, session_id = npc.version, npc.session_id
             session.delete(npc)
             session.commit()
+            entity_cache.invalidate('npc', npc_id)
+            emit_entity_patch('npc', npc_id, version, deleted=True, session_id=session_id)
             return jsonify({"message": f"NPC with id {npc_id} deleted successfully"}), 200
         
     except Exception as e:
         session.rollback()
         return handle_database_error(e)
-    finally:
-        session.close()
 
 # HOST DICE ROLLING FOR NPCS
+@npc_bp.route('/<int:npc_id>/roll', methods=['POST'], defaults={'dice_type': None})
 @npc_bp.route('/<int:npc_id>/roll/<string:dice_type>', methods=['POST'])
 def roll_npc_dice(npc_id, dice_type):
-    """Host rolls dice for NPCs"""
-    session = SessionLocal()
+    """Host rolls dice for NPCs.
+
+    dice_type may also be a dice expression such as 4d6kh3+2 or d100<=luk
+    (see database/dice.py); expressions other than a lone die are rolled
+    with the entity's stats and not stored.
+    """
+    session = RequestSession()
     try:
-        npc = session.query(NPC).filter(NPC.id == npc_id).first()
-        if not npc:
-            return jsonify({"error": "NPC not found"}), 404
-            
-        # Determine dice range
-        dice_map = {
-            'd5': 5,
-            'd10': 10,
-            'd20': 20,
-            'd100': 100
-        }
-        
-        if dice_type not in dice_map:
-            return jsonify({"error": "Invalid dice type. Use d5, d10, d20, or d100"}), 400
+        if dice_type not in DICE_MAP:
+            # A dice expression, in the path or as {"expression": ..., "count": n}
+            try:
+                expression, count = parse_roll_request(dice_type, request.get_json(silent=True))
+            except DiceError as e:
+                return jsonify({"error": str(e)}), 400
+            if expression.plain_die is None or count > 1:
+                rows = fetch_combatants(session, NPC, [npc_id])
+                if not rows:
+                    return jsonify({"error": "NPC not found"}), 404
+                try:
+                    rolled = expression.roll(stat_variables(rows[0]), count)
+                except DiceError as e:
+                    return jsonify({"error": str(e)}), 400
+                return jsonify({
+                    "message": f"Rolled {expression.text} for NPC",
+                    "npc_name": rows[0]['name'],
+                    "dice_type": expression.text,
+                    **rolled
+                }), 200
+            dice_type = expression.plain_die
             
-        # Roll the dice
-        result = random.randint(1, dice_map[dice_type])
-        
-        # Update the appropriate last roll field
-        if dice_type == 'd5':
-            npc.last_d5_roll = result
-        elif dice_type == 'd10':
-            npc.last_d10_roll = result
-        elif dice_type == 'd20':
-            npc.last_d20_roll = result
-        elif dice_type == 'd100':
-            npc.last_d100_roll = result
-            
-        session.commit()
+        # Roll the dice and store it in one UPDATE ... RETURNING
+        result = roll_die(dice_type)
+        row = persist_roll(session, NPC, npc_id, dice_type, result)
+        if row is None:
+            return jsonify({"error": "NPC not found"}), 404
+        npc_name, version, session_id = row
+        entity_cache.invalidate('npc', npc_id)
+        emit_entity_patch('npc', npc_id, version, {f'last_{dice_type}_roll': result}, session_id=session_id)
+        roll_log.record('npc', npc_id, dice_type, result, 'api', npc_name)
         
         # TODO: Broadcast this roll via WebSocket to all connected clients
         
         return jsonify({
             "message": f"Rolled {dice_type} for NPC",
             "result": result,
-            "npc_name": npc.name,
+            "npc_name": npc_name,
             "dice_type": dice_type
         }), 200
         
     except Exception as e:
         session.rollback()
-        return handle_database_error(e)
-    finally:
-        session.close()
\ No newline at end of file
+        return handle_database_error(e)
\ No newline at end of file
@@ -1,10 +1,17 @@
 from flask import Blueprint, jsonify, request, session as flask_session
 import sys
 import os
-import random
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'database'))
-from models import SessionLocal, Player, PlayerStats
+from models import RequestSession, Player, PlayerStats
+from queries import fetch_combatants, fetch_page, parse_include
+from entity_cache import entity_cache, fetch_one_cached
+from etags import check_entity_etag, check_list_etag, entity_etag, with_etag
+from serializers import entity_columns, json_response
+from rolls import DICE_MAP, roll_die, persist_roll
+from dice import DiceError, parse_roll_request, stat_variables
+from server.broadcast import changed_fields, emit_entity_patch
+from server.roll_log import roll_log
 
 player_bp = Blueprint('players', __name__, url_prefix='/api/players')
 
@@ -42,41 +49,21 @@ def apply_origin_modifiers(base_stats, origin):
 
 @player_bp.route('', methods=['GET', 'POST'])
 def handle_players():
-    db_session = SessionLocal()
+    db_session = RequestSession()
     try:
         if request.method == 'GET':
-            players = db_session.query(Player).all()
-            player_list = []
-            for player in players:
-                player_list.append({
-                    "id": player.id,
-                    "name": player.name,
-                    "title": player.title,
-                    "current_hp": player.current_hp,
-                    "max_hp": player.max_hp,
-                    "current_stam": player.current_stam,
-                    "max_stam": player.max_stam,
-                    "sin": player.sin,
-                    "virtue": player.virtue,
-                    "general_feeling": player.general_feeling,
-                    "skill_name": player.skill_name,
-                    "skill_description": player.skill_description,
-                    "passive_name": player.passive_name,
-                    "passive_description": player.passive_description,
-                    "starter_background": player.starter_background,
-                    "age": player.age,
-                    "gender": player.gender,
-                    "temperature": player.temperature,
-                    "saturation": player.saturation,
-                    "biology": player.biology,
-                    "main_style": player.main_style,
-                    "ritual": player.ritual,
-                    "last_d5_roll": player.last_d5_roll,
-                    "last_d10_roll": player.last_d10_roll,
-                    "last_d20_roll": player.last_d20_roll,
-                    "last_d100_roll": player.last_d100_roll
-                })
-            return jsonify(player_list)
+            try:
+                etag, unchanged = check_list_etag(db_session, 'player', request.args)
+                if unchanged is not None:
+                    return unchanged
+                player_list, next_cursor = fetch_page(db_session, Player, request.args)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            response = with_etag(json_response(player_list), etag)
+            if next_cursor is not None:
+                response.headers['X-Next-Cursor'] = str(next_cursor)
+            return response
             
         elif request.method == 'POST':
             data = request.get_json()
@@ -99,6 +86,7 @@ def handle_players():
             
             # Create the player record
             new_player = Player(
+                session_id=data.get('session_id'),
                 name=data.get('name'),
                 title=data.get('title'),
                 current_hp=data.get('current_hp', 100.0),
@@ -136,6 +124,9 @@ def handle_players():
             db_session.add(new_stats)
             db_session.commit()
             db_session.refresh(new_player)
+            emit_entity_patch('player', new_player.id, new_player.version, {
+                column.name: getattr(new_player, column.name) for column in entity_columns(Player)
+            }, session_id=new_player.session_id)
             
             # Store in Flask session for authentication
             flask_session['player_id'] = new_player.id
@@ -150,64 +141,48 @@ def handle_players():
     except Exception as e:
         db_session.rollback()
         return handle_database_error(e)
-    finally:
-        db_session.close()
 
 @player_bp.route('/<int:player_id>', methods=['GET', 'DELETE'])
 def handle_player_by_id(player_id):
-    db_session = SessionLocal()
+    db_session = RequestSession()
     try:
+        if request.method == 'GET':
+            try:
+                include = parse_include(request.args.get('include'))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            unchanged = check_entity_etag(db_session, 'player', player_id, include)
+            if unchanged is not None:
+                return unchanged
+
+            player_data = fetch_one_cached(db_session, 'player', player_id, include)
+            if player_data is None:
+                return jsonify({"error": "Player not found"}), 404
+            etag = entity_etag('player', player_id, player_data['version'], include)
+            return with_etag(json_response(player_data), etag)
+
         player = db_session.query(Player).filter(Player.id == player_id).first()
         if not player:
             return jsonify({"error": "Player not found"}), 404
-            
-        if request.method == 'GET':
-            player_data = {
-                "id": player.id,
-                "name": player.name,
-                "title": player.title,
-                "current_hp": player.current_hp,
-                "max_hp": player.max_hp,
-                "current_stam": player.current_stam,
-                "max_stam": player.max_stam,
-                "sin": player.sin,
-                "virtue": player.virtue,
-                "general_feeling": player.general_feeling,
-                "skill_name": player.skill_name,
-                "skill_description": player.skill_description,
-                "passive_name": player.passive_name,
-                "passive_description": player.passive_description,
-                "starter_background": player.starter_background,
-                "age": player.age,
-                "gender": player.gender,
-                "temperature": player.temperature,
-                "saturation": player.saturation,
-                "biology": player.biology,
-                "main_style": player.main_style,
-                "ritual": player.ritual,
-                "last_d5_roll": player.last_d5_roll,
-                "last_d10_roll": player.last_d10_roll,
-                "last_d20_roll": player.last_d20_roll,
-                "last_d100_roll": player.last_d100_roll
-            }
-            return jsonify(player_data)
-            
-        elif request.method == 'DELETE':
+
+        if request.method == 'DELETE':
+            version, session_id = player.version, player.session_id
             db_session.delete(player)
             db_session.commit()
+            entity_cache.invalidate('player', player_id)
+            emit_entity_patch('player', player_id, version, deleted=True, session_id=session_id)
             return jsonify({"message": f"Player with id {player_id} deleted successfully"}), 200
         
     except Exception as e:
         db_session.rollback()
         return handle_database_error(e)
-    finally:
-        db_session.close()
 
 # PLAYER-ONLY ENDPOINTS (limited fields they can modify)
 @player_bp.route('/<int:player_id>/update-self', methods=['PUT'])
 def player_update_self(player_id):
     """Allow players to update only their allowed fields"""
-    db_session = SessionLocal()
+    db_session = RequestSession()
     try:
         player = db_session.query(Player).filter(Player.id == player_id).first()
         if not player:
@@ -222,71 +197,83 @@ def player_update_self(player_id):
             if field in data:
                 setattr(player, field, data[field])
         
+        changes = changed_fields(player, allowed_fields)
+        if changes:
+            # In SQL, so a roll or effect that bumped it since the load is kept
+            player.version = Player.version + 1
+        db_session.flush()
+        version, session_id = player.version, player.session_id
         db_session.commit()
+        entity_cache.invalidate('player', player_id)
+        emit_entity_patch('player', player_id, version, changes, session_id=session_id)
         return jsonify({"message": "Player updated successfully"}), 200
         
     except Exception as e:
         db_session.rollback()
         return handle_database_error(e)
-    finally:
-        db_session.close()
 
 # DICE ROLLING ENDPOINTS (players can roll their own dice)
+@player_bp.route('/<int:player_id>/roll', methods=['POST'], defaults={'dice_type': None})
 @player_bp.route('/<int:player_id>/roll/<string:dice_type>', methods=['POST'])
 def roll_dice(player_id, dice_type):
-    """Roll dice and update player's last roll for that dice type"""
-    db_session = SessionLocal()
+    """Roll dice and update player's last roll for that dice type.
+
+    dice_type may also be a dice expression such as 4d6kh3+2 or d100<=luk
+    (see database/dice.py); expressions other than a lone die are rolled
+    with the entity's stats and not stored.
+    """
+    db_session = RequestSession()
     try:
-        player = db_session.query(Player).filter(Player.id == player_id).first()
-        if not player:
-            return jsonify({"error": "Player not found"}), 404
-            
-        # Determine dice range
-        dice_map = {
-            'd5': 5,
-            'd10': 10,
-            'd20': 20,
-            'd100': 100
-        }
-        
-        if dice_type not in dice_map:
-            return jsonify({"error": "Invalid dice type. Use d5, d10, d20, or d100"}), 400
+        if dice_type not in DICE_MAP:
+            # A dice expression, in the path or as {"expression": ..., "count": n}
+            try:
+                expression, count = parse_roll_request(dice_type, request.get_json(silent=True))
+            except DiceError as e:
+                return jsonify({"error": str(e)}), 400
+            if expression.plain_die is None or count > 1:
+                rows = fetch_combatants(db_session, Player, [player_id])
+                if not rows:
+                    return jsonify({"error": "Player not found"}), 404
+                try:
+                    rolled = expression.roll(stat_variables(rows[0]), count)
+                except DiceError as e:
+                    return jsonify({"error": str(e)}), 400
+                return jsonify({
+                    "message": f"Rolled {expression.text}",
+                    "player_name": rows[0]['name'],
+                    "dice_type": expression.text,
+                    **rolled
+                }), 200
+            dice_type = expression.plain_die
             
-        # Roll the dice
-        result = random.randint(1, dice_map[dice_type])
-        
-        # Update the appropriate last roll field
-        if dice_type == 'd5':
-            player.last_d5_roll = result
-        elif dice_type == 'd10':
-            player.last_d10_roll = result
-        elif dice_type == 'd20':
-            player.last_d20_roll = result
-        elif dice_type == 'd100':
-            player.last_d100_roll = result
-            
-        db_session.commit()
+        # Roll the dice and store it in one UPDATE ... RETURNING
+        result = roll_die(dice_type)
+        row = persist_roll(db_session, Player, player_id, dice_type, result)
+        if row is None:
+            return jsonify({"error": "Player not found"}), 404
+        player_name, version, session_id = row
+        entity_cache.invalidate('player', player_id)
+        emit_entity_patch('player', player_id, version, {f'last_{dice_type}_roll': result}, session_id=session_id)
+        roll_log.record('player', player_id, dice_type, result, 'api', player_name)
         
         # TODO: Broadcast this roll via WebSocket to all connected clients
         
         return jsonify({
             "message": f"Rolled {dice_type}",
             "result": result,
-            "player_name": player.name,
+            "player_name": player_name,
             "dice_type": dice_type
         }), 200
         
     except Exception as e:
         db_session.rollback()
         return handle_database_error(e)
-    finally:
-        db_session.close()
 
 # HOST-ONLY ENDPOINTS (full admin control)
 @player_bp.route('/<int:player_id>/host-update', methods=['PUT'])
 def host_update_player(player_id):
     """Allow host to update ANY field on a player"""
-    db_session = SessionLocal()
+    db_session = RequestSession()
     try:
         player = db_session.query(Player).filter(Player.id == player_id).first()
         if not player:
@@ -306,14 +293,20 @@ def host_update_player(player_id):
             if field in data:
                 setattr(player, field, data[field])
         
+        changes = changed_fields(player, updatable_fields)
+        if changes:
+            # In SQL, so a roll or effect that bumped it since the load is kept
+            player.version = Player.version + 1
+        db_session.flush()
+        version, session_id = player.version, player.session_id
         db_session.commit()
+        entity_cache.invalidate('player', player_id)
         
-        # TODO: Broadcast changes via WebSocket to all connected clients
+        # Broadcast only the changed columns to the host and the player
+        emit_entity_patch('player', player_id, version, changes, session_id=session_id)
         
         return jsonify({"message": "Player updated by host successfully"}), 200
         
     except Exception as e:
         db_session.rollback()
-        return handle_database_error(e)
-    finally:
-        db_session.close()
\ No newline at end of file
+        return handle_database_error(e)
\ No newline at end of file
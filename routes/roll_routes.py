@@ -0,0 +1,142 @@
+from flask import Blueprint, jsonify, request
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'database'))
+from models import RequestSession, ENTITY_MODELS
+from rolls import DICE_MAP, roll_batch, persist_roll_batch
+from roll_history import fetch_roll_stats
+from entity_cache import entity_cache
+from server.broadcast import emit_entity_patches, entity_patch
+from server.roll_log import roll_log
+
+roll_bp = Blueprint('rolls', __name__, url_prefix='/api/roll')
+
+# Largest number of rolls accepted in one batch request
+MAX_BATCH_ROLLS = 500
+
+def handle_database_error(e):
+    error_response = {
+        "detail": [
+            {
+                "loc": ["query"],
+                "msg": str(e),
+                "type": "database_error"
+            }
+        ]
+    }
+    return jsonify(error_response), 422
+
+def parse_batch(data):
+    """Validate a batch body into a list of (entity_type, id, dice_type)"""
+    entries = data.get('rolls') if isinstance(data, dict) else data
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("Expected a non-empty list of rolls")
+    if len(entries) > MAX_BATCH_ROLLS:
+        raise ValueError(f"Cannot roll more than {MAX_BATCH_ROLLS} dice at once")
+
+    parsed = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise ValueError("Each roll must be an object")
+        entity_type = entry.get('entity_type')
+        dice_type = entry.get('dice')
+        if entity_type not in ENTITY_MODELS:
+            raise ValueError(f"Invalid entity type: {entity_type}. Use player, enemy, or npc")
+        if dice_type not in DICE_MAP:
+            raise ValueError(f"Invalid dice type: {dice_type}. Use d5, d10, d20, or d100")
+        try:
+            entity_id = int(entry.get('id'))
+        except (TypeError, ValueError):
+            raise ValueError("Each roll needs an integer id")
+        parsed.append((entity_type, entity_id, dice_type))
+    return parsed
+
+@roll_bp.route('/batch', methods=['POST'])
+def batch_roll():
+    """Roll for many players/enemies/NPCs at once.
+
+    All dice are drawn in one vectorized call and each table gets one UPDATE.
+    """
+    session = RequestSession()
+    try:
+        try:
+            entries = parse_batch(request.get_json())
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        results = roll_batch([dice_type for _, _, dice_type in entries])
+
+        by_type = {}
+        for (entity_type, entity_id, dice_type), result in zip(entries, results):
+            by_type.setdefault(entity_type, []).append((entity_id, dice_type, result))
+
+        updated = {}
+        for entity_type, rolls in by_type.items():
+            updated[entity_type] = persist_roll_batch(session, ENTITY_MODELS[entity_type], rolls)
+        session.commit()
+
+        roll_list = []
+        logged = []
+        missing = []
+        changes = {}
+        for (entity_type, entity_id, dice_type), result in zip(entries, results):
+            if entity_id not in updated[entity_type]:
+                missing.append({"entity_type": entity_type, "id": entity_id})
+                continue
+            name, _, _ = updated[entity_type][entity_id]
+            changes.setdefault((entity_type, entity_id), {})[f'last_{dice_type}_roll'] = result
+            roll_list.append({
+                "entity_type": entity_type,
+                "id": entity_id,
+                "name": name,
+                "dice_type": dice_type,
+                "result": result
+            })
+            logged.append(roll_log.row(entity_type, entity_id, dice_type, result, 'batch', name))
+
+        patches = []
+        for (entity_type, entity_id), entity_changes in changes.items():
+            entity_cache.invalidate(entity_type, entity_id)
+            _, version, session_id = updated[entity_type][entity_id]
+            patches.append(entity_patch(entity_type, entity_id, version, entity_changes, session_id=session_id))
+        emit_entity_patches(patches)
+        roll_log.append(*logged)
+
+        return jsonify({
+            "message": f"Rolled {len(roll_list)} dice",
+            "results": roll_list,
+            "missing": missing
+        }), 200
+
+    except Exception as e:
+        session.rollback()
+        return handle_database_error(e)
+
+@roll_bp.route('/stats/<string:entity_type>/<int:entity_id>', methods=['GET'])
+def roll_stats(entity_type, entity_id):
+    """Distribution of an entity's logged rolls per die (?dice= for one die).
+
+    Read from the running aggregates, so the cost does not grow with the
+    number of rolls. Host rolls from dice_roll_broadcast use entity_type
+    "host" and the id of the host's game session (0 without one).
+    """
+    if entity_type not in ENTITY_MODELS and entity_type != 'host':
+        return jsonify({"error": f"Invalid entity type: {entity_type}. Use player, enemy, npc, or host"}), 400
+    dice_type = request.args.get('dice')
+    if dice_type is not None and dice_type not in DICE_MAP:
+        return jsonify({"error": "Invalid dice type. Use d5, d10, d20, or d100"}), 400
+
+    # Count rolls still waiting in the write-behind buffer
+    roll_log.flush()
+
+    session = RequestSession()
+    try:
+        return jsonify({
+            "entity_type": entity_type,
+            "id": entity_id,
+            "dice": fetch_roll_stats(session, entity_type, entity_id, dice_type)
+        }), 200
+    except Exception as e:
+        session.rollback()
+        return handle_database_error(e)
@@ -0,0 +1,116 @@
+from flask import Blueprint, jsonify, request
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+import secrets
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'database'))
+from models import RequestSession, GameSession
+from queries import parse_limit
+from chat import fetch_history, parse_before
+from serializers import json_response
+from server.chat_log import message_log
+
+session_bp = Blueprint('sessions', __name__, url_prefix='/api/sessions')
+
+# Messages per history page when ?limit= is not given
+DEFAULT_HISTORY_PAGE = 50
+
+# Attempts at drawing an unused join code before giving up
+SESSION_CODE_ATTEMPTS = 5
+
+def handle_database_error(e):
+    error_response = {
+        "detail": [
+            {
+                "loc": ["query"],
+                "msg": str(e),
+                "type": "database_error"
+            }
+        ]
+    }
+    return jsonify(error_response), 422
+
+def session_dict(game_session):
+    return {
+        "id": game_session.id,
+        "session_name": game_session.session_name,
+        "host_name": game_session.host_name,
+        "session_code": game_session.session_code,
+        "is_active": game_session.is_active
+    }
+
+@session_bp.route('', methods=['POST'])
+def create_session():
+    """Open a new table; players and entities join it by its id or code"""
+    data = request.get_json() or {}
+    if not data.get('session_name') or not data.get('host_name'):
+        return jsonify({"error": "session_name and host_name are required"}), 400
+
+    session = RequestSession()
+    try:
+        for _ in range(SESSION_CODE_ATTEMPTS):
+            game_session = GameSession(
+                session_name=data['session_name'],
+                host_name=data['host_name'],
+                session_code=secrets.token_hex(3).upper()
+            )
+            session.add(game_session)
+            try:
+                session.commit()
+            except IntegrityError:
+                # Code already taken by another session, draw again
+                session.rollback()
+                continue
+            return jsonify(session_dict(game_session)), 201
+        return jsonify({"error": "Could not allocate a session code"}), 503
+    except Exception as e:
+        session.rollback()
+        return handle_database_error(e)
+
+@session_bp.route('/code/<string:session_code>', methods=['GET'])
+def get_session_by_code(session_code):
+    """Resolve the code players type in to the session id"""
+    session = RequestSession()
+    try:
+        game_session = session.scalars(
+            select(GameSession).where(GameSession.session_code == session_code.upper())
+        ).first()
+        if game_session is None:
+            return jsonify({"error": "Session not found"}), 404
+        return jsonify(session_dict(game_session)), 200
+    except Exception as e:
+        session.rollback()
+        return handle_database_error(e)
+
+@session_bp.route('/<int:session_id>/messages', methods=['GET'])
+def get_session_messages(session_id):
+    """Chat history, newest page first.
+
+    ?limit= caps the page, ?before=<id> continues from the X-Next-Cursor of
+    the previous page, and ?player_id= keeps only what that player can see.
+    """
+    try:
+        limit = parse_limit(request.args.get('limit')) or DEFAULT_HISTORY_PAGE
+        before = parse_before(request.args.get('before'))
+        player_id = request.args.get('player_id', type=int)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Include messages still waiting in the write-behind buffer
+    message_log.flush()
+
+    session = RequestSession()
+    try:
+        if session.scalar(select(GameSession.id).where(GameSession.id == session_id)) is None:
+            return jsonify({"error": "Session not found"}), 404
+
+        rows, next_cursor = fetch_history(session, session_id, limit, before, player_id)
+        response = json_response(rows)
+        if next_cursor is not None:
+            response.headers['X-Next-Cursor'] = str(next_cursor)
+        return response
+    except Exception as e:
+        session.rollback()
+        return handle_database_error(e)
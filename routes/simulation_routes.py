@@ -0,0 +1,96 @@
+from flask import Blueprint, jsonify, request, session as flask_session
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'database'))
+from models import RequestSession, Player, Enemy
+from queries import fetch_combatants
+from server.simulator import MAX_ROUNDS, simulate
+
+simulation_bp = Blueprint('simulations', __name__, url_prefix='/api/simulations')
+
+# Trials per request when "trials" is not given, and the most one request may ask for
+DEFAULT_TRIALS = 100000
+MAX_TRIALS = 1000000
+MAX_SIDE = 100
+# trials x combatants: each run holds float32 hp matrices of that many cells
+# (two of them, ~80 MB each at this limit), and its time grows the same way
+MAX_TRIAL_CELLS = 20000000
+
+def handle_database_error(e):
+    error_response = {
+        "detail": [
+            {
+                "loc": ["query"],
+                "msg": str(e),
+                "type": "database_error"
+            }
+        ]
+    }
+    return jsonify(error_response), 422
+
+def parse_int(data, field, default, low, high):
+    value = data.get(field, default)
+    if isinstance(value, bool) or not isinstance(value, int) or not low <= value <= high:
+        raise ValueError(f"{field} must be an integer between {low} and {high}")
+    return value
+
+def parse_ids(data, field):
+    ids = data.get(field)
+    if ids is None:
+        return None
+    if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        raise ValueError(f"{field} must be a list of integer ids")
+    if len(ids) > MAX_SIDE:
+        raise ValueError(f"Cannot simulate more than {MAX_SIDE} {field}")
+    return ids
+
+# HOST-ONLY: runs can take seconds of CPU on every core
+@simulation_bp.route('', methods=['POST'])
+def run_simulation():
+    """Monte Carlo the party (players) against a set of enemies.
+
+    Body: {"players": [ids], "enemies": [ids], "trials": 100000}. Either list
+    may be left out when "session_id" is given, to take every player or
+    enemy of that game session.
+    """
+    if not flask_session.get('is_host'):
+        return jsonify({"error": "Only the host can run simulations"}), 403
+
+    data = request.get_json() or {}
+    try:
+        trials = parse_int(data, 'trials', DEFAULT_TRIALS, 1, MAX_TRIALS)
+        max_rounds = parse_int(data, 'max_rounds', MAX_ROUNDS, 1, 1000)
+        seed = data.get('seed')
+        if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int) or seed < 0):
+            raise ValueError("seed must be a non-negative integer")
+        session_id = data.get('session_id')
+        if session_id is not None and not isinstance(session_id, int):
+            raise ValueError("session_id must be an integer")
+        player_ids = parse_ids(data, 'players')
+        enemy_ids = parse_ids(data, 'enemies')
+        if session_id is None and (player_ids is None or enemy_ids is None):
+            raise ValueError("Give players and enemies, or a session_id")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    session = RequestSession()
+    try:
+        party = fetch_combatants(session, Player, player_ids, session_id if player_ids is None else None)
+        enemies = fetch_combatants(session, Enemy, enemy_ids, session_id if enemy_ids is None else None)
+    except Exception as e:
+        session.rollback()
+        return handle_database_error(e)
+
+    if not party or not enemies:
+        return jsonify({"error": "Both sides need at least one combatant"}), 400
+    # A whole session can be bigger than an id list may be; the hp matrix grows with both
+    if len(party) > MAX_SIDE or len(enemies) > MAX_SIDE:
+        return jsonify({"error": f"Cannot simulate more than {MAX_SIDE} combatants per side"}), 400
+    combatants = len(party) + len(enemies)
+    if trials * combatants > MAX_TRIAL_CELLS:
+        return jsonify({
+            "error": f"At most {MAX_TRIAL_CELLS // combatants} trials for {combatants} combatants"
+        }), 400
+
+    return jsonify(simulate(party, enemies, trials, max_rounds, seed)), 200
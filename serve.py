@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Production entry point for the Socket.IO server.
+
+Usage: python serve.py [--mode threading|gevent|eventlet] [--host 0.0.0.0] [--port 8000]
+
+gevent (recommended) and eventlet run every socket on a green thread. Their
+monkey patching has to happen before anything else is imported, and
+psycogreen makes psycopg2 yield to the event loop while it waits on
+Postgres, so a slow query never stalls the other sockets. threading is the
+werkzeug development setup that `python app.py` uses.
+"""
+import argparse
+import os
+
+ASYNC_MODES = ['threading', 'gevent', 'eventlet']
+
+
+def patch_for(mode):
+    """Monkey patch the stdlib and make psycopg2 cooperative for green modes"""
+    if mode == 'threading':
+        return
+
+    if mode == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+    elif mode == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch()
+
+    try:
+        if mode == 'gevent':
+            from psycogreen.gevent import patch_psycopg
+        else:
+            from psycogreen.eventlet import patch_psycopg
+    except ImportError:
+        raise SystemExit(f"--mode {mode} needs psycogreen so database calls do not block the event loop "
+                         "(pip install psycogreen)")
+    patch_psycopg()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the D&D Socket.IO server")
+    parser.add_argument('--mode', choices=ASYNC_MODES, default=os.getenv('SOCKETIO_ASYNC_MODE', 'gevent'))
+    parser.add_argument('--host', default=os.getenv('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', 8000)))
+    args = parser.parse_args()
+
+    patch_for(args.mode)
+    os.environ['SOCKETIO_ASYNC_MODE'] = args.mode
+
+    from app import app, socketio
+
+    print(f"Serving on {args.host}:{args.port} ({socketio.async_mode})")
+    socketio.run(app, host=args.host, port=args.port, allow_unsafe_werkzeug=args.mode == 'threading')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Socket.IO broadcasting of entity changes from the REST write paths.
+
+Writes emit an ``entity_patch`` event carrying only the columns that
+changed, so dashboards can patch their local state instead of refetching:
+
+    {"type": "player", "id": 3, "version": 8, "changes": {"current_hp": 42.0}}
+
+Deletions send ``"deleted": true`` and no changes. Patches go to the host
+of the entity's game session and, for players, to that player's own room.
+
+host_room and all_players exist once per game session, named
+"session_<id>:host_room"; entities and sockets without a session use the
+plain global names. player_<id> rooms need no prefix, player ids are unique.
+"""
+from flask import current_app
+from sqlalchemy import inspect
+
+
+def get_socketio():
+    return current_app.extensions['socketio']
+
+
+def session_room(room, session_id=None):
+    """Name of a shared room (host_room, all_players) within one game session"""
+    if session_id is None:
+        return room
+    return f'session_{session_id}:{room}'
+
+
+def entity_rooms(entity_type, entity_id, session_id=None):
+    """Rooms that should hear about changes to one entity"""
+    rooms = [session_room('host_room', session_id)]
+    if entity_type == 'player':
+        rooms.append(f'player_{entity_id}')
+    return rooms
+
+
+def player_rooms(player_ids):
+    """player_<id> rooms for a list of ids, without duplicates"""
+    return [f'player_{player_id}' for player_id in dict.fromkeys(player_ids)]
+
+
+def multicast(event, data, rooms):
+    """Emit one event to many rooms in a single call.
+
+    The packet is encoded once (and published once on a message queue), and
+    a socket that sits in several of the rooms still receives it only once.
+    """
+    if rooms:
+        get_socketio().emit(event, data, to=list(rooms))
+
+
+def changed_fields(obj, fields):
+    """{field: new value} for the given ORM attributes that really changed.
+
+    Must run before the session flushes, while attribute history is intact.
+    """
+    state = inspect(obj)
+    changes = {}
+    for field in fields:
+        history = state.attrs[field].history
+        if not history.added:
+            continue
+        if history.deleted and history.deleted[0] == history.added[0]:
+            continue
+        changes[field] = history.added[0]
+    return changes
+
+
+def entity_patch(entity_type, entity_id, version, changes=None, deleted=False, session_id=None):
+    patch = {'type': entity_type, 'id': entity_id, 'version': version}
+    if session_id is not None:
+        patch['session_id'] = session_id
+    if deleted:
+        patch['deleted'] = True
+    else:
+        patch['changes'] = changes
+    return patch
+
+
+def emit_entity_patch(entity_type, entity_id, version, changes=None, deleted=False, session_id=None):
+    """Send one entity_patch (skipped when nothing changed)"""
+    if not deleted and not changes:
+        return
+    patch = entity_patch(entity_type, entity_id, version, changes, deleted, session_id)
+    get_socketio().emit('entity_patch', patch, to=entity_rooms(entity_type, entity_id, session_id))
+
+
+def emit_entity_patches(patches):
+    """Send many patches: one entity_patch_batch per session's host, singles to players"""
+    if not patches:
+        return
+    socketio = get_socketio()
+    by_session = {}
+    for patch in patches:
+        by_session.setdefault(patch.get('session_id'), []).append(patch)
+    for session_id, session_patches in by_session.items():
+        socketio.emit('entity_patch_batch', {'patches': session_patches}, to=session_room('host_room', session_id))
+    for patch in patches:
+        if patch['type'] == 'player':
+            socketio.emit('entity_patch', patch, to=f"player_{patch['id']}")
@@ -0,0 +1,46 @@
+"""Write-behind persistence of chat messages.
+
+handle_message only appends to an in-memory buffer; a background task
+writes it to the messages table in one multi-row INSERT every
+CHAT_FLUSH_MS, or as soon as CHAT_FLUSH_SIZE messages are waiting.
+"""
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'database'))
+from chat import encode_targets, insert_messages
+from models import Message
+from server.write_behind import WriteBehindLog, clip
+
+CHAT_FLUSH_MS = int(os.getenv('CHAT_FLUSH_MS', 500))
+CHAT_FLUSH_SIZE = int(os.getenv('CHAT_FLUSH_SIZE', 100))
+CHAT_MAX_BUFFER = int(os.getenv('CHAT_MAX_BUFFER', 10000))
+
+
+class MessageLog(WriteBehindLog):
+    name = 'chat messages'
+
+    def write(self, db_session, rows):
+        insert_messages(db_session, rows)
+
+    def submit(self, message_data, session_id=None, target_players=None):
+        """Queue a message built by handle_message for the next flush.
+
+        Client-supplied fields are cut to their column sizes here, so one
+        oversized value cannot fail the whole batch.
+        """
+        player_id = message_data.get('player_id')
+        self.append({
+            'session_id': session_id,
+            'sender_name': clip(message_data['sender_name'], Message.sender_name),
+            'sender_type': clip(message_data['sender_type'], Message.sender_type),
+            'message_content': str(message_data['message']),
+            'voice_mode': clip(message_data.get('voice_mode'), Message.voice_mode),
+            'player_id': player_id if isinstance(player_id, int) and not isinstance(player_id, bool) else None,
+            'target_players': encode_targets(target_players),
+            'created_at': datetime.now()
+        })
+
+
+message_log = MessageLog(CHAT_FLUSH_MS, CHAT_FLUSH_SIZE, CHAT_MAX_BUFFER)
@@ -0,0 +1,111 @@
+"""Coalescing of high-frequency update_player_stats events.
+
+Dragging an HP or stamina slider fires dozens of events per second. Instead
+of re-emitting each one, the latest value per (player_id, stat_type) is held
+for STAT_COALESCE_MS and flushed by a background task. Later values overwrite
+earlier ones, so the last value sent is always the one delivered; an emit
+that fails (e.g. the message queue is briefly down) is retried next flush.
+"""
+import os
+import threading
+import time
+
+from server.broadcast import session_room
+
+STAT_COALESCE_MS = int(os.getenv('STAT_COALESCE_MS', 75))
+
+
+class StatCoalescer:
+    def __init__(self, interval_ms):
+        self.interval = interval_ms / 1000
+        self.socketio = None
+        self._pending = {}  # (player_id, stat_type) -> (update_data, session_id, first_received)
+        self._lock = threading.Lock()
+        self._flusher_started = False
+        self.received = 0
+        self.emitted = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self._total_hold = 0.0
+        self._max_hold = 0.0
+
+    def init_app(self, socketio):
+        self.socketio = socketio
+
+    def submit(self, update_data, session_id=None):
+        """Queue an update; it is emitted on the next flush unless overwritten first"""
+        if self.interval <= 0:
+            with self._lock:
+                self.received += 1
+            self._emit(update_data, session_id)
+            return
+
+        key = (update_data['player_id'], update_data['stat_type'])
+        now = time.monotonic()
+        with self._lock:
+            self.received += 1
+            if key in self._pending:
+                self.coalesced += 1
+                first_received = self._pending[key][2]
+            else:
+                first_received = now
+            self._pending[key] = (update_data, session_id, first_received)
+            start_flusher = not self._flusher_started
+            self._flusher_started = True
+        if start_flusher:
+            self.socketio.start_background_task(self._run)
+
+    def _run(self):
+        # Never let an exception end the loop: nothing would restart it
+        while True:
+            self.socketio.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Flushing stat updates failed: {e}")
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if pending:
+                self.flushes += 1
+        now = time.monotonic()
+        for key, (update_data, session_id, first_received) in pending.items():
+            try:
+                self._emit(update_data, session_id)
+            except Exception as e:
+                # Put it back for the next flush unless a newer value already replaced it
+                print(f"Emitting stat update failed, will retry: {e}")
+                with self._lock:
+                    self._pending.setdefault(key, (update_data, session_id, first_received))
+                continue
+            hold = now - first_received
+            with self._lock:
+                self._total_hold += hold
+                self._max_hold = max(self._max_hold, hold)
+
+    def _emit(self, update_data, session_id):
+        # Send to the host of the player's game session
+        self.socketio.emit('player_stats_updated', update_data, to=session_room('host_room', session_id))
+
+        # Send to specific player
+        self.socketio.emit('stats_updated', update_data, to=f"player_{update_data['player_id']}")
+        with self._lock:
+            self.emitted += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "interval_ms": self.interval * 1000,
+                "received": self.received,
+                "emitted": self.emitted,
+                "coalesced": self.coalesced,
+                "pending": len(self._pending),
+                "flushes": self.flushes,
+                "reduction": 1 - self.emitted / self.received if self.received else 0.0,
+                "avg_hold_ms": self._total_hold / self.emitted * 1000 if self.emitted else 0.0,
+                "max_hold_ms": self._max_hold * 1000,
+            }
+
+
+stat_coalescer = StatCoalescer(STAT_COALESCE_MS)
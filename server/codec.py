@@ -0,0 +1,108 @@
+"""Opt-in MessagePack encoding of Socket.IO room events.
+
+A client asks for it with join_game {..., "encoding": "msgpack"}. It is
+then put in "<room>#msgpack" instead of each of its rooms, and every emit
+to those rooms is also sent once to the binary variants as a MessagePack
+attachment. join_success answers with the encoding actually used (json
+when msgpack is not installed) and the schemas below.
+
+Events with a schema are packed as an array of values in schema order
+instead of a map, so keys are not repeated in every event; keys outside
+the schema (e.g. seq) follow as one trailing map. "timestamp" becomes
+integer epoch seconds instead of a formatted local time. Events sent to
+everyone or to a single socket stay JSON, so binary clients must still
+accept JSON events.
+"""
+import time
+
+import socketio
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+BINARY_SUFFIX = '#msgpack'
+
+EVENT_SCHEMAS = {
+    'new_message': ['sender_name', 'sender_type', 'message', 'voice_mode', 'message_class',
+                    'timestamp', 'is_mystery', 'player_id'],
+    'message_sent': ['sender_name', 'sender_type', 'message', 'voice_mode', 'message_class',
+                     'timestamp', 'is_mystery', 'targets', 'target_count'],
+    'player_stats_updated': ['player_id', 'stat_type', 'current_value', 'max_value', 'timestamp'],
+    'stats_updated': ['player_id', 'stat_type', 'current_value', 'max_value', 'timestamp'],
+    'dice_roll_result': ['roller_type', 'roller_name', 'dice_type', 'result', 'timestamp', 'player_id',
+                         'success', 'dice'],
+    'environmental_change': ['control_type', 'value', 'display_value', 'timestamp'],
+    'entity_patch': ['type', 'id', 'version', 'changes', 'deleted'],
+    'turn_changed': ['encounter_id', 'round', 'turn', 'entity_type', 'entity_id', 'name', 'initiative'],
+}
+
+
+def available():
+    return msgpack is not None
+
+
+def binary_room(room):
+    return room + BINARY_SUFFIX
+
+
+def compact(event, data):
+    """The array (or map, for events without a schema) that gets packed"""
+    if 'timestamp' in data:
+        data = {**data, 'timestamp': int(time.time())}
+    schema = EVENT_SCHEMAS.get(event)
+    if schema is None:
+        return data
+    values = [data.get(key) for key in schema]
+    extras = {key: value for key, value in data.items() if key not in schema}
+    if extras:
+        values.append(extras)
+    return values
+
+
+def expand(event, values):
+    """Inverse of compact(), for Python clients and the benchmark"""
+    schema = EVENT_SCHEMAS.get(event)
+    if schema is None:
+        return values
+    data = {key: value for key, value in zip(schema, values) if value is not None}
+    if len(values) > len(schema):
+        data.update(values[-1])
+    return data
+
+
+def pack(event, data):
+    return msgpack.packb(compact(event, data), use_bin_type=True)
+
+
+def unpack(event, payload):
+    return expand(event, msgpack.unpackb(payload, raw=False, strict_map_key=False))
+
+
+class BinaryEncoder:
+    """Manager hook: the packed payload and binary rooms for one emit"""
+
+    def __init__(self, sequenced_rooms):
+        self.sequenced_rooms = sequenced_rooms
+        self.manager = None
+        self.packed = 0
+
+    def init_app(self, socketio_app):
+        manager = socketio_app.server.manager
+        if available() and hasattr(manager, 'encode_binary'):
+            self.manager = manager
+            manager.encode_binary = self
+
+    def __call__(self, event, data, room, namespace):
+        if room is None or not isinstance(data, dict):
+            return None
+        rooms = [binary_room(r) for r in self.sequenced_rooms(room)]
+        if not isinstance(self.manager, socketio.PubSubManager):
+            # One process: skip the packing when no binary client is listening
+            local_rooms = self.manager.rooms.get(namespace, {})
+            rooms = [r for r in rooms if r in local_rooms]
+        if not rooms:
+            return None
+        self.packed += 1
+        return pack(event, data), rooms
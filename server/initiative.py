@@ -0,0 +1,326 @@
+"""Server-side initiative and turn order for encounters.
+
+Combatants act in descending spd_stat order, ties broken by a d20 rolled
+when they join (then by join order). Each encounter keeps two heaps: the
+combatants still to act this round and the ones that already acted and
+wait for the next round. Advancing the turn, adding a combatant, removing
+one (it died or fled) and delaying one are all O(log n): removal only marks
+the heap entry dead and it is skipped when it reaches the top, with a
+rebuild once dead entries outnumber live ones.
+
+Only changes of the turn pointer (whose turn it is, which round) are
+broadcast, as a turn_changed event to the encounter's game session:
+
+    {"encounter_id": 1, "round": 2, "turn": 9, "entity_type": "enemy",
+     "entity_id": 14, "name": "Goblin 3", "initiative": 12}
+
+With one process encounters live in memory. With several workers
+(SOCKETIO_MESSAGE_QUEUE, see server/scaleout.py) each request loads the
+encounter from a shared hash and saves it back after a change, so any
+worker can serve it. Two workers changing the same encounter at the same
+instant is last-write-wins; an encounter is driven by its host, so that
+does not come up in play. ENCOUNTER_STORE_URL defaults to the queue URL.
+"""
+import heapq
+import itertools
+import json
+import os
+import threading
+
+from server.broadcast import multicast, session_room
+from server.scaleout import SOCKETIO_MESSAGE_QUEUE, hash_client
+
+ENCOUNTER_STORE_URL = os.getenv('ENCOUNTER_STORE_URL', SOCKETIO_MESSAGE_QUEUE)
+
+# Rebuild the heaps once this many dead entries pile up (and outnumber live ones)
+COMPACT_AFTER = 64
+
+
+class Encounter:
+    def __init__(self, encounter_id, session_id=None):
+        self.id = encounter_id
+        self.session_id = session_id
+        self.round = 0
+        self.turn = 0
+        self.current = None  # heap entry of the combatant whose turn it is
+        self._pending = []  # still to act this round
+        self._next_round = []  # already acted
+        self._entries = {}  # (entity_type, entity_id) -> heap entry
+        self._order = itertools.count()
+        self._dead = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _sort_key(entry):
+        return entry[:3]
+
+    def _make_entry(self, key, name, initiative, tiebreak):
+        # [-initiative, -tiebreak, join order, combatant, round it is queued for];
+        # the combatant slot is None once removed
+        combatant = {'entity_type': key[0], 'entity_id': key[1], 'name': name,
+                     'initiative': initiative, 'tiebreak': tiebreak}
+        return [-initiative, -tiebreak, next(self._order), combatant, self.round]
+
+    def _queue_next_round(self, entry):
+        entry[4] = self.round + 1
+        heapq.heappush(self._next_round, entry)
+
+    def _place(self, entry, acted=False):
+        """Queue an entry for this round, or the next if its slot already passed"""
+        if acted or (self.current is not None and self._sort_key(entry) < self._sort_key(self.current)):
+            self._queue_next_round(entry)
+        else:
+            entry[4] = self.round
+            heapq.heappush(self._pending, entry)
+
+    def _kill(self, entry):
+        entry[3] = None
+        self._dead += 1
+        if self._dead > COMPACT_AFTER and self._dead > len(self._entries):
+            self._pending = [e for e in self._pending if e[3] is not None]
+            self._next_round = [e for e in self._next_round if e[3] is not None]
+            heapq.heapify(self._pending)
+            heapq.heapify(self._next_round)
+            self._dead = 0
+
+    def _pop_live(self, heap):
+        while heap:
+            entry = heapq.heappop(heap)
+            if entry[3] is not None:
+                return entry
+            self._dead -= 1
+        return None
+
+    def _advance(self):
+        """Move the pointer to the next live combatant, starting a round when needed"""
+        entry = self._pop_live(self._pending)
+        if entry is None and self._next_round:
+            self._pending, self._next_round = self._next_round, []
+            self.round += 1
+            entry = self._pop_live(self._pending)
+        self.current = entry
+        self.turn += 1
+
+    def add(self, combatants):
+        """Add (entity_type, entity_id, name, initiative, tiebreak) tuples.
+
+        Returns True when the turn pointer moved, which only happens when the
+        encounter was started with nobody in it.
+        """
+        with self._lock:
+            for entity_type, entity_id, name, initiative, tiebreak in combatants:
+                key = (entity_type, entity_id)
+                if key in self._entries:
+                    continue
+                entry = self._make_entry(key, name, initiative, tiebreak)
+                self._entries[key] = entry
+                self._place(entry)
+            if self.round and self.current is None and self._entries:
+                self._advance()
+                return True
+            return False
+
+    def start(self):
+        with self._lock:
+            if self.round:
+                return False
+            self.round = 1
+            if self._entries:
+                self._advance()
+            return True
+
+    def next_turn(self):
+        with self._lock:
+            if not self.round:
+                return False
+            if self.current is not None:
+                self._queue_next_round(self.current)
+            self._advance()
+            return True
+
+    def remove(self, entity_type, entity_id):
+        """Drop a combatant. Returns (found, pointer moved)."""
+        with self._lock:
+            entry = self._entries.pop((entity_type, entity_id), None)
+            if entry is None:
+                return False, False
+            if entry is self.current:
+                self.current = None
+                self._advance()
+                return True, True
+            self._kill(entry)
+            return True, False
+
+    def delay(self, entity_type, entity_id, initiative):
+        """Move a combatant to a new initiative count. Returns (found, pointer moved).
+
+        The current combatant may only delay to a later count; its turn ends
+        and it acts again when the new count comes up this round. Anyone
+        else is re-slotted, keeping whether they already acted this round.
+        """
+        with self._lock:
+            key = (entity_type, entity_id)
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, False
+            combatant = entry[3]
+            moved = self._make_entry(key, combatant['name'], initiative, combatant['tiebreak'])
+            if entry is self.current:
+                if self._sort_key(moved) < self._sort_key(entry):
+                    raise ValueError("The current combatant can only delay to a lower initiative")
+                self._entries[key] = moved
+                heapq.heappush(self._pending, moved)
+                self._advance()
+                return True, True
+            acted = entry[4] > self.round
+            self._kill(entry)
+            self._entries[key] = moved
+            self._place(moved, acted)
+            return True, False
+
+    def pointer(self):
+        """The turn_changed payload"""
+        with self._lock:
+            combatant = self.current[3] if self.current is not None else {}
+            return {
+                'encounter_id': self.id,
+                'round': self.round,
+                'turn': self.turn,
+                'entity_type': combatant.get('entity_type'),
+                'entity_id': combatant.get('entity_id'),
+                'name': combatant.get('name'),
+                'initiative': combatant.get('initiative')
+            }
+
+    def order(self):
+        """Everyone in the order they act from now on (sorted on demand, O(n log n))"""
+        with self._lock:
+            upcoming = sorted(e for e in self._pending if e[3] is not None)
+            later = sorted(e for e in self._next_round if e[3] is not None)
+            head = [self.current] if self.current is not None else []
+            return [dict(entry[3]) for entry in head + upcoming + later]
+
+    def state(self):
+        return {**self.pointer(), 'session_id': self.session_id, 'order': self.order()}
+
+    def to_dict(self):
+        """Everything needed to rebuild the encounter, as JSON-able values (dead entries left out)"""
+        with self._lock:
+            return {
+                'id': self.id,
+                'session_id': self.session_id,
+                'round': self.round,
+                'turn': self.turn,
+                'current': self.current,
+                'pending': [e for e in self._pending if e[3] is not None],
+                'next_round': [e for e in self._next_round if e[3] is not None]
+            }
+
+    @classmethod
+    def from_dict(cls, data):
+        encounter = cls(data['id'], data['session_id'])
+        encounter.round = data['round']
+        encounter.turn = data['turn']
+        encounter.current = data['current']
+        encounter._pending = data['pending']
+        encounter._next_round = data['next_round']
+        heapq.heapify(encounter._pending)
+        heapq.heapify(encounter._next_round)
+        live = encounter._pending + encounter._next_round + ([encounter.current] if encounter.current else [])
+        for entry in live:
+            combatant = entry[3]
+            encounter._entries[(combatant['entity_type'], combatant['entity_id'])] = entry
+        # Newcomers keep sorting after everyone already in on equal initiative
+        encounter._order = itertools.count(max((entry[2] for entry in live), default=-1) + 1)
+        return encounter
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class EncounterRegistry:
+    def __init__(self):
+        self._encounters = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.turn_changes = 0
+
+    def create(self, session_id=None):
+        with self._lock:
+            encounter = Encounter(next(self._ids), session_id)
+            self._encounters[encounter.id] = encounter
+            return encounter
+
+    def get(self, encounter_id):
+        return self._encounters.get(encounter_id)
+
+    def end(self, encounter_id):
+        with self._lock:
+            return self._encounters.pop(encounter_id, None)
+
+    def save(self, encounter):
+        """Store a changed encounter; memory encounters are already current"""
+
+    def emit_turn(self, encounter):
+        """Send the turn pointer to the encounter's host and players"""
+        rooms = [session_room('host_room', encounter.session_id), session_room('all_players', encounter.session_id)]
+        multicast('turn_changed', encounter.pointer(), rooms)
+        with self._lock:
+            self.turn_changes += 1
+
+    def stats(self):
+        with self._lock:
+            encounters = list(self._encounters.values())
+            return {
+                "encounters": len(encounters),
+                "combatants": sum(len(encounter) for encounter in encounters),
+                "turn_changes": self.turn_changes,
+            }
+
+
+class SharedEncounterRegistry(EncounterRegistry):
+    """Encounters as JSON in a hash shared by all workers (Redis or the stand-in broker)"""
+    ENCOUNTERS_KEY = 'encounters'
+    COUNTERS_KEY = 'encounters:counters'
+
+    def __init__(self, client):
+        super().__init__()
+        self.client = client
+
+    def create(self, session_id=None):
+        encounter = Encounter(self.client.hincrby(self.COUNTERS_KEY, 'next_id', 1), session_id)
+        self.save(encounter)
+        return encounter
+
+    def get(self, encounter_id):
+        data = self.client.hget(self.ENCOUNTERS_KEY, str(encounter_id))
+        return Encounter.from_dict(json.loads(data)) if data is not None else None
+
+    def end(self, encounter_id):
+        return self.client.hdel(self.ENCOUNTERS_KEY, str(encounter_id)) > 0
+
+    def save(self, encounter):
+        self.client.hset(self.ENCOUNTERS_KEY, str(encounter.id), json.dumps(encounter.to_dict()))
+
+    def emit_turn(self, encounter):
+        rooms = [session_room('host_room', encounter.session_id), session_room('all_players', encounter.session_id)]
+        multicast('turn_changed', encounter.pointer(), rooms)
+        self.client.hincrby(self.COUNTERS_KEY, 'turn_changes', 1)
+
+    def stats(self):
+        stored = [json.loads(data) for data in self.client.hgetall(self.ENCOUNTERS_KEY).values()]
+        return {
+            "encounters": len(stored),
+            "combatants": sum(
+                len(data['pending']) + len(data['next_round']) + (data['current'] is not None) for data in stored
+            ),
+            "turn_changes": int(self.client.hget(self.COUNTERS_KEY, 'turn_changes') or 0),
+        }
+
+
+def make_registry(url=ENCOUNTER_STORE_URL):
+    client = hash_client(url)
+    return SharedEncounterRegistry(client) if client is not None else EncounterRegistry()
+
+
+encounters = make_registry()
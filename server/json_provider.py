@@ -0,0 +1,57 @@
+"""Pluggable JSON provider for the Flask app.
+
+JSON_PROVIDER=orjson uses orjson for jsonify() and request.get_json(),
+JSON_PROVIDER=stdlib keeps Flask's default. The default, auto, picks orjson
+when it is installed.
+"""
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """DefaultJSONProvider with orjson doing the encoding and decoding"""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=option),
+            mimetype=self.mimetype
+        )
+
+
+JSON_PROVIDERS = {
+    'stdlib': DefaultJSONProvider,
+    'orjson': OrjsonProvider,
+}
+
+
+def init_app(app):
+    """Install the provider picked by JSON_PROVIDER"""
+    name = os.getenv('JSON_PROVIDER', 'auto').lower()
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'stdlib'
+    if name == 'orjson' and orjson is None:
+        raise RuntimeError("JSON_PROVIDER=orjson but orjson is not installed")
+    if name not in JSON_PROVIDERS:
+        raise RuntimeError(f"Unknown JSON_PROVIDER: {name}")
+
+    app.json_provider_class = JSON_PROVIDERS[name]
+    app.json = app.json_provider_class(app)
@@ -0,0 +1,236 @@
+"""Who is connected: host and player sockets, indexed both ways.
+
+Each sid maps to its role (reverse index) and each player maps to the sids
+they have open (forward index), so connect and disconnect are O(1) and one
+player may keep several tabs. A player goes offline only when their last
+sid leaves, which keeps reconnect storms and stale sids from flapping.
+join_player() and leave() return a presence diff when a player came online
+or went offline, for app.py to push to the host:
+
+    {"online": [3], "offline": [], "last_seen": {"3": 1767225600.0}}
+
+Everything is kept per game session (None for sockets that joined without
+one), so each host only sees their own table. With one process the
+indexes are dicts. With several workers they live in shared hashes (Redis
+or the stand-in broker from server.scaleout).
+PRESENCE_URL defaults to SOCKETIO_MESSAGE_QUEUE.
+
+Shared presence records which worker holds each sid. Every worker
+heartbeats every PRESENCE_HEARTBEAT_S; once a worker has been silent for
+PRESENCE_TTL_S (it crashed or was killed), the first worker to notice
+removes its sids and pushes the resulting offline diffs to the hosts.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+
+from server.broadcast import session_room
+from server.scaleout import SOCKETIO_MESSAGE_QUEUE, hash_client
+
+PRESENCE_URL = os.getenv('PRESENCE_URL', SOCKETIO_MESSAGE_QUEUE)
+PRESENCE_HEARTBEAT_S = int(os.getenv('PRESENCE_HEARTBEAT_S', 10))
+PRESENCE_TTL_S = int(os.getenv('PRESENCE_TTL_S', 30))
+
+
+def presence_diff(online=(), offline=(), last_seen=None):
+    return {'online': list(online), 'offline': list(offline), 'last_seen': last_seen or {}}
+
+
+class MemoryPresence:
+    def __init__(self):
+        self.host_sids = {}  # session_id -> {sid}
+        self.players = {}  # session_id -> {player_id -> {sid}}
+        self.sids = {}  # sid -> ('host', None, session_id) or ('player', player_id, session_id)
+        self.last_seen = {}  # session_id -> {player_id -> epoch seconds}
+        self._lock = threading.Lock()
+
+    def init_app(self, socketio):
+        """Nothing to do: the indexes die with the only process that holds sids"""
+
+    def join_host(self, sid, session_id=None):
+        with self._lock:
+            current = self.sids.get(sid)
+            if current == ('host', None, session_id):
+                return None
+            diff = self._leave(sid) if current is not None else None
+            self.sids[sid] = ('host', None, session_id)
+            self.host_sids.setdefault(session_id, set()).add(sid)
+        return diff
+
+    def join_player(self, player_id, sid, session_id=None):
+        with self._lock:
+            if self.sids.get(sid) == ('player', player_id, session_id):
+                return None
+            left = self._leave(sid) if sid in self.sids else None
+            self.sids[sid] = ('player', player_id, session_id)
+            sids = self.players.setdefault(session_id, {}).setdefault(player_id, set())
+            came_online = not sids
+            sids.add(sid)
+            now = time.time()
+            self.last_seen.setdefault(session_id, {})[player_id] = now
+        if came_online:
+            diff = presence_diff(online=[player_id], last_seen={player_id: now})
+            if left:
+                diff['offline'] = left['offline']
+                diff['last_seen'].update(left['last_seen'])
+            return diff
+        return left
+
+    def leave(self, sid):
+        with self._lock:
+            return self._leave(sid)
+
+    def _leave(self, sid):
+        role, player_id, session_id = self.sids.pop(sid, (None, None, None))
+        if role == 'host':
+            self.host_sids.get(session_id, set()).discard(sid)
+        elif role == 'player':
+            players = self.players.get(session_id, {})
+            sids = players.get(player_id, set())
+            sids.discard(sid)
+            now = time.time()
+            self.last_seen.setdefault(session_id, {})[player_id] = now
+            if not sids:
+                players.pop(player_id, None)
+                return presence_diff(offline=[player_id], last_seen={player_id: now})
+        return None
+
+    def snapshot(self, session_id=None):
+        with self._lock:
+            players = self.players.get(session_id, {})
+            return {
+                'host_connected': bool(self.host_sids.get(session_id)),
+                'connected_players': list(players.keys()),
+                'total_players': len(players),
+                'tabs': {player_id: len(sids) for player_id, sids in players.items()},
+                'last_seen': dict(self.last_seen.get(session_id, {}))
+            }
+
+
+class SharedPresence:
+    """Presence kept in hashes shared by all workers.
+
+    Player ids are stored JSON-encoded so they come back with their type.
+    Open sids per player are an HINCRBY counter, which stays correct when
+    two workers connect and disconnect the same player at once; zero
+    counters are left in place rather than deleted for the same reason.
+    Every game session has its own players, host and last_seen hashes.
+    """
+    SIDS_KEY = 'presence:sids'
+    PLAYERS_KEY = 'presence:players'
+    HOST_KEY = 'presence:host'
+    LAST_SEEN_KEY = 'presence:last_seen'
+    WORKERS_KEY = 'presence:workers'
+
+    def __init__(self, client, worker_id=None):
+        self.client = client
+        self.worker_id = worker_id or uuid.uuid4().hex
+        self.socketio = None
+
+    def init_app(self, socketio):
+        self.socketio = socketio
+        self.heartbeat()
+        socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(PRESENCE_HEARTBEAT_S)
+            try:
+                self.heartbeat()
+                self.reap()
+            except Exception as e:
+                print(f"Presence heartbeat failed: {e}")
+
+    def heartbeat(self):
+        self.client.hset(self.WORKERS_KEY, self.worker_id, time.time())
+
+    def reap(self, now=None):
+        """Drop the sids of workers that stopped heartbeating and tell their hosts"""
+        now = now if now is not None else time.time()
+        dead = {
+            worker for worker, seen in self.client.hgetall(self.WORKERS_KEY).items()
+            if worker != self.worker_id and now - float(seen) > PRESENCE_TTL_S
+        }
+        # HDEL returns 0 when another worker is already reaping this one
+        dead = {worker for worker in dead if self.client.hdel(self.WORKERS_KEY, worker)}
+        if not dead:
+            return
+        for sid, role in self.client.hgetall(self.SIDS_KEY).items():
+            fields = json.loads(role)
+            if len(fields) < 4 or fields[3] not in dead:
+                continue
+            session_id = fields[2]
+            diff = self.leave(sid)
+            if diff and self.socketio is not None:
+                self.socketio.emit('presence_diff', diff, to=session_room('host_room', session_id))
+
+    @staticmethod
+    def key(name, session_id):
+        return name if session_id is None else f'{name}:session_{session_id}'
+
+    def join_host(self, sid, session_id=None):
+        role = json.dumps(['host', None, session_id, self.worker_id])
+        current = self.client.hget(self.SIDS_KEY, sid)
+        if current == role:
+            return None
+        diff = self.leave(sid) if current is not None else None
+        self.client.hset(self.SIDS_KEY, sid, role)
+        self.client.hincrby(self.key(self.HOST_KEY, session_id), 'sids', 1)
+        return diff
+
+    def join_player(self, player_id, sid, session_id=None):
+        role = json.dumps(['player', player_id, session_id, self.worker_id])
+        current = self.client.hget(self.SIDS_KEY, sid)
+        if current == role:
+            return None
+        left = self.leave(sid) if current is not None else None
+        player_key = json.dumps(player_id)
+        self.client.hset(self.SIDS_KEY, sid, role)
+        now = time.time()
+        self.client.hset(self.key(self.LAST_SEEN_KEY, session_id), player_key, now)
+        if self.client.hincrby(self.key(self.PLAYERS_KEY, session_id), player_key, 1) == 1:
+            diff = presence_diff(online=[player_id], last_seen={player_id: now})
+            if left:
+                diff['offline'] = left['offline']
+                diff['last_seen'].update(left['last_seen'])
+            return diff
+        return left
+
+    def leave(self, sid):
+        current = self.client.hget(self.SIDS_KEY, sid)
+        # HDEL returns 0 when another worker already removed this sid
+        if current is None or not self.client.hdel(self.SIDS_KEY, sid):
+            return None
+        role, player_id, session_id = json.loads(current)[:3]
+        if role == 'host':
+            self.client.hincrby(self.key(self.HOST_KEY, session_id), 'sids', -1)
+            return None
+        player_key = json.dumps(player_id)
+        now = time.time()
+        self.client.hset(self.key(self.LAST_SEEN_KEY, session_id), player_key, now)
+        if self.client.hincrby(self.key(self.PLAYERS_KEY, session_id), player_key, -1) <= 0:
+            return presence_diff(offline=[player_id], last_seen={player_id: now})
+        return None
+
+    def snapshot(self, session_id=None):
+        players = self.client.hgetall(self.key(self.PLAYERS_KEY, session_id))
+        tabs = {json.loads(key): int(count) for key, count in players.items() if int(count) > 0}
+        last_seen = {json.loads(key): float(seen)
+                     for key, seen in self.client.hgetall(self.key(self.LAST_SEEN_KEY, session_id)).items()}
+        return {
+            'host_connected': int(self.client.hget(self.key(self.HOST_KEY, session_id), 'sids') or 0) > 0,
+            'connected_players': list(tabs.keys()),
+            'total_players': len(tabs),
+            'tabs': tabs,
+            'last_seen': last_seen
+        }
+
+
+def make_presence(url=PRESENCE_URL):
+    client = hash_client(url)
+    return SharedPresence(client) if client is not None else MemoryPresence()
+
+
+presence = make_presence()
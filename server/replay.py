@@ -0,0 +1,163 @@
+"""Sequenced room events and reconnect catch-up.
+
+Every event emitted to host_room, all_players (or their per-session
+variants, see server/broadcast.py), a player_<id> room or to everyone
+("*") is stamped with the next sequence number of each room it
+goes to, e.g. {"seq": {"host_room": 42}}, and kept in a per-room ring
+buffer of REPLAY_BUFFER_SIZE events. Events sent straight to one socket
+are not sequenced.
+
+Clients remember the highest seq per room and the epoch from join_success.
+On reconnect they send both with join_game and get one "replay" event:
+either the missed events in order, or {"snapshot": true} when the gap no
+longer fits in the buffer (or the server restarted), in which case they
+reload over REST.
+
+With a message queue the counters live in the shared store, and every
+worker buffers what it receives from the queue, so a client can reconnect
+to any worker.
+"""
+import itertools
+import os
+import threading
+import uuid
+from collections import deque
+
+from server.broadcast import session_room
+from server.presence import PRESENCE_URL
+from server.scaleout import SequencingMixin, hash_client
+
+REPLAY_BUFFER_SIZE = int(os.getenv('REPLAY_BUFFER_SIZE', 256))
+BROADCAST_ROOM = '*'
+SEQ_KEY = 'replay:seq'
+META_KEY = 'replay:meta'
+
+
+def sequenced_rooms(room):
+    """The replayable rooms an emit targets ([] for single sockets)"""
+    if room is None:
+        return [BROADCAST_ROOM]
+    rooms = [room] if isinstance(room, str) else room
+    return [r for r in rooms if r.rpartition(':')[2] in ('host_room', 'all_players') or r.startswith('player_')]
+
+
+def client_rooms(user_type, user_id, session_id=None):
+    """Rooms a joined client receives events from"""
+    if user_type == 'host':
+        return [session_room('host_room', session_id), BROADCAST_ROOM]
+    return [f'player_{user_id}', session_room('all_players', session_id), BROADCAST_ROOM]
+
+
+class ReplayLog:
+    def __init__(self, size, client=None):
+        self.size = size
+        self.client = client
+        self._epoch = uuid.uuid4().hex
+        self._counters = {}
+        self._buffers = {}  # room -> deque of (seq, (order, event, data))
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self.stamped = 0
+        self.replayed = 0
+        self.snapshots = 0
+
+    def init_app(self, socketio):
+        manager = socketio.server.manager
+        if isinstance(manager, SequencingMixin):
+            manager.stamp = self.stamp
+            manager.record = self.record
+
+    @property
+    def epoch(self):
+        """Changes whenever sequence numbers restart"""
+        if self.client is None:
+            return self._epoch
+        epoch = self.client.hget(META_KEY, 'epoch')
+        if epoch is None:
+            self.client.hset(META_KEY, 'epoch', self._epoch)
+            epoch = self.client.hget(META_KEY, 'epoch')
+        return epoch
+
+    def _next_seq(self, room):
+        if self.client is not None:
+            return self.client.hincrby(SEQ_KEY, room, 1)
+        with self._lock:
+            self._counters[room] = self._counters.get(room, 0) + 1
+            return self._counters[room]
+
+    def current_seq(self, rooms):
+        if self.client is not None:
+            return {room: int(self.client.hget(SEQ_KEY, room) or 0) for room in rooms}
+        with self._lock:
+            return {room: self._counters.get(room, 0) for room in rooms}
+
+    def stamp(self, event, data, room):
+        rooms = sequenced_rooms(room)
+        if not rooms or not isinstance(data, dict):
+            return data
+        data = {**data, 'seq': {r: self._next_seq(r) for r in rooms}}
+        self.record(event, data)
+        with self._lock:
+            self.stamped += 1
+        return data
+
+    def record(self, event, data):
+        if not isinstance(data, dict) or not isinstance(data.get('seq'), dict):
+            return
+        with self._lock:
+            entry = (next(self._order), event, data)
+            for room, seq in data['seq'].items():
+                buffer = self._buffers.get(room)
+                if buffer is None:
+                    buffer = self._buffers[room] = deque(maxlen=self.size)
+                buffer.append((seq, entry))
+
+    def catch_up(self, rooms, last_seq, epoch):
+        """The replay event for a reconnecting client"""
+        current = self.current_seq(rooms)
+        payload = {'epoch': self.epoch, 'seq': current, 'snapshot': False, 'events': []}
+        entries = None
+        if epoch == payload['epoch'] and isinstance(last_seq, dict):
+            entries = self._missed(rooms, last_seq, current)
+
+        with self._lock:
+            if entries is None:
+                self.snapshots += 1
+                payload['snapshot'] = True
+                return payload
+            self.replayed += len(entries)
+        payload['events'] = [{'event': event, 'data': data} for _, event, data in entries]
+        return payload
+
+    def _missed(self, rooms, last_seq, current):
+        """Buffered events after last_seq in order, or None if some are gone"""
+        entries = {}
+        with self._lock:
+            for room in rooms:
+                last = last_seq.get(room, 0)
+                if not isinstance(last, int) or last > current[room]:
+                    return None
+                if last == current[room]:
+                    continue
+                buffer = self._buffers.get(room)
+                # Events after `last` must still be in the buffer
+                if not buffer or buffer[0][0] > last + 1:
+                    return None
+                for seq, entry in buffer:
+                    if seq > last:
+                        entries[entry[0]] = entry
+        return [entries[order] for order in sorted(entries)]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "buffer_size": self.size,
+                "rooms": len(self._buffers),
+                "buffered": sum(len(buffer) for buffer in self._buffers.values()),
+                "stamped": self.stamped,
+                "replayed": self.replayed,
+                "snapshots": self.snapshots,
+            }
+
+
+replay_log = ReplayLog(REPLAY_BUFFER_SIZE, hash_client(PRESENCE_URL))
@@ -0,0 +1,44 @@
+"""Write-behind logging of dice rolls.
+
+Roll endpoints and dice_roll_broadcast queue their results here; a
+background task appends them to dice_rolls and updates roll_aggregates in
+one transaction every ROLL_LOG_FLUSH_MS, or once ROLL_LOG_FLUSH_SIZE rolls
+are waiting.
+"""
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'database'))
+from models import DiceRoll
+from roll_history import insert_rolls
+from server.write_behind import WriteBehindLog, clip
+
+ROLL_LOG_FLUSH_MS = int(os.getenv('ROLL_LOG_FLUSH_MS', 1000))
+ROLL_LOG_FLUSH_SIZE = int(os.getenv('ROLL_LOG_FLUSH_SIZE', 500))
+ROLL_LOG_MAX_BUFFER = int(os.getenv('ROLL_LOG_MAX_BUFFER', 50000))
+
+
+class RollLog(WriteBehindLog):
+    name = 'dice rolls'
+
+    def write(self, db_session, rows):
+        insert_rolls(db_session, rows)
+
+    def record(self, entity_type, entity_id, dice_type, result, source, roller_name=None):
+        self.append(self.row(entity_type, entity_id, dice_type, result, source, roller_name))
+
+    @staticmethod
+    def row(entity_type, entity_id, dice_type, result, source, roller_name=None):
+        return {
+            'entity_type': entity_type,
+            'entity_id': entity_id,
+            'dice_type': dice_type,
+            'result': result,
+            'source': source,
+            'roller_name': clip(roller_name, DiceRoll.roller_name),
+            'created_at': datetime.now()
+        }
+
+
+roll_log = RollLog(ROLL_LOG_FLUSH_MS, ROLL_LOG_FLUSH_SIZE, ROLL_LOG_MAX_BUFFER)
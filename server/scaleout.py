@@ -0,0 +1,297 @@
+"""Multi-process scale-out: a shared Socket.IO message queue.
+
+SOCKETIO_MESSAGE_QUEUE picks the backend every worker connects to:
+
+    redis://host:6379/0       Redis pub/sub (needs the redis package)
+    local://127.0.0.1:6390    the stand-in broker below, for development and tests
+    unset                     one process, rooms kept in memory
+
+Other schemes (amqp://, kafka://, ...) are rejected with a ValueError when
+the app starts: presence, the replay log and encounters keep their shared
+state in hashes, which only these two backends provide.
+
+Every emit is published on the queue and replayed by each worker to the
+sockets it holds, so host_room, all_players and player_<id> broadcasts
+reach clients wherever they connected. Run the stand-in broker with
+
+    python -m server.scaleout --port 6390
+
+It also stores the small hashes the shared presence store needs, so a
+multi-worker setup can be tried without Redis. Workers behind one public
+address need sticky sessions (e.g. nginx ip_hash) for the polling transport,
+and the same SECRET_KEY so each accepts the session cookies the others sign.
+"""
+import argparse
+import hmac
+import json
+import os
+import socket
+import struct
+import threading
+from urllib.parse import urlparse
+
+import socketio
+
+SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+BROKER_AUTHKEY = os.getenv('SCALEOUT_AUTHKEY', 'dnd-local').encode()
+CHANNEL = 'flask-socketio'
+SUPPORTED_SCHEMES = ('redis://', 'rediss://', 'local://')
+
+
+def broker_address(url):
+    parsed = urlparse(url)
+    return parsed.hostname or '127.0.0.1', parsed.port or 6390
+
+
+# Length-prefixed frames over plain sockets, so gevent/eventlet can patch them
+
+def send_frame(sock, payload):
+    sock.sendall(struct.pack('!I', len(payload)) + payload)
+
+
+def recv_frame(stream):
+    header = stream.read(4)
+    if len(header) < 4:
+        raise EOFError("broker connection closed")
+    size, = struct.unpack('!I', header)
+    payload = stream.read(size)
+    if len(payload) < size:
+        raise EOFError("broker connection closed")
+    return payload
+
+
+class Connection:
+    def __init__(self, sock):
+        self.sock = sock
+        self.stream = sock.makefile('rb')
+
+    @classmethod
+    def open(cls, address):
+        connection = cls(socket.create_connection(address))
+        connection.send_bytes(BROKER_AUTHKEY)
+        return connection
+
+    def send_bytes(self, payload):
+        send_frame(self.sock, payload)
+
+    def recv_bytes(self):
+        return recv_frame(self.stream)
+
+    def close(self):
+        self.stream.close()
+        self.sock.close()
+
+
+# Stand-in broker
+
+class Broker:
+    """Fans published messages out to subscribers and keeps shared hashes"""
+
+    def __init__(self):
+        self.subscribers = {}  # channel -> [(connection, send lock)]
+        self.hashes = {}
+        self.lock = threading.Lock()
+
+    def serve(self, host, port):
+        with socket.create_server((host, port)) as listener:
+            print(f"Scale-out broker listening on {host}:{port}")
+            while True:
+                sock, _ = listener.accept()
+                threading.Thread(target=self.handle, args=(Connection(sock),), daemon=True).start()
+
+    def handle(self, connection):
+        try:
+            if not hmac.compare_digest(connection.recv_bytes(), BROKER_AUTHKEY):
+                connection.close()
+                return
+            while True:
+                request = json.loads(connection.recv_bytes())
+                op = request['op']
+                if op == 'subscribe':
+                    with self.lock:
+                        self.subscribers.setdefault(request['channel'], []).append((connection, threading.Lock()))
+                    return  # the connection now only receives
+                connection.send_bytes(json.dumps({'result': self.apply(op, request)}).encode())
+        except (EOFError, OSError):
+            connection.close()
+
+    def apply(self, op, request):
+        if op == 'publish':
+            with self.lock:
+                subscribers = list(self.subscribers.get(request['channel'], []))
+            payload = request['data'].encode()
+            for subscriber in subscribers:
+                self.deliver(request['channel'], subscriber, payload)
+            return len(subscribers)
+
+        with self.lock:
+            table = self.hashes.setdefault(request['name'], {})
+            if op == 'hset':
+                table[request['key']] = request['value']
+                return 1
+            if op == 'hget':
+                return table.get(request['key'])
+            if op == 'hincrby':
+                table[request['key']] = int(table.get(request['key'], 0)) + request['amount']
+                return table[request['key']]
+            if op == 'hdel':
+                return sum(table.pop(key, None) is not None for key in request['keys'])
+            if op == 'hgetall':
+                return dict(table)
+        raise ValueError(f"Unknown broker op {op}")
+
+    def deliver(self, channel, subscriber, payload):
+        connection, send_lock = subscriber
+        try:
+            with send_lock:
+                connection.send_bytes(payload)
+        except (EOFError, OSError):
+            with self.lock:
+                if subscriber in self.subscribers.get(channel, []):
+                    self.subscribers[channel].remove(subscriber)
+
+
+class BrokerClient:
+    """Talks to the stand-in broker; mirrors the redis-py calls we use"""
+
+    def __init__(self, url):
+        self.address = broker_address(url)
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _call(self, op, **args):
+        with self._lock:
+            if self._connection is None:
+                self._connection = Connection.open(self.address)
+            try:
+                self._connection.send_bytes(json.dumps({'op': op, **args}).encode())
+                return json.loads(self._connection.recv_bytes())['result']
+            except (EOFError, OSError):
+                self._connection = None
+                raise
+
+    def publish(self, channel, data):
+        return self._call('publish', channel=channel, data=data)
+
+    def hset(self, name, key, value):
+        return self._call('hset', name=name, key=key, value=value)
+
+    def hget(self, name, key):
+        return self._call('hget', name=name, key=key)
+
+    def hincrby(self, name, key, amount=1):
+        return self._call('hincrby', name=name, key=key, amount=amount)
+
+    def hdel(self, name, *keys):
+        return self._call('hdel', name=name, keys=list(keys))
+
+    def hgetall(self, name):
+        return self._call('hgetall', name=name)
+
+    def subscribe(self, channel):
+        """Yield every message published on channel"""
+        connection = Connection.open(self.address)
+        connection.send_bytes(json.dumps({'op': 'subscribe', 'channel': channel}).encode())
+        try:
+            while True:
+                yield connection.recv_bytes()
+        finally:
+            connection.close()
+
+
+# Client managers with hooks for server.replay
+
+class SequencingMixin:
+    """stamp(event, data, room) runs once where an emit starts, before the
+    packet is encoded or published, and may return replacement data.
+    encode_binary(event, data, room, namespace) may return (payload, rooms)
+    for a second emit to clients that asked for a binary encoding."""
+    stamp = None
+    record = None
+    encode_binary = None
+
+    def emit(self, event, data, namespace=None, room=None, **kwargs):
+        room = kwargs.pop('to', None) or room
+        if self.stamp is not None:
+            data = self.stamp(event, data, room)
+        result = super().emit(event, data, namespace, room=room, **kwargs)
+        if self.encode_binary is not None and kwargs.get('callback') is None:
+            binary = self.encode_binary(event, data, room, namespace or '/')
+            if binary is not None:
+                payload, binary_rooms = binary
+                super().emit(event, payload, namespace, room=binary_rooms, **kwargs)
+        return result
+
+
+class QueueSequencingMixin(SequencingMixin):
+    """Also hands record(event, data) every event other workers published"""
+
+    def _handle_emit(self, message):
+        if self.record is not None and message.get('host_id') != self.host_id \
+                and not message.get('binary') and len(message['data']) == 1:
+            self.record(message['event'], message['data'][0])
+        super()._handle_emit(message)
+
+
+class SequencedManager(SequencingMixin, socketio.Manager):
+    """The default single-process manager"""
+
+
+class SequencedRedisManager(QueueSequencingMixin, socketio.RedisManager):
+    pass
+
+
+class LocalSocketManager(QueueSequencingMixin, socketio.PubSubManager):
+    """Socket.IO client manager backed by the stand-in broker"""
+    name = 'local'
+
+    def __init__(self, url, channel=CHANNEL, write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.client = BrokerClient(url)
+
+    def _publish(self, data):
+        return self.client.publish(self.channel, self.json.dumps(data))
+
+    def _listen(self):
+        yield from self.client.subscribe(self.channel)
+
+
+def check_url(url):
+    if not url.startswith(SUPPORTED_SCHEMES):
+        raise ValueError(
+            f"Unsupported scale-out URL {url!r}: use one of {', '.join(SUPPORTED_SCHEMES)} "
+            "(presence, replay and encounters need shared hashes)"
+        )
+
+
+def socketio_options(url=SOCKETIO_MESSAGE_QUEUE):
+    """Extra SocketIO() keyword arguments for the configured queue"""
+    if not url:
+        return {'client_manager': SequencedManager()}
+    check_url(url)
+    if url.startswith('local://'):
+        return {'client_manager': LocalSocketManager(url)}
+    return {'client_manager': SequencedRedisManager(url, channel=CHANNEL)}
+
+
+def hash_client(url):
+    """Client for the shared hashes presence lives in, or None for memory"""
+    if not url:
+        return None
+    check_url(url)
+    if url.startswith('local://'):
+        return BrokerClient(url)
+    import redis
+    return redis.Redis.from_url(url, decode_responses=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the local scale-out broker")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6390)
+    args = parser.parse_args()
+    Broker().serve(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Monte Carlo encounter simulator for balancing fights before a session.
+
+Every trial is the same fight replayed with fresh dice, and all trials run
+at once as NumPy arrays: hp is a (combatants, trials) matrix and each step
+below is one array operation over every trial still in progress. The only
+Python loops are over rounds and combatants, never over trials. Trials are
+split across a process pool (SIM_WORKERS processes, one per core by default).
+Even a small run goes to the pool, never the calling thread: under gevent or
+eventlet the request only waits on it, so other sockets keep being served.
+
+Fight rules, one round at a time until one side is down or MAX_ROUNDS:
+- combatants act in descending spd_stat order (as in server/initiative.py)
+- each attacks a random living opponent
+- hit when d20 + (attacker luk_stat - target spd_stat) / 5 >= 10
+- damage d10 * str_stat / 10 - target stm_stat / 10, at least 1
+
+Fights start from current_hp. A fight that hits MAX_ROUNDS counts as a draw.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+MAX_ROUNDS = 100
+SIM_WORKERS = int(os.getenv('SIM_WORKERS', os.cpu_count() or 1))
+# Below this many trials one process runs them all; splitting costs more than it saves
+SIM_POOL_MIN_TRIALS = int(os.getenv('SIM_POOL_MIN_TRIALS', 20000))
+HISTOGRAM_BUCKETS = 10
+
+STAT_DEFAULTS = {'str_stat': 10, 'stm_stat': 10, 'spd_stat': 10, 'luk_stat': 10}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def combat_arrays(party, enemies):
+    """Stat vectors for party + enemies, indexed in acting order"""
+    combatants = [(0, c) for c in party] + [(1, c) for c in enemies]
+    arrays = {
+        'side': np.array([side for side, _ in combatants], dtype=np.int8),
+        'hp': np.array([max(c['current_hp'], 0) for _, c in combatants], dtype=np.float64),
+    }
+    for field, default in STAT_DEFAULTS.items():
+        arrays[field] = np.array([c.get(field) if c.get(field) is not None else default for _, c in combatants],
+                                 dtype=np.float64)
+    # Stable, so equal speeds keep party-first input order
+    arrays['order'] = np.argsort(-arrays['spd_stat'], kind='stable')
+    return arrays
+
+
+def run_trials(arrays, trials, max_rounds, seed):
+    """Simulate `trials` fights. Returns (rounds, outcome, final hp per trial).
+
+    outcome is 1 for a party win, -1 for a loss and 0 for a draw.
+    """
+    rng = np.random.default_rng(seed)
+    side = arrays['side']
+    party = side == 0
+    opponents = [np.flatnonzero(side != side[c]) for c in range(len(side))]
+
+    # One row per combatant, one column per trial still being fought
+    hp = np.repeat(arrays['hp'][:, None].astype(np.float32), trials, axis=1)
+    columns = np.arange(trials)
+    final_hp = np.empty((trials, len(side)), dtype=np.float32)
+    rounds = np.zeros(trials, dtype=np.int32)
+
+    # Per attacker: the d20 each opponent needs and how much of a hit it shrugs off
+    needed = [10 - (arrays['luk_stat'][c] - arrays['spd_stat'][opp]) / 5 for c, opp in enumerate(opponents)]
+    soaked = arrays['stm_stat'] / 10
+    strength = arrays['str_stat'] / 10
+
+    for round_number in range(1, max_rounds + 1):
+        alive = hp > 0
+        going = alive[party].any(axis=0) & alive[~party].any(axis=0)
+        if not going.all():
+            # Finished fights leave the matrix, so later rounds only pay for live ones
+            final_hp[columns[~going]] = hp[:, ~going].T
+            hp, columns = hp[:, going], columns[going]
+        if columns.size == 0:
+            break
+        rounds[columns] = round_number
+        size = columns.size
+
+        # Opponent lists are short and trials many, so loop over opponents
+        # with full-width row operations rather than gather/scatter across both
+        for c in arrays['order']:
+            opp_alive = [hp[o] > 0 for o in opponents[c]]
+            living = np.zeros(size, dtype=np.int16)
+            for row in opp_alive:
+                living += row
+            acting = (hp[c] > 0) & (living > 0)
+
+            # Random living target: the pick-th living opponent, pick uniform in 0..living-1
+            pick = (rng.random(size, dtype=np.float32) * living).astype(np.int16)
+            slot = np.zeros(size, dtype=np.int16)
+            running = np.zeros(size, dtype=np.int16)
+            for row in opp_alive:
+                running += row
+                slot += running <= pick
+
+            d20 = rng.integers(1, 21, size, dtype=np.int16)
+            # slot runs past the end only where nobody is left to hit, and acting is False there
+            hits = acting & (d20 >= needed[c].take(slot, mode='clip'))
+            damage = rng.integers(1, 11, size, dtype=np.int16) * np.float32(strength[c])
+            for j, o in enumerate(opponents[c]):
+                dealt = np.maximum(damage - np.float32(soaked[o]), np.float32(1.0))
+                hp[o] -= np.where(hits & (slot == j), dealt, np.float32(0.0))
+
+    final_hp[columns] = hp.T
+    final_hp = np.maximum(final_hp, 0)
+    alive = final_hp > 0
+    party_up = alive[:, party].any(axis=1)
+    enemies_up = alive[:, ~party].any(axis=1)
+    outcome = np.where(party_up & ~enemies_up, 1, np.where(~party_up, -1, 0)).astype(np.int8)
+    return rounds, outcome, final_hp
+
+
+def _run_chunk(args):
+    return run_trials(*args)
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that runs server threads is not safe
+            _pool = ProcessPoolExecutor(SIM_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def run_parallel(arrays, trials, max_rounds=MAX_ROUNDS, seed=None, workers=SIM_WORKERS):
+    """Split trials over the pool (one chunk for small runs) and concatenate the results"""
+    chunks = workers if workers > 1 and trials >= SIM_POOL_MIN_TRIALS else 1
+    seeds = np.random.SeedSequence(seed).spawn(chunks)
+    sizes = [trials // chunks + (1 if i < trials % chunks else 0) for i in range(chunks)]
+    jobs = [(arrays, size, max_rounds, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+    results = list(get_pool().map(_run_chunk, jobs))
+    return tuple(np.concatenate(parts) for parts in zip(*results)), chunks
+
+
+def distribution(values, upper):
+    """Mean, percentiles and a histogram of values in 0..upper"""
+    if upper <= 0:
+        upper = 1.0
+    histogram, _ = np.histogram(values, bins=HISTOGRAM_BUCKETS, range=(0, upper))
+    p10, p50, p90 = np.percentile(values, [10, 50, 90])
+    return {
+        'mean': float(values.mean()),
+        'p10': float(p10),
+        'p50': float(p50),
+        'p90': float(p90),
+        'histogram': (histogram / len(values)).round(4).tolist()
+    }
+
+
+def simulate(party, enemies, trials, max_rounds=MAX_ROUNDS, seed=None, workers=SIM_WORKERS):
+    """Run the fight `trials` times and summarize it.
+
+    party and enemies are dicts with id, name, current_hp, max_hp and the
+    *_stat fields; missing stats fall back to the column defaults.
+    """
+    start = time.perf_counter()
+    arrays = combat_arrays(party, enemies)
+    (rounds, outcome, hp), chunks = run_parallel(arrays, trials, max_rounds, seed, workers)
+    elapsed = time.perf_counter() - start
+
+    party_count = len(party)
+    party_max = sum(c['max_hp'] for c in party)
+    wins = outcome == 1
+    return {
+        'trials': trials,
+        'win_probability': float(wins.mean()),
+        'loss_probability': float((outcome == -1).mean()),
+        'draw_probability': float((outcome == 0).mean()),
+        'expected_rounds': float(rounds.mean()),
+        'rounds': distribution(rounds, max_rounds),
+        'party_hp_remaining': distribution(hp[:, :party_count].sum(axis=1), party_max),
+        'party_hp_remaining_on_win': distribution(hp[wins, :party_count].sum(axis=1), party_max) if wins.any() else None,
+        'party': [
+            {
+                'id': c['id'],
+                'name': c['name'],
+                'survival_probability': float((hp[:, i] > 0).mean()),
+                'hp_remaining': distribution(hp[:, i], c['max_hp'])
+            }
+            for i, c in enumerate(party)
+        ],
+        'enemies': [
+            {'id': c['id'], 'name': c['name'], 'survival_probability': float((hp[:, party_count + i] > 0).mean())}
+            for i, c in enumerate(enemies)
+        ],
+        'max_rounds': max_rounds,
+        'processes': chunks,
+        'elapsed_s': round(elapsed, 3),
+        'trials_per_s': round(trials / elapsed) if elapsed else None
+    }
@@ -0,0 +1,168 @@
+"""Buffered write-behind of rows that do not need to be durable immediately.
+
+Callers append rows to an in-memory buffer and return at once. A background
+task hands the buffer to write() every interval, or as soon as flush_size
+rows are waiting, so socket handlers never wait on a commit.
+
+When the database is unreachable the batch is retried on the next flush;
+past max_buffer queued rows the oldest are dropped. Any other failure means
+some row is bad (too long for its column, a missing foreign key), so the
+batch is written again row by row and the rows that still fail are
+dropped instead of blocking everything queued behind them.
+"""
+import atexit
+import os
+import sys
+import threading
+import time
+
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'database'))
+from models import SessionLocal
+
+# Failures that say nothing about the rows, only that the database is unreachable
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+
+def clip(value, column):
+    """value as a string that fits a String(n) column; None stays None"""
+    if value is None:
+        return None
+    return str(value)[:column.type.length]
+
+
+class WriteBehindLog:
+    name = 'rows'
+
+    def __init__(self, interval_ms, flush_size, max_buffer):
+        self.interval = interval_ms / 1000
+        self.flush_size = flush_size
+        self.max_buffer = max_buffer
+        self.socketio = None
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher_started = False
+        self._size_flush_pending = False
+        self.queued = 0
+        self.written = 0
+        self.flushes = 0
+        self.failures = 0
+        self.dropped = 0
+        self.rejected = 0
+        self._total_flush = 0.0
+        self._max_flush = 0.0
+
+    def init_app(self, socketio):
+        self.socketio = socketio
+        atexit.register(self.flush)
+
+    def write(self, db_session, rows):
+        """Persist and commit one batch of rows"""
+        raise NotImplementedError
+
+    def append(self, *rows):
+        """Queue rows for the next flush"""
+        with self._lock:
+            self.queued += len(rows)
+            self._buffer.extend(rows)
+            start_flusher = not self._flusher_started
+            self._flusher_started = True
+            flush_now = len(self._buffer) >= self.flush_size and not self._size_flush_pending
+            if flush_now:
+                self._size_flush_pending = True
+        if start_flusher:
+            self.socketio.start_background_task(self._run)
+        if flush_now:
+            self.socketio.start_background_task(self.flush)
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        """Write everything buffered so far; safe to call from any thread"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+                self._size_flush_pending = False
+            if not rows:
+                return
+
+            start = time.perf_counter()
+            try:
+                self._write(rows)
+            except TRANSIENT_ERRORS as e:
+                print(f"Flushing {self.name} failed, will retry: {e}")
+                self._requeue(rows)
+                return
+            except Exception as e:
+                print(f"Flushing {self.name} failed, writing rows one by one: {e}")
+                with self._lock:
+                    self.failures += 1
+                written = self._write_one_by_one(rows)
+            else:
+                written = len(rows)
+
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.written += written
+                self.flushes += 1
+                self._total_flush += elapsed
+                self._max_flush = max(self._max_flush, elapsed)
+
+    def _write(self, rows):
+        db_session = SessionLocal()
+        try:
+            self.write(db_session, rows)
+        except Exception:
+            db_session.rollback()
+            raise
+        finally:
+            db_session.close()
+
+    def _write_one_by_one(self, rows):
+        """Write rows singly, dropping the ones that fail. Returns how many were written."""
+        written = 0
+        for index, row in enumerate(rows):
+            try:
+                self._write([row])
+            except TRANSIENT_ERRORS as e:
+                print(f"Flushing {self.name} failed, will retry: {e}")
+                self._requeue(rows[index:])
+                break
+            except Exception as e:
+                print(f"Dropped a row from {self.name} that cannot be written: {e}")
+                with self._lock:
+                    self.rejected += 1
+            else:
+                written += 1
+        return written
+
+    def _requeue(self, rows):
+        with self._lock:
+            self.failures += 1
+            self._buffer[:0] = rows
+            overflow = len(self._buffer) - self.max_buffer
+            if overflow > 0:
+                del self._buffer[:overflow]
+                self.dropped += overflow
+
+    def stats(self):
+        with self._lock:
+            return {
+                "interval_ms": self.interval * 1000,
+                "flush_size": self.flush_size,
+                "queued": self.queued,
+                "written": self.written,
+                "pending": len(self._buffer),
+                "flushes": self.flushes,
+                "failures": self.failures,
+                "dropped": self.dropped,
+                "rejected": self.rejected,
+                "avg_batch": self.written / self.flushes if self.flushes else 0.0,
+                "avg_flush_ms": self._total_flush / self.flushes * 1000 if self.flushes else 0.0,
+                "max_flush_ms": self._max_flush * 1000,
+            }
@@ -9,11 +9,38 @@
             temperature: ['Freezing', 'Cold', 'Normal', 'Warm', 'Hot']
         };
 
+        // Only the columns the roster and combat cards render
+        const rosterFields = [
+            'id', 'name', 'current_hp', 'max_hp', 'current_stam', 'max_stam',
+            'last_d5_roll', 'last_d10_roll', 'last_d20_roll', 'last_d100_roll', 'version'
+        ].join(',');
+        const rosterPageSize = 200;
+        // The table this dashboard runs, from /host-dashboard?session_id=3 (all rows without one)
+        const sessionId = new URLSearchParams(window.location.search).get('session_id');
+
+        // Follow the X-Next-Cursor header until the last page
+        async function fetchRoster(endpoint) {
+            let rows = [];
+            let after = null;
+            do {
+                let url = `${endpoint}?fields=${rosterFields}&limit=${rosterPageSize}`;
+                if (sessionId) {
+                    url += `&session_id=${sessionId}`;
+                }
+                if (after !== null) {
+                    url += `&after=${after}`;
+                }
+                const response = await fetch(url);
+                rows = rows.concat(await response.json());
+                after = response.headers.get('X-Next-Cursor');
+            } while (after !== null);
+            return rows;
+        }
+
         // Load initial data
         async function loadPlayers() {
             try {
-                const response = await fetch('/api/players');
-                players = await response.json();
+                players = await fetchRoster('/api/players');
                 updatePlayersList();
                 updatePlayerCheckboxes();
             } catch (error) {
@@ -23,8 +50,7 @@
 
         async function loadEnemies() {
             try {
-                const response = await fetch('/api/enemies');
-                enemies = await response.json();
+                enemies = await fetchRoster('/api/enemies');
                 updateEnemiesList();
             } catch (error) {
                 console.error('Error loading enemies:', error);
@@ -99,7 +125,15 @@
             return rolls.length > 0 ? rolls[rolls.length - 1] : 'None';
         }
 
-        function openPlayerModal(player) {
+        async function openPlayerModal(rosterPlayer) {
+            // Roster rows are projected, fetch the full record before editing
+            const response = await fetch(`/api/players/${rosterPlayer.id}`);
+            if (!response.ok) {
+                console.error('Error loading player:', response.statusText);
+                return;
+            }
+            const player = await response.json();
+
             currentPlayerId = player.id;
             document.getElementById('modalTitle').textContent = `Edit ${player.name}`;
             document.getElementById('editName').value = player.name;
@@ -135,8 +169,8 @@
                 });
 
                 if (response.ok) {
+                    // The list is refreshed by the entity_patch the server broadcasts
                     document.getElementById('playerModal').style.display = 'none';
-                    loadPlayers(); // Refresh the list
                 }
             } catch (error) {
                 console.error('Error saving player:', error);
@@ -255,6 +289,12 @@
             const player = players.find(p => p.id === playerId);
             if (player) {
                 player.current_hp = parseFloat(value);
+                socket.emit('update_player_stats', {
+                    player_id: playerId,
+                    stat_type: 'hp',
+                    current_value: player.current_hp,
+                    max_value: player.max_hp
+                });
             }
         }
 
@@ -264,6 +304,12 @@
             const player = players.find(p => p.id === playerId);
             if (player) {
                 player.current_stam = parseFloat(value);
+                socket.emit('update_player_stats', {
+                    player_id: playerId,
+                    stat_type: 'stamina',
+                    current_value: player.current_stam,
+                    max_value: player.max_stam
+                });
             }
         }
 
@@ -335,6 +381,104 @@
             }
         }
 
+        // Live entity updates: patch local state instead of refetching the roster
+        const socket = io();
+        // Highest event seq seen per room, so a reconnect only replays what was missed
+        const replayState = { epoch: null, lastSeq: {} };
+        const socketHandlers = {
+            entity_patch: patch => applyEntityPatches([patch]),
+            entity_patch_batch: data => applyEntityPatches(data.patches)
+        };
+
+        socket.on('connect', () => {
+            const join = { user_type: 'host' };
+            if (sessionId) {
+                join.session_id = Number(sessionId);
+            }
+            if (replayState.epoch) {
+                join.last_seq = replayState.lastSeq;
+                join.epoch = replayState.epoch;
+            }
+            socket.emit('join_game', join);
+        });
+        socket.on('join_success', data => {
+            if (!replayState.epoch) {
+                replayState.epoch = data.epoch;
+                trackSeq(data.seq);
+            }
+        });
+        socket.on('join_error', data => {
+            console.error('Error joining game session:', data.error);
+        });
+        socket.on('replay', data => {
+            replayState.epoch = data.epoch;
+            if (data.snapshot) {
+                replayState.lastSeq = {};
+                trackSeq(data.seq);
+                loadPlayers();
+                loadEnemies();
+                return;
+            }
+            data.events.forEach(({ event, data: eventData }) => handleSequenced(event, eventData));
+            trackSeq(data.seq);
+        });
+        // Every sequenced event moves lastSeq forward, handled here or not
+        socket.onAny((event, data) => {
+            if (data && data.seq) {
+                handleSequenced(event, data);
+            } else if (socketHandlers[event]) {
+                socketHandlers[event](data);
+            }
+        });
+
+        function trackSeq(seq) {
+            let isNew = !seq;
+            Object.entries(seq || {}).forEach(([room, value]) => {
+                if (!(replayState.lastSeq[room] >= value)) {
+                    replayState.lastSeq[room] = value;
+                    isNew = true;
+                }
+            });
+            return isNew;
+        }
+
+        function handleSequenced(event, data) {
+            // Skip events a replay already delivered
+            if (trackSeq(data.seq) && socketHandlers[event]) {
+                socketHandlers[event](data);
+            }
+        }
+
+        function applyEntityPatches(patches) {
+            const touched = new Set();
+            patches.forEach(patch => {
+                const list = patch.type === 'player' ? players : patch.type === 'enemy' ? enemies : null;
+                if (!list) {
+                    return;
+                }
+                const index = list.findIndex(entity => entity.id === patch.id);
+                if (patch.deleted) {
+                    if (index !== -1) {
+                        list.splice(index, 1);
+                    }
+                } else if (index === -1) {
+                    list.push({ id: patch.id, version: patch.version, ...patch.changes });
+                } else if (!(list[index].version >= patch.version)) {
+                    // Ignore patches older than what we already have
+                    Object.assign(list[index], patch.changes, { version: patch.version });
+                }
+                touched.add(patch.type);
+            });
+
+            if (touched.has('player')) {
+                updatePlayersList();
+                updatePlayerCheckboxes();
+            }
+            if (touched.has('enemy')) {
+                updateEnemiesList();
+            }
+        }
+
         // Load data on page load
         loadPlayers();
         loadEnemies();
\ No newline at end of file
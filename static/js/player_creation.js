@@ -67,6 +67,11 @@
                 skill_description: formData.get('skillDescription'),
                 starter_background: formData.get('starterBackground')
             };
+            // Joining a table from a link like /character-creation?session_id=3
+            const sessionId = new URLSearchParams(window.location.search).get('session_id');
+            if (sessionId) {
+                characterData.session_id = Number(sessionId);
+            }
 
             try {
                 const response = await fetch('/api/players', {
@@ -185,5 +185,78 @@
             }
         }
 
+        // Live updates from the host: patch the loaded player in place
+        const socket = io();
+        // Highest event seq seen per room, so a reconnect only replays what was missed
+        const replayState = { epoch: null, lastSeq: {} };
+        const socketHandlers = {
+            entity_patch: patch => {
+                if (!playerData || patch.type !== 'player' || patch.id !== playerData.id || patch.deleted) {
+                    return;
+                }
+                if (playerData.version >= patch.version) {
+                    return;
+                }
+                Object.assign(playerData, patch.changes, { version: patch.version });
+                displayPlayerData();
+            }
+        };
+
+        socket.on('connect', () => {
+            const join = {
+                user_type: 'player',
+                user_id: parseInt(playerId),
+                user_name: playerData ? playerData.name : 'Unknown'
+            };
+            if (replayState.epoch) {
+                join.last_seq = replayState.lastSeq;
+                join.epoch = replayState.epoch;
+            }
+            socket.emit('join_game', join);
+        });
+        socket.on('join_success', data => {
+            if (!replayState.epoch) {
+                replayState.epoch = data.epoch;
+                trackSeq(data.seq);
+            }
+        });
+        socket.on('replay', data => {
+            replayState.epoch = data.epoch;
+            if (data.snapshot) {
+                replayState.lastSeq = {};
+                trackSeq(data.seq);
+                loadPlayerData();
+                return;
+            }
+            data.events.forEach(({ event, data: eventData }) => handleSequenced(event, eventData));
+            trackSeq(data.seq);
+        });
+        // Every sequenced event moves lastSeq forward, handled here or not
+        socket.onAny((event, data) => {
+            if (data && data.seq) {
+                handleSequenced(event, data);
+            } else if (socketHandlers[event]) {
+                socketHandlers[event](data);
+            }
+        });
+
+        function trackSeq(seq) {
+            let isNew = !seq;
+            Object.entries(seq || {}).forEach(([room, value]) => {
+                if (!(replayState.lastSeq[room] >= value)) {
+                    replayState.lastSeq[room] = value;
+                    isNew = true;
+                }
+            });
+            return isNew;
+        }
+
+        function handleSequenced(event, data) {
+            // Skip events a replay already delivered
+            if (trackSeq(data.seq) && socketHandlers[event]) {
+                socketHandlers[event](data);
+            }
+        }
+
         // Load player data when page loads
         loadPlayerData();
\ No newline at end of file